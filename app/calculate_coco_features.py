@@ -3,85 +3,111 @@
  # All rights reserved.
  # SPDX-License-Identifier: BSD-3-Clause
  # For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
-"""
 
-from PIL import Image
-import requests
-import torch
-
-import os
+Extracts BLIP image embeddings into an EmbeddingIndex for multimodal search.
 
-from lavis.common.registry import registry
-from lavis.processors import *
-from lavis.models import *
-from lavis.common.utils import build_default_model
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+Images already in the index are skipped, so running the script again after new images
+were added to the image root appends their embeddings only.
 
+    python app/calculate_coco_features.py \
+        --image-root /export/home/.cache/lavis/coco/images/train2014 \
+        --index-dir app/assets/coco_train2014_index --ivf-lists 1024
+"""
 
-def load_demo_image():
-    img_url = (
-        "https://storage.googleapis.com/sfr-vision-language-research/BLIP/demo.jpg"
-    )
-    raw_image = Image.open(requests.get(img_url, stream=True).raw).convert("RGB")
+import argparse
+import os
 
-    return raw_image
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
 
+from lavis.common.embedding_index import EmbeddingIndex
+from lavis.models import load_model
+from lavis.processors import load_processor
 
-def read_img(filepath):
-    raw_image = Image.open(filepath).convert("RGB")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+MODEL_URL = "https://storage.googleapis.com/sfr-vision-language-research/BLIP/models/model_base.pth"
 
-    return raw_image
 
+class ImageFileDataset(Dataset):
+    def __init__(self, image_root, filenames, vis_processor):
+        self.image_root = image_root
+        self.filenames = filenames
+        self.vis_processor = vis_processor
 
-# model
-model_url = "https://storage.googleapis.com/sfr-vision-language-research/BLIP/models/model_base.pth"
-feature_extractor = BlipFeatureExtractor(pretrained=model_url)
+    def __len__(self):
+        return len(self.filenames)
 
-feature_extractor.eval()
-feature_extractor = feature_extractor.to(device)
+    def __getitem__(self, index):
+        filename = self.filenames[index]
+        image = Image.open(os.path.join(self.image_root, filename)).convert("RGB")
+        return self.vis_processor(image), filename
 
-# preprocessors
-vis_processor = BlipImageEvalProcessor(image_size=224)
-text_processor = BlipCaptionProcessor()
 
-# files to process
-# file_root = "/export/home/.cache/lavis/coco/images/val2014"
-file_root = "/export/home/.cache/lavis/coco/images/train2014"
-filepaths = os.listdir(file_root)
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--image-root", required=True)
+    parser.add_argument("--index-dir", required=True)
+    parser.add_argument("--model-type", default="base")
+    parser.add_argument("--model-url", default=MODEL_URL)
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--num-workers", type=int, default=8)
+    parser.add_argument(
+        "--ivf-lists",
+        type=int,
+        default=0,
+        help="(re)train an IVF index with this many lists after extraction, 0 to skip",
+    )
+    return parser.parse_args()
 
-print(len(filepaths))
 
-caption = "dummy"
+def main():
+    args = parse_args()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-path2feat = dict()
-bsz = 256
+    model = load_model(
+        "blip_feature_extractor", model_type=args.model_type, is_eval=True, device=device
+    )
+    model.load_from_pretrained(args.model_url)
+    vis_processor = load_processor("blip_image_eval").build(image_size=args.image_size)
 
-images_in_batch = []
-filepaths_in_batch = []
+    filenames = sorted(
+        f for f in os.listdir(args.image_root) if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    index = None
+    if os.path.exists(os.path.join(args.index_dir, "meta.json")):
+        index = EmbeddingIndex(args.index_dir)
+        indexed = set(index.paths)
+        filenames = [f for f in filenames if f not in indexed]
+    print("{} images to index".format(len(filenames)))
+
+    data_loader = DataLoader(
+        ImageFileDataset(args.image_root, filenames, vis_processor),
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        pin_memory=device.type == "cuda",
+        shuffle=False,
+    )
 
-for i, filename in enumerate(filepaths):
-    if i % bsz == 0 and i > 0:
-        images_in_batch = torch.cat(images_in_batch, dim=0).to(device)
+    for images, batch_filenames in data_loader:
         with torch.no_grad():
-            image_features = feature_extractor(
-                images_in_batch, caption, mode="image", normalized=True
-            )[:, 0]
-
-        for filepath, image_feat in zip(filepaths_in_batch, image_features):
-            path2feat[os.path.basename(filepath)] = image_feat.detach().cpu()
-
-        images_in_batch = []
-        filepaths_in_batch = []
+            image_features = model.extract_features(
+                {"image": images.to(device, non_blocking=True)}, mode="image"
+            ).image_embeds_proj[:, 0]
+        image_features = image_features.float().cpu().numpy()
 
-        print(len(path2feat), image_features.shape)
-    else:
-        filepath = os.path.join(file_root, filename)
+        if index is None:
+            index = EmbeddingIndex(args.index_dir, dim=image_features.shape[1])
+        index.add(image_features, batch_filenames)
+        print("{} images indexed".format(len(index)))
 
-        image = read_img(filepath)
-        image = vis_processor(image).unsqueeze(0)
+    if args.ivf_lists and index is not None:
+        index.train_ivf(min(args.ivf_lists, len(index)))
+        print("trained IVF index with {} lists".format(index.meta["nlist"]))
 
-        images_in_batch.append(image)
-        filepaths_in_batch.append(filepath)
 
-torch.save(path2feat, "path2feat_coco_train2014.pth")
+if __name__ == "__main__":
+    main()
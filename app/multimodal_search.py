@@ -10,7 +10,6 @@ import os
 import numpy as np
 import streamlit as st
 import torch
-import torch.nn.functional as F
 from app import cache_root, device
 from app.utils import (
     getAttMap,
@@ -19,6 +18,7 @@ from app.utils import (
     read_img,
     resize_img,
 )
+from lavis.common.embedding_index import EmbeddingIndex
 from lavis.models import load_model
 from lavis.processors import load_processor
 
@@ -35,19 +35,20 @@ def load_feat():
     from lavis.common.utils import download_url
 
     dirname = os.path.join(os.path.dirname(__file__), "assets")
-    filename = "path2feat_coco_train2014.pth"
-    filepath = os.path.join(dirname, filename)
-    url = "https://storage.googleapis.com/sfr-vision-language-research/LAVIS/assets/path2feat_coco_train2014.pth"
+    index_dir = os.path.join(dirname, "coco_train2014_index")
 
-    if not os.path.exists(filepath):
-        download_url(url=url, root=dirname, filename="path2feat_coco_train2014.pth")
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        # build the index once from the legacy {path: feature} dict
+        filename = "path2feat_coco_train2014.pth"
+        filepath = os.path.join(dirname, filename)
+        url = "https://storage.googleapis.com/sfr-vision-language-research/LAVIS/assets/path2feat_coco_train2014.pth"
 
-    path2feat = torch.load(filepath)
-    paths = sorted(path2feat.keys())
+        if not os.path.exists(filepath):
+            download_url(url=url, root=dirname, filename="path2feat_coco_train2014.pth")
 
-    all_img_feats = torch.stack([path2feat[k] for k in paths], dim=0).to(device)
+        return EmbeddingIndex.from_features(index_dir, torch.load(filepath))
 
-    return path2feat, paths, all_img_feats
+    return EmbeddingIndex(index_dir)
 
 
 @st.cache(
@@ -105,19 +106,21 @@ def app():
             sample, mode="text"
         ).text_embeds_proj[0, 0]
 
-        path2feat, paths, all_img_feats = load_feat()
-        all_img_feats.to(device)
-        all_img_feats = F.normalize(all_img_feats, dim=1)
+        index = load_feat()
 
         num_cols = 4
         num_rows = int(num_display / num_cols)
 
-        similarities = text_feature @ all_img_feats.T
-        indices = torch.argsort(similarities, descending=True)[:num_display]
+        sorted_similarities, indices = index.search(
+            text_feature.float().cpu().numpy(), k=num_display
+        )
 
-    top_paths = [paths[ind.detach().cpu().item()] for ind in indices]
-    sorted_similarities = [similarities[idx] for idx in indices]
+    # the IVF search pads with -1 when the probed lists hold fewer than num_display images
+    top_paths = [index.paths[ind] for ind in indices if ind >= 0]
     filenames = [os.path.join(file_root, p) for p in top_paths]
+    if not filenames:
+        st.warning("No matching images were found.")
+        return
 
     # ========= ITM and GradCam ==========
     bsz = 4  # max number of images to avoid cuda oom
@@ -130,7 +133,7 @@ def app():
     queries_batch = [user_question] * bsz
     queries_tok_batch = tokenizer(queries_batch, return_tensors="pt").to(device)
 
-    num_batches = int(num_display / bsz)
+    num_batches = (len(filenames) + bsz - 1) // bsz
 
     avg_gradcams = []
     all_raw_images = []
@@ -139,6 +142,9 @@ def app():
     for i in range(num_batches):
         filenames_in_batch = filenames[i * bsz : (i + 1) * bsz]
         raw_images, images = read_and_process_images(filenames_in_batch, vis_processor)
+        if len(filenames_in_batch) < bsz:
+            queries_batch = [user_question] * len(filenames_in_batch)
+            queries_tok_batch = tokenizer(queries_batch, return_tensors="pt").to(device)
         gradcam, itm_output = compute_gradcam_batch(
             itm_model, images, queries_batch, queries_tok_batch
         )
@@ -176,8 +182,8 @@ def app():
 
     for _ in range(num_rows):
         with st.container():
-            for col in st.columns(num_cols):
-                col.image(next(images_to_show), use_column_width=True, clamp=True)
+            for col, image in zip(st.columns(num_cols), images_to_show):
+                col.image(image, use_column_width=True, clamp=True)
 
 
 def read_and_process_images(image_paths, vis_processor):
@@ -2,16 +2,40 @@ import argparse
 import json
 import os
 import re
+import time
 import torch
 import random
+from collections import defaultdict
 from PIL import Image
+from torch.utils.data import DataLoader, Dataset
 from lavis.models import load_model_and_preprocess
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-def evaluate_image(model, vis_processors, image_path):
-    raw_image = Image.open(image_path).convert("RGB")
-    image = vis_processors["eval"](raw_image).unsqueeze(0).to(device)
-    output = model.generate({"image": image}, num_captions=5)
+
+class ImageEntryDataset(Dataset):
+    """Decodes and preprocesses (image_path, caption) entries, optionally inside DataLoader workers."""
+
+    def __init__(self, entries, vis_processor):
+        self.entries = entries
+        self.vis_processor = vis_processor
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        image_path, caption = self.entries[index]
+        start = time.perf_counter()
+        raw_image = Image.open(image_path).convert("RGB")
+        image = self.vis_processor(raw_image)
+        return {
+            "image": image,
+            "image_path": image_path,
+            "caption": caption,
+            "preprocess_time": time.perf_counter() - start,
+        }
+
+
+def clean_captions(output):
     cleaned_output = [re.sub(r'[^\x00-\x7F]+', '', text) for text in output]
     cleaned_output = [text.strip() for text in cleaned_output if text.strip()]
     if not cleaned_output:
@@ -19,12 +43,38 @@ def evaluate_image(model, vis_processors, image_path):
     return cleaned_output
 
 
+def evaluate_batch(model, images, num_captions=5):
+    """Captions a (B, 3, H, W) batch; returns one list of cleaned captions per image."""
+    output = model.generate({"image": images.to(device)}, num_captions=num_captions)
+    # generate() returns the captions of each image contiguously.
+    return [
+        clean_captions(output[i : i + num_captions])
+        for i in range(0, len(output), num_captions)
+    ]
+
+
+def format_stats(stats, num_images, total_time):
+    lines = [
+        f"Processed {num_images} images in {total_time:.2f}s "
+        f"({num_images / max(total_time, 1e-9):.2f} images/sec)"
+    ]
+    for stage in ["preprocess", "data_wait", "generate", "write"]:
+        lines.append(
+            f"\t{stage}: {stats[stage]:.2f}s total, "
+            f"{1000 * stats[stage] / max(num_images, 1):.1f} ms/image"
+        )
+    return "\n".join(lines)
+
+
 def main():
     argparser = argparse.ArgumentParser(description="Evaluate an image using a pre-trained model.")
     argparser.add_argument("--image-json", nargs="+", type=str, required=True, help="Path to the JSON file containing image paths.")
     argparser.add_argument("--output-folder-prefix", type=str, required=True, help="Prefix for the output folder.")
     argparser.add_argument("--model-name", type=str, default="blip2_opt", help="Name of the pre-trained model to use.")
     argparser.add_argument("--model-type", type=str, default="cryoet-RW-DS", help="Type of the model to use.")
+    argparser.add_argument("--batch-size", type=int, default=1, help="Number of images captioned per generate() call.")
+    argparser.add_argument("--workers", type=int, default=0, help="Number of DataLoader workers decoding and preprocessing images.")
+    argparser.add_argument("--num-captions", type=int, default=5, help="Number of captions generated per image.")
     args = argparser.parse_args()
     model, vis_processors, _ = load_model_and_preprocess(name=args.model_name, model_type=args.model_type, is_eval=True, device=device)
 
@@ -42,16 +92,49 @@ def main():
             print(f"More than 1000 images found, randomly selecting 1000.")
             image_entries = random.sample(image_entries, 1000)
 
+        existing_entries = []
+        for image_path, caption in image_entries:
+            if not os.path.exists(image_path):
+                print(f"Image path {image_path} does not exist. Skipping.")
+                continue
+            existing_entries.append((image_path, caption))
+
+        loader = DataLoader(
+            ImageEntryDataset(existing_entries, vis_processors["eval"]),
+            batch_size=args.batch_size,
+            num_workers=args.workers,
+            pin_memory=device.type == "cuda",
+            shuffle=False,
+        )
+
+        stats = defaultdict(float)
+        num_images = 0
+        start_time = time.perf_counter()
         with open(output_file, "w") as f:
-            for image_path, caption in image_entries:
-                if not os.path.exists(image_path):
-                    print(f"Image path {image_path} does not exist. Skipping.")
-                    continue
-                all_outputs = evaluate_image(model, vis_processors, image_path)
-                print(f"{image_path}:\n\tGround Truth: {caption}\n\tModel Output: {all_outputs[0]}; All Outputs: {all_outputs}")
-                f.write(f"{image_path}\t{caption}\t{all_outputs[0]}\t{all_outputs}\n")
+            end = time.perf_counter()
+            for batch in loader:
+                stats["data_wait"] += time.perf_counter() - end
+                stats["preprocess"] += batch["preprocess_time"].sum().item()
+
+                generate_start = time.perf_counter()
+                all_outputs = evaluate_batch(model, batch["image"], args.num_captions)
+                stats["generate"] += time.perf_counter() - generate_start
+
+                write_start = time.perf_counter()
+                rows = []
+                for image_path, caption, outputs in zip(batch["image_path"], batch["caption"], all_outputs):
+                    print(f"{image_path}:\n\tGround Truth: {caption}\n\tModel Output: {outputs[0]}; All Outputs: {outputs}")
+                    rows.append(f"{image_path}\t{caption}\t{outputs[0]}\t{outputs}\n")
+                # flush once per batch rather than once per row
+                f.writelines(rows)
                 f.flush()
+                stats["write"] += time.perf_counter() - write_start
+
+                num_images += len(rows)
+                end = time.perf_counter()
+
+        print(format_stats(stats, num_images, time.perf_counter() - start_time))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,104 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Compares dataset construction time and DataLoader worker memory of the default
+list-of-dicts annotations against the memory-mapped JSONL store.
+
+    python benchmarks/annotation_store.py --num-anns 2000000 --num-workers 8
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import torch
+from torch.utils.data import DataLoader
+
+from lavis.datasets.datasets.annotation_store import convert_to_mmap_jsonl
+from lavis.datasets.datasets.base_dataset import BaseDataset
+
+
+def memory_usage_mb():
+    """Returns (rss, private dirty) memory of the current process in MB (Linux only)."""
+    usage = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] in ("Rss:", "Private_Dirty:"):
+                usage[fields[0][:-1]] = int(fields[1]) / 1024
+    return usage["Rss"], usage["Private_Dirty"]
+
+
+class AnnotationOnlyDataset(BaseDataset):
+    def __getitem__(self, index):
+        ann = self.annotation[index]
+        return len(ann["caption"])
+
+
+def report_worker_memory(batch):
+    return torch.tensor(memory_usage_mb())
+
+
+def touch_all(dataset, num_workers, batch_size=256):
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        shuffle=True,
+        collate_fn=report_worker_memory,
+    )
+    peak = torch.zeros(2)
+    for mem in loader:
+        peak = torch.maximum(peak, mem)
+    return peak.tolist()
+
+
+def make_annotations(path, num_anns):
+    with open(path, "w") as f:
+        json.dump(
+            [
+                {
+                    "image": "images/{:09d}.jpg".format(i),
+                    "image_id": i,
+                    "caption": "a synthetic caption number {} for a benchmark".format(i),
+                }
+                for i in range(num_anns)
+            ],
+            f,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-anns", type=int, default=1000000)
+    parser.add_argument("--num-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "anns.json")
+        make_annotations(json_path, args.num_anns)
+        mmap_path, _ = convert_to_mmap_jsonl(json_path)
+
+        for name, ann_path in [("list-of-dicts", json_path), ("mmap-jsonl", mmap_path)]:
+            start = time.time()
+            dataset = AnnotationOnlyDataset(ann_paths=[ann_path])
+            build_time = time.time() - start
+            rss, private = memory_usage_mb()
+
+            peak_rss, peak_private = touch_all(dataset, args.num_workers)
+            print(
+                "{:>14}: build {:.2f}s | main rss {:.0f}MB | worker peak rss {:.0f}MB, "
+                "private dirty {:.0f}MB".format(
+                    name, build_time, rss, peak_rss, peak_private
+                )
+            )
+            del dataset
+
+
+if __name__ == "__main__":
+    main()
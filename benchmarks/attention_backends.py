@@ -0,0 +1,94 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Times EVA-ViT-g shaped blocks (1408 dim, 16 heads, 257 tokens at 224px) in inference
+for each attention backend, and reports the peak memory of each run. Every backend runs
+in a fresh process, so that on CPU the peak RSS of one does not hide the others.
+
+    python benchmarks/attention_backends.py --batch-size 16 --depth 4
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import time
+from functools import partial
+
+import torch
+import torch.nn as nn
+
+from lavis.models.attention_backends import ATTN_BACKENDS, set_attn_backend
+from lavis.models.eva_vit import VisionTransformer
+
+
+def run(backend, args, queue):
+    device = torch.device(args.device)
+    torch.set_grad_enabled(False)
+
+    model = VisionTransformer(
+        img_size=args.image_size,
+        patch_size=14,
+        embed_dim=1408,
+        depth=args.depth,
+        num_heads=16,
+        mlp_ratio=4.3637,
+        qkv_bias=True,
+        norm_layer=partial(nn.LayerNorm, eps=1e-6),
+    ).eval().to(device)
+    set_attn_backend(model, backend, chunk_size=args.chunk_size)
+
+    image = torch.randn(args.batch_size, 3, args.image_size, args.image_size, device=device)
+    model(image)  # warm up
+
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.time()
+    for _ in range(args.iters):
+        model(image)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        peak_mb = torch.cuda.max_memory_allocated() / 2**20
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    queue.put((backend, (time.time() - start) / args.iters, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=list(ATTN_BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--iters", type=int, default=3)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for backend in args.backends:
+        proc = ctx.Process(target=run, args=(backend, args, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print("{:>8} | failed with exit code {}".format(backend, proc.exitcode))
+            continue
+        backend, latency, peak_mb = queue.get()
+        print(
+            "{:>8} | {:8.1f} ms / batch of {} | peak {} {:8.0f} MB".format(
+                backend,
+                1000 * latency,
+                args.batch_size,
+                "allocated" if args.device.startswith("cuda") else "RSS",
+                peak_mb,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Compares the load time and peak memory of a checkpoint loaded by unpickling it with torch.load
+and load_state_dict, with the memory-mapped loading of lavis.common.checkpoint from the same
+.pth file and from its safetensors conversion, and with loading only the Q-Former by key prefix.
+
+The checkpoint is a synthetic BLIP-2 like model: a Q-Former and a larger frozen LLM. Each method
+runs in a fresh interpreter. The files are read from the page cache after the first run. Peak
+anonymous memory excludes the pages of memory-mapped files, which the peak rss counts although
+the kernel can reclaim them.
+
+    python benchmarks/checkpoint_loading.py --qformer-mb 400 --llm-mb 4000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import torch
+import torch.nn as nn
+
+METHODS = ["pickle", "pth_mmap", "safetensors", "safetensors_qformer"]
+
+
+def build_model(qformer_mb, llm_mb, layer_mb=64):
+    # float32 square layers of about layer_mb
+    width = int((layer_mb * 1024**2 / 4) ** 0.5)
+
+    def stack(mb):
+        return nn.Sequential(
+            *[nn.Linear(width, width, bias=False) for _ in range(max(int(mb // layer_mb), 1))]
+        )
+
+    return nn.ModuleDict({"Qformer": stack(qformer_mb), "llm": stack(llm_mb)})
+
+
+def max_rss_mb():
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def anon_rss_mb():
+    """Resident memory not backed by files, which excludes the pages of memory-mapped files."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class PeakMemory(threading.Thread):
+    """Samples the anonymous resident memory of the process until stopped, and keeps the peak."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = anon_rss_mb()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, anon_rss_mb())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.peak = max(self.peak, anon_rss_mb())
+        return self.peak
+
+
+def run_method(method, path, qformer_mb, llm_mb):
+    from lavis.common.checkpoint import load_state_dict, load_state_dict_into
+
+    with torch.device("meta"):
+        model = build_model(qformer_mb, llm_mb)
+    # uninitialized parameters, as the weights are overwritten by the checkpoint
+    model = model.to_empty(device="cpu")
+    anon_before = anon_rss_mb()
+
+    peak_memory = PeakMemory()
+    peak_memory.start()
+    start_time = time.time()
+    if method == "pickle":
+        state_dict = torch.load(path, map_location="cpu")["model"]
+        model.load_state_dict(state_dict, strict=False)
+        del state_dict
+    elif method == "pth_mmap":
+        load_state_dict_into(model, load_state_dict(path))
+    elif method == "safetensors":
+        load_state_dict_into(model, load_state_dict(os.path.splitext(path)[0] + ".safetensors"))
+    elif method == "safetensors_qformer":
+        state_dict = load_state_dict(os.path.splitext(path)[0] + ".safetensors", prefix="Qformer.")
+        load_state_dict_into(model, state_dict)
+    load_time = time.time() - start_time
+
+    return {
+        "load_time": load_time,
+        "before_mb": anon_before,
+        "peak_anon_mb": peak_memory.stop(),
+        "peak_rss_mb": max_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qformer-mb", type=float, default=400)
+    parser.add_argument("--llm-mb", type=float, default=4000)
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument("--repeat", type=int, default=2, help="runs per method, the fastest is reported.")
+    parser.add_argument("--output-dir", default=None, help="directory of the checkpoints, a temporary one by default.")
+    parser.add_argument("--worker", choices=METHODS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_method(args.worker, args.path, args.qformer_mb, args.llm_mb)))
+        return
+
+    from lavis.common.checkpoint import convert_to_safetensors
+
+    with tempfile.TemporaryDirectory(dir=args.output_dir) as output_dir:
+        path = os.path.join(output_dir, "checkpoint.pth")
+        model = build_model(args.qformer_mb, args.llm_mb)
+        torch.save({"model": model.state_dict(), "epoch": 0}, path)
+        del model
+        convert_to_safetensors(path)
+        print("checkpoint: {:.0f} MB".format(os.path.getsize(path) / 1024**2))
+
+        print(
+            "{:>20} {:>10} {:>12} {:>16} {:>16}".format(
+                "method", "load (s)", "before (MB)", "peak anon (MB)", "peak rss (MB)"
+            )
+        )
+        for method in args.methods:
+            runs = []
+            for _ in range(args.repeat):
+                result = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--worker",
+                        method,
+                        "--path",
+                        path,
+                        "--qformer-mb",
+                        str(args.qformer_mb),
+                        "--llm-mb",
+                        str(args.llm_mb),
+                    ],
+                    stdout=subprocess.PIPE,
+                    check=True,
+                    universal_newlines=True,
+                )
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            best = min(runs, key=lambda run: run["load_time"])
+            print(
+                "{:>20} {:>10.2f} {:>12.0f} {:>16.0f} {:>16.0f}".format(
+                    method,
+                    best["load_time"],
+                    best["before_mb"],
+                    best["peak_anon_mb"],
+                    best["peak_rss_mb"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
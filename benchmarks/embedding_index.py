@@ -0,0 +1,88 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Times EmbeddingIndex appends and single-query search latency on random embeddings,
+for exact search and for IVF search with a few nprobe values (with recall@k against
+exact search).
+
+    python benchmarks/embedding_index.py --num-rows 1000000 --dim 256 --ivf-lists 1024
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from lavis.common.embedding_index import EmbeddingIndex
+
+
+def clustered_embeddings(rng, centers, num_rows):
+    # real image embeddings are clustered, uniformly random ones are a worst case for IVF
+    num_clusters, dim = centers.shape
+    labels = rng.integers(num_clusters, size=num_rows)
+    return centers[labels] + 0.5 * rng.standard_normal((num_rows, dim)).astype(np.float32)
+
+
+def time_search(index, queries, k, **kwargs):
+    latencies, ids = [], []
+    for query in queries:
+        start = time.time()
+        ids.append(index.search(query, k=k, **kwargs)[1])
+        latencies.append(time.time() - start)
+    return 1000 * np.percentile(latencies, [50, 99]), np.stack(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-rows", type=int, default=1000000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=65536)
+    parser.add_argument("--num-clusters", type=int, default=2000)
+    parser.add_argument("--ivf-lists", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=24)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.num_clusters, args.dim)).astype(np.float32)
+    queries = clustered_embeddings(rng, centers, args.num_queries)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = EmbeddingIndex(index_dir, dim=args.dim)
+
+        start = time.time()
+        for i in range(0, args.num_rows, args.batch_size):
+            num = min(args.batch_size, args.num_rows - i)
+            paths = ["{:09d}.jpg".format(j) for j in range(i, i + num)]
+            index.add(clustered_embeddings(rng, centers, num), paths)
+        print("append {} rows          {:8.2f}s".format(len(index), time.time() - start))
+
+        # reopen, as a server would
+        index = EmbeddingIndex(index_dir)
+        (p50, p99), exact_ids = time_search(index, queries, args.k)
+        print("exact search            p50 {:7.1f}ms  p99 {:7.1f}ms".format(p50, p99))
+
+        start = time.time()
+        index.train_ivf(args.ivf_lists)
+        print("train IVF ({} lists)  {:8.2f}s".format(args.ivf_lists, time.time() - start))
+
+        index = EmbeddingIndex(index_dir)
+        for nprobe in args.nprobe:
+            (p50, p99), ids = time_search(index, queries, args.k, nprobe=nprobe)
+            recall = np.mean(
+                [len(set(a) & set(b)) / args.k for a, b in zip(ids, exact_ids)]
+            )
+            print(
+                "IVF search nprobe {:>3}  p50 {:7.1f}ms  p99 {:7.1f}ms  recall@{} {:.3f}".format(
+                    nprobe, p50, p99, args.k, recall
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Compares evaluation batches in dataset order with the batches of LengthGroupedBatchSampler
+(run_cfg.group_eval_by_length) on the annotations of a split, e.g. VQAv2 val or AVSD test:
+the padded input tokens of the batches, and the time of a small transformer encoder run on the
+padded batches as a stand-in for the text encoder of a model. Without annotations, input
+lengths are drawn from a log-normal distribution.
+
+    python benchmarks/eval_length_grouping.py --annotation vqav2/annotations/vqa_val_eval.json
+    python benchmarks/eval_length_grouping.py --num-samples 20000 --batch-size 64 --num-replicas 8
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DistributedSampler
+
+from lavis.datasets.datasets.base_dataset import BaseDataset
+from lavis.datasets.datasets.dataloader_utils import (
+    LengthGroupedBatchSampler,
+    estimate_input_lengths,
+)
+
+# subword tokens per word of english text, for the encoder inputs
+TOKENS_PER_WORD = 1.3
+
+
+def load_lengths(args):
+    if args.annotation:
+        dataset = BaseDataset(ann_paths=args.annotation)
+        return dataset, estimate_input_lengths(dataset, length_key=args.length_key)
+
+    rng = np.random.default_rng(0)
+    lengths = np.clip(rng.lognormal(mean=2.5, sigma=0.8, size=args.num_samples), 1, 512)
+    return list(range(args.num_samples)), lengths.astype(int).tolist()
+
+
+def dataset_order_batches(sampler, batch_size):
+    indices = list(sampler)
+    return [indices[i : i + batch_size] for i in range(0, len(indices), batch_size)]
+
+
+def padded_tokens(batches, lengths):
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+def encoder_time(batches, lengths, encoder):
+    start = time.perf_counter()
+    with torch.no_grad():
+        for batch in batches:
+            batch_lengths = torch.tensor([max(int(lengths[i] * TOKENS_PER_WORD), 1) for i in batch])
+            x = torch.zeros(len(batch), int(batch_lengths.max()), encoder.layers[0].linear1.in_features)
+            padding_mask = torch.arange(x.shape[1])[None, :] >= batch_lengths[:, None]
+            encoder(x, src_key_padding_mask=padding_mask)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotation", nargs="+", default=None, help="annotation files of the split.")
+    parser.add_argument("--length-key", default=None, help="annotation field with precomputed token counts.")
+    parser.add_argument("--num-samples", type=int, default=20000, help="samples without annotations.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-replicas", type=int, default=1, help="number of processes, rank 0 is measured.")
+    parser.add_argument("--max-batches", type=int, default=50, help="batches run through the encoder.")
+    parser.add_argument("--num-threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.num_threads)
+    dataset, lengths = load_lengths(args)
+    if lengths is None:
+        raise ValueError("the annotations do not have input lengths.")
+
+    sampler = DistributedSampler(dataset, num_replicas=args.num_replicas, rank=0, shuffle=False)
+    batches = {
+        "dataset order": dataset_order_batches(sampler, args.batch_size),
+        "length grouped": list(LengthGroupedBatchSampler(sampler, lengths, args.batch_size)),
+    }
+
+    real_tokens = sum(lengths[i] for i in sampler)
+    print(
+        "{} samples, {} on rank 0, {:.1f} words per input on average".format(
+            len(lengths), len(sampler), real_tokens / len(sampler)
+        )
+    )
+
+    layer = nn.TransformerEncoderLayer(d_model=256, nhead=4, dim_feedforward=1024, batch_first=True)
+    encoder = nn.TransformerEncoder(layer, num_layers=2, enable_nested_tensor=False).eval()
+
+    max_batches = min(args.max_batches, len(batches["dataset order"]))
+    rng = np.random.default_rng(0)
+    sample = sorted(rng.choice(len(batches["dataset order"]), size=max_batches, replace=False))
+
+    print("{:>16} {:>14} {:>10} {:>14}".format("batches", "padded words", "padding", "encoder (s)"))
+    for name, order in batches.items():
+        padded = padded_tokens(order, lengths)
+        # the same batch positions of each order, spread over the split, scaled to all batches
+        timed = [order[i] for i in sample]
+        seconds = encoder_time(timed, lengths, encoder) * len(order) / len(timed)
+        print(
+            "{:>16} {:>14} {:>9.1%} {:>14.2f}".format(name, padded, 1 - real_tokens / padded, seconds)
+        )
+
+
+if __name__ == "__main__":
+    main()
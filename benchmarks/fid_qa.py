@@ -0,0 +1,123 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Times PNPVQA.forward_qa (Fusion-in-Decoder over question-caption contexts) on a synthetic
+batch for several internal_bsz_fid, against the previous loop that decoded one question at
+a time, and reports how many answers match the loop.
+
+    python benchmarks/fid_qa.py --model-path allenai/unifiedqa-v2-t5-base-1363200 \
+        --num-questions 64 --num-captions 100 --batch-sizes 1 8 32 --device cuda
+"""
+
+import argparse
+import copy
+import random
+import time
+
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+from lavis.models.pnp_vqa_models import prepare_qa_input
+from lavis.models.pnp_vqa_models.pnp_unifiedqav2_fid import PNPUnifiedQAv2FiD
+from lavis.models.pnp_vqa_models.pnp_vqa import PNPVQA
+
+WORDS = (
+    "a man woman dog cat red blue sitting standing on in the of with next to table street "
+    "car bus tree grass field playing holding large small white black two people water"
+).split()
+
+
+def legacy_forward_qa(model, samples, num_beams, max_len, min_len, num_captions, num_captions_fid):
+    prepare_qa_input(samples, num_captions=num_captions, num_captions_fid=num_captions_fid)
+
+    pred_answers = []
+    qa_model = model.question_answering_model
+    for question_caption in samples["question_captions"]:
+        question_caption_input = qa_model.tokenizer(
+            question_caption, padding="longest", truncation=True, return_tensors="pt"
+        ).to(qa_model.device)
+
+        outputs = qa_model.generate(
+            input_ids=question_caption_input.input_ids.reshape(1, -1, question_caption_input.input_ids.size(1)),
+            attention_mask=question_caption_input.attention_mask.reshape(
+                1, -1, question_caption_input.attention_mask.size(1)
+            ),
+            num_beams=num_beams,
+            min_length=min_len,
+            max_length=max_len,
+        )
+        pred_answers.extend(qa_model.tokenizer.decode(output, skip_special_tokens=True) for output in outputs)
+
+    return pred_answers
+
+
+def make_samples(num_questions, num_captions, seed=0):
+    rng = random.Random(seed)
+
+    def sentence(min_words, max_words):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+    return {
+        "text_input": [sentence(3, 12) + "?" for _ in range(num_questions)],
+        "captions": [[sentence(4, 20) for _ in range(num_captions)] for _ in range(num_questions)],
+    }
+
+
+def load_qa_model(model_path, device):
+    model = PNPUnifiedQAv2FiD(T5Config.from_pretrained(model_path), model_path)
+    model.load_unifiedqa(T5ForConditionalGeneration.from_pretrained(model_path).state_dict())
+    return model.eval().to(device)
+
+
+def timed(fn):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.time()
+    with torch.no_grad():
+        outputs = fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return outputs, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-path", default="allenai/unifiedqa-v2-t5-base-1363200")
+    parser.add_argument("--num-questions", type=int, default=64)
+    parser.add_argument("--num-captions", type=int, default=100)
+    parser.add_argument("--num-captions-fid", type=int, default=1)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max-len", type=int, default=20)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    model = PNPVQA(None, None, load_qa_model(args.model_path, args.device))
+    samples = make_samples(args.num_questions, args.num_captions)
+    kwargs = dict(
+        num_beams=1,
+        max_len=args.max_len,
+        min_len=0,
+        num_captions=args.num_captions,
+        num_captions_fid=args.num_captions_fid,
+    )
+
+    expected, elapsed = timed(lambda: legacy_forward_qa(model, copy.deepcopy(samples), **kwargs))
+    print("{:>14} | {:8.1f} questions / s".format("loop", args.num_questions / elapsed))
+
+    for batch_size in args.batch_sizes:
+        answers, elapsed = timed(
+            lambda: model.forward_qa(copy.deepcopy(samples), internal_bsz_fid=batch_size, **kwargs)
+        )
+        num_same = sum(a == b for a, b in zip(answers, expected))
+        print(
+            "{:>14} | {:8.1f} questions / s | {}/{} answers as loop".format(
+                "batch {}".format(batch_size), args.num_questions / elapsed, num_same, len(expected)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
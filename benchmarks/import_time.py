@@ -0,0 +1,111 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Measures the import time of lavis entry points with python -X importtime, in fresh interpreters,
+and lists the slowest imports. Exits with an error when a scenario imports a module it must not
+(the lazy registry only imports the modules of the names that are looked up), or takes longer
+than --max-seconds, so that it can guard against import time regressions.
+
+    python benchmarks/import_time.py --repeat 3 --top 10
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+SCENARIOS = {
+    "lavis": "import lavis",
+    "models": "from lavis.models import load_model_and_preprocess",
+    "blip2_opt": (
+        "from lavis.models import load_model_and_preprocess\n"
+        "from lavis.common.registry import registry\n"
+        "registry.get_model_class('blip2_opt')\n"
+        "registry.get_processor_class('blip_image_eval')\n"
+        "registry.get_processor_class('blip_caption')"
+    ),
+}
+
+# heavy dependencies of other model families, datasets and annotators
+HEAVY_MODULES = [
+    "decord",
+    "cv2",
+    "diffusers",
+    "webdataset",
+    "moviepy",
+    "torchaudio",
+    "open3d",
+    "lavis.common.annotator",
+]
+FORBIDDEN_MODULES = {
+    "lavis": ["torch"] + HEAVY_MODULES,
+    "models": HEAVY_MODULES,
+    # cv2 is imported by the RandomAugment of the blip processors
+    "blip2_opt": [module for module in HEAVY_MODULES if module != "cv2"],
+}
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(statement):
+    """(self, cumulative) import times in seconds by module, and the total import time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError("failed to run {!r}:\n{}".format(statement, result.stderr))
+
+    modules, total = {}, 0.0
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        modules[module] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+        if len(indent) == 1:
+            # top level imports, their cumulative times add up to the total
+            total += int(cumulative_us) / 1e6
+    return modules, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest is reported.")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list.")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if a scenario takes longer.")
+    args = parser.parse_args()
+
+    failures = []
+    for scenario in args.scenarios:
+        runs = [import_times(SCENARIOS[scenario]) for _ in range(args.repeat)]
+        modules, total = min(runs, key=lambda run: run[1])
+
+        print("{}: {:.2f}s ({} modules)".format(scenario, total, len(modules)))
+        slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[: args.top]
+        for module, (self_time, cumulative) in slowest:
+            print("    {:>7.3f}s self {:>7.3f}s cumulative  {}".format(self_time, cumulative, module))
+
+        imported = [
+            module
+            for module in FORBIDDEN_MODULES[scenario]
+            if any(name == module or name.startswith(module + ".") for name in modules)
+        ]
+        if imported:
+            failures.append("{} imports {}".format(scenario, ", ".join(imported)))
+        if args.max_seconds is not None and total > args.max_seconds:
+            failures.append("{} takes {:.2f}s > {:.2f}s".format(scenario, total, args.max_seconds))
+
+    if failures:
+        print("\n".join(["FAILED:"] + failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Times BaseTask.save_result (single process) for each gather mode and per-rank file format,
+against the previous list-based deduplication.
+
+    python benchmarks/save_result.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import tempfile
+import time
+
+from lavis.tasks.base_task import BaseTask
+
+
+def legacy_dedup(result, remove_duplicate):
+    result_new = []
+    id_list = []
+    for res in result:
+        if res[remove_duplicate] not in id_list:
+            id_list.append(res[remove_duplicate])
+            result_new.append(res)
+    return result_new
+
+
+def make_results(num_results):
+    # every id appears twice, as with a DistributedSampler padding the last batch
+    return [
+        {"question_id": i % (num_results // 2), "answer": "answer {}".format(i)}
+        for i in range(num_results)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument(
+        "--legacy-max-size",
+        type=int,
+        default=100000,
+        help="skip the quadratic legacy deduplication above this size",
+    )
+    args = parser.parse_args()
+
+    task = BaseTask()
+    with tempfile.TemporaryDirectory() as result_dir:
+        for size in args.sizes:
+            result = make_results(size)
+
+            if size <= args.legacy_max_size:
+                start = time.time()
+                legacy_dedup(result, "question_id")
+                print("{:>8} results | legacy dedup            {:8.2f}s".format(size, time.time() - start))
+
+            for gather in ["file", "memory"]:
+                for result_format in ["json", "jsonl", "json.gz"]:
+                    start = time.time()
+                    task.save_result(
+                        result,
+                        result_dir=result_dir,
+                        filename="bench_{}".format(size),
+                        remove_duplicate="question_id",
+                        gather=gather,
+                        result_format=result_format,
+                    )
+                    print(
+                        "{:>8} results | {:>6} gather, {:>7} {:8.2f}s".format(
+                            size, gather, result_format, time.time() - start
+                        )
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Times VideoRandomAugment, which applies every op once to a whole clip, against the
+previous implementation that applied the OpenCV/NumPy ops frame by frame, in clips per second
+for each op of the alpro_video_train processor and for random ops.
+
+    python benchmarks/video_randaugment.py --num-frames 8 16 32 --image-size 224
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from lavis.processors.randaugment import VideoRandomAugment, arg_dict, func_dict
+
+ALPRO_AUGS = [
+    "Identity",
+    "Brightness",
+    "Sharpness",
+    "Equalize",
+    "ShearX",
+    "ShearY",
+    "TranslateX",
+    "TranslateY",
+    "Rotate",
+]
+
+
+def legacy_augment(augment, frames):
+    frames = frames.numpy().astype(np.uint8)
+    ops = augment.get_random_ops()
+    apply_or_not = np.random.random(size=augment.N) > augment.p
+
+    out = []
+    for img in frames:
+        for i, (name, level) in enumerate(ops):
+            if not apply_or_not[i]:
+                continue
+            args = arg_dict[name](level)
+            img = func_dict[name](img, *args)
+        out.append(torch.from_numpy(img))
+    return torch.stack(out, dim=0).float()
+
+
+def clips_per_second(fn, clip, num_iters):
+    fn(clip)
+    start = time.perf_counter()
+    for _ in range(num_iters):
+        fn(clip)
+    return num_iters / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-frames", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--num-iters", type=int, default=20)
+    parser.add_argument("--num-threads", type=int, default=1, help="torch threads, as in a DataLoader worker.")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.num_threads)
+
+    print("{:>7} {:>12} {:>12} {:>12} {:>8}".format("frames", "op", "legacy", "batched", "speedup"))
+    for num_frames in args.num_frames:
+        clip = torch.randint(0, 256, (num_frames, args.image_size, args.image_size, 3)).float()
+
+        for op in ALPRO_AUGS + ["random"]:
+            augs = ALPRO_AUGS if op == "random" else [op]
+            augment = VideoRandomAugment(N=1 if op != "random" else 2, M=5, augs=augs)
+
+            legacy = clips_per_second(lambda x: legacy_augment(augment, x), clip, args.num_iters)
+            batched = clips_per_second(augment, clip, args.num_iters)
+            print(
+                "{:>7} {:>12} {:>10.1f}/s {:>10.1f}/s {:>7.1f}x".format(
+                    num_frames, op, legacy, batched, batched / legacy
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
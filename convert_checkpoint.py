@@ -0,0 +1,51 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Converts the model state dict of .pth checkpoints to safetensors files. By default, each file is
+written next to its checkpoint, e.g. blip2_pretrained.safetensors for blip2_pretrained.pth, where
+the models load it instead of the .pth file, until the .pth file is overwritten, e.g. by a later
+checkpoint_best.pth. Urls are converted in the download cache.
+
+    python convert_checkpoint.py lavis/output/BLIP2/Caption_coco/checkpoint_best.pth
+    python convert_checkpoint.py https://storage.googleapis.com/.../blip2_pretrained.pth
+"""
+
+import argparse
+import os
+import time
+
+from lavis.common.checkpoint import convert_to_safetensors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert checkpoints to safetensors")
+
+    parser.add_argument("checkpoints", nargs="+", help="paths or urls of .pth checkpoints.")
+    parser.add_argument("--output", default=None, help="output path, for a single checkpoint.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.output is not None and len(args.checkpoints) > 1:
+        raise ValueError("--output can only be used with a single checkpoint.")
+
+    for checkpoint in args.checkpoints:
+        start_time = time.time()
+        output_path = convert_to_safetensors(checkpoint, output_path=args.output)
+        print(
+            "Converted {} to {} ({:.1f} MB) in {:.1f}s".format(
+                checkpoint,
+                output_path,
+                os.path.getsize(output_path) / 1024**2,
+                time.time() - start_time,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -22,12 +22,8 @@ from lavis.common.optims import (
 )
 from lavis.common.utils import now
 
-# imports modules for registration
-from lavis.datasets.builders import *
-from lavis.models import *
-from lavis.processors import *
+# builders, models, processors and tasks are imported on their first registry lookup
 from lavis.runners.runner_base import RunnerBase
-from lavis.tasks import *
 
 
 def parse_args():
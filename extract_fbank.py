@@ -0,0 +1,102 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Computes the BEATs fbank features of every audio file under an audio root, in parallel
+worker processes, into an FbankStore. Audio datasets read the store instead of decoding
+audio once their beats_audio processors set fbank_store to its directory.
+
+Runs can be interrupted and resumed, and split across machines with --num-parts.
+
+    python extract_fbank.py --audio-root audiocaps/audio --output audiocaps/fbank --num-workers 32
+"""
+
+import argparse
+import os
+from multiprocessing import Pool
+
+import torch
+from tqdm import tqdm
+
+from lavis.datasets.datasets.fbank_store import FbankStore, FbankStoreWriter
+from lavis.processors.audio_processors import BeatsAudioProcessor
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".ogg", ".mp4")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract BEATs fbank features")
+
+    parser.add_argument("--audio-root", required=True)
+    parser.add_argument("--output", required=True, help="directory of the store.")
+    parser.add_argument("--extensions", nargs="+", default=list(AUDIO_EXTENSIONS))
+    parser.add_argument("--sampling-rate", type=int, default=16000)
+    parser.add_argument("--num-workers", type=int, default=8)
+    parser.add_argument("--shard-size", type=int, default=1024)
+    parser.add_argument("--num-parts", type=int, default=1, help="number of machines sharing the files.")
+    parser.add_argument("--part-index", type=int, default=0)
+
+    return parser.parse_args()
+
+
+def list_audio_files(audio_root, extensions):
+    paths = []
+    for dirpath, _, filenames in os.walk(audio_root):
+        for filename in filenames:
+            if filename.lower().endswith(tuple(extensions)):
+                # keyed like FbankStore.key looks them up
+                path = os.path.realpath(os.path.join(dirpath, filename))
+                paths.append(os.path.relpath(path, audio_root))
+    return sorted(paths)
+
+
+_processor = None
+
+
+def init_worker(sampling_rate):
+    global _processor
+    # one thread per process, the pool already uses every core
+    torch.set_num_threads(1)
+    _processor = BeatsAudioProcessor(
+        model_name="iter3", sampling_rate=sampling_rate, n_frames=2, frame_length=512, is_eval=False
+    )
+
+
+def compute_fbank(args):
+    audio_root, key = args
+    waveform = _processor.load_waveform(os.path.join(audio_root, key))
+    fbank = _processor.compute_fbank(waveform) if waveform is not None else None
+    return key, fbank
+
+
+def main():
+    args = parse_args()
+    audio_root = os.path.realpath(args.audio_root)
+
+    keys = list_audio_files(audio_root, args.extensions)[args.part_index :: args.num_parts]
+    if os.path.isdir(args.output):
+        done = FbankStore(args.output).keys()
+        keys = [key for key in keys if key not in done]
+    print("Extracting fbank features of {} files into {}".format(len(keys), args.output))
+
+    num_failed = 0
+    with Pool(args.num_workers, initializer=init_worker, initargs=(args.sampling_rate,)) as pool, FbankStoreWriter(
+        args.output, audio_root, part="part{}".format(args.part_index), shard_size=args.shard_size
+    ) as writer:
+        for key, fbank in tqdm(
+            pool.imap_unordered(compute_fbank, [(audio_root, key) for key in keys], chunksize=8),
+            total=len(keys),
+        ):
+            if fbank is None:
+                num_failed += 1
+                continue
+            writer.add(key, fbank)
+
+    if num_failed:
+        print("{} files could not be decoded and were skipped.".format(num_failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,27 +3,38 @@ import re
 import io
 import os
 import base64
-import tempfile
 from PIL import Image
+import sys
 import torch
 from lavis.models import load_model_and_preprocess
 
+# inference_server.py sits next to this file, which may be run from any directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from inference_server import BatchedCaptioner, QueueFullError
+
 app = Flask(__name__)
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 model, vis_processors, _ = load_model_and_preprocess(
     name="blip2_opt",
-    model_type="cryoet-RW-DS ",
+    model_type="cryoet-RW-DS",
     is_eval=True,
     device=device,
 )
 
+captioner = BatchedCaptioner(
+    model,
+    vis_processors["eval"],
+    device,
+    num_captions=5,
+    max_batch_size=int(os.environ.get("CAPTION_MAX_BATCH_SIZE", 8)),
+    batch_window=float(os.environ.get("CAPTION_BATCH_WINDOW_MS", 20)) / 1000,
+    max_queue_size=int(os.environ.get("CAPTION_MAX_QUEUE_SIZE", 64)),
+)
+REQUEST_TIMEOUT = float(os.environ.get("CAPTION_REQUEST_TIMEOUT", 120))
 
-def caption_image_from_path(image_path: str, num_captions: int = 5):
-    raw_image = Image.open(image_path).convert("RGB")
-    image = vis_processors["eval"](raw_image).unsqueeze(0).to(device)
-    print(f"Processing image at: {image_path}")
-    output = model.generate({"image": image}, num_captions=num_captions)
+
+def clean_captions(output):
     cleaned_output = [re.sub(r"[^\x00-\x7F]+", "", text) for text in output]
     cleaned_output = [text.strip() for text in cleaned_output if text.strip()]
     if not cleaned_output:
@@ -31,11 +42,22 @@ def caption_image_from_path(image_path: str, num_captions: int = 5):
     return cleaned_output
 
 
+def caption_image_from_path(image_path: str):
+    raw_image = Image.open(image_path).convert("RGB")
+    print(f"Processing image at: {image_path}")
+    return clean_captions(captioner.caption(raw_image, timeout=REQUEST_TIMEOUT))
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
 
 
+@app.route("/metrics")
+def metrics():
+    return jsonify(captioner.metrics())
+
+
 @app.route("/caption", methods=["POST"])  # receives base64 dataURL
 def caption():
     data = request.get_json(force=True)
@@ -51,24 +73,16 @@ def caption():
     try:
         img_bytes = base64.b64decode(b64data)
         img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            img.save(tmp.name, format="PNG")
-            tmp_path = tmp.name
-
-        print("Processing image at:", tmp_path)
-        captions = caption_image_from_path(tmp_path)
+        captions = clean_captions(captioner.caption(img, timeout=REQUEST_TIMEOUT))
         print(f"Done generating captions: {captions}")
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": f"Failed to process image: {e}"}), 500
-    finally:
-        try:
-            if 'tmp_path' in locals() and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            pass
 
     return jsonify({"captions": captions})
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # the reloader of debug mode would load a second copy of the model
+    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+
+import torch
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the request queue is at capacity and a request is rejected."""
+
+
+class _Request:
+    __slots__ = ("image", "future", "enqueue_time")
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueue_time = time.perf_counter()
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class BatchedCaptioner:
+    """
+    Serves caption requests from a single background thread that owns the model.
+
+    Requests arriving within `batch_window` seconds of each other (up to
+    `max_batch_size`) are fused into one `model.generate` call. The request
+    queue is bounded by `max_queue_size`; when it is full, `submit` raises
+    `QueueFullError` so callers can shed load instead of piling up.
+    """
+
+    def __init__(
+        self,
+        model,
+        vis_processor,
+        device,
+        num_captions=5,
+        max_batch_size=8,
+        batch_window=0.02,
+        max_queue_size=64,
+        latency_window=1024,
+    ):
+        self.model = model
+        self.vis_processor = vis_processor
+        self.device = device
+        self.num_captions = num_captions
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._num_requests = 0
+        self._num_rejected = 0
+        self._num_batches = 0
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, raw_image):
+        """Preprocesses a PIL image on the calling thread and enqueues it; returns a Future of captions."""
+        request = _Request(self.vis_processor(raw_image))
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._lock:
+                self._num_rejected += 1
+            raise QueueFullError("Inference queue is full, try again later.")
+        return request.future
+
+    def caption(self, raw_image, timeout=None):
+        """Captions of a PIL image; a request that times out is cancelled unless already running."""
+        future = self.submit(raw_image)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def metrics(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            num_requests = self._num_requests
+            num_batches = self._num_batches
+            num_rejected = self._num_rejected
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": num_requests,
+            "rejected": num_rejected,
+            "batches": num_batches,
+            "avg_batch_size": num_requests / num_batches if num_batches else 0.0,
+            "latency_p50_ms": 1000 * _percentile(latencies, 50),
+            "latency_p99_ms": 1000 * _percentile(latencies, 99),
+        }
+
+    def _next_batch(self):
+        # cancelled requests, e.g. timed out while queued, are dropped instead of captioned
+        batch = []
+        while not batch:
+            request = self._queue.get()
+            if request.future.set_running_or_notify_cancel():
+                batch.append(request)
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request.future.set_running_or_notify_cancel():
+                batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                images = torch.stack([r.image for r in batch]).to(self.device)
+                with torch.no_grad():
+                    output = self.model.generate(
+                        {"image": images}, num_captions=self.num_captions
+                    )
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            with self._lock:
+                self._num_batches += 1
+                self._num_requests += len(batch)
+                self._latencies.extend(done - r.enqueue_time for r in batch)
+
+            # generate() returns the captions of each image contiguously.
+            n = self.num_captions
+            for i, request in enumerate(batch):
+                request.future.set_result(output[i * n : (i + 1) * n])
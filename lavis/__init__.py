@@ -5,6 +5,7 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import importlib
 import os
 import sys
 
@@ -12,10 +13,26 @@ from omegaconf import OmegaConf
 
 from lavis.common.registry import registry
 
-from lavis.datasets.builders import *
-from lavis.models import *
-from lavis.processors import *
-from lavis.tasks import *
+# builders, models, processors and tasks are imported on their first registry lookup, from
+# lavis/configs/registry_manifest.json (see lavis.common.registry_manifest)
+
+# packages whose public names lavis re-exports, imported on first access; a later package
+# takes precedence, as with the star imports they replace
+_LAZY_PACKAGES = [
+    "lavis.datasets.builders",
+    "lavis.models",
+    "lavis.processors",
+    "lavis.tasks",
+]
+
+
+def __getattr__(name):
+    if not name.startswith("_"):
+        for package in reversed(_LAZY_PACKAGES):
+            module = importlib.import_module(package)
+            if name in module.__all__:
+                return getattr(module, name)
+    raise AttributeError("module 'lavis' has no attribute '{}'".format(name))
 
 
 root_dir = os.path.dirname(os.path.abspath(__file__))
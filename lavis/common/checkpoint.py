@@ -0,0 +1,512 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Sharded checkpoints of the runners, written in the background.
+
+A checkpoint is a torch file, e.g. checkpoint_3.pth, in which the large state dicts are replaced
+by references to shard files in a directory next to it:
+
+    output_dir/
+        checkpoint_3.pth                    {"model", "optimizer": {"state": <shards>, ...}, ...}
+        checkpoint_3-shards-<id>/
+            optimizer.state-00000.pth
+            optimizer.state-00001.pth
+
+The model state dict is kept in the checkpoint file when it fits in a single shard, so that the
+checkpoints of small models can still be loaded with torch.load(path)["model"]. The shards are
+written first and the checkpoint file is renamed into place last, so that a checkpoint is either
+complete or not there.
+
+load_state_dict and load_state_dict_into load model weights without unpickling them into memory
+first: safetensors files (see convert_checkpoint.py) and .pth files are memory-mapped, their
+tensors are only read when they are copied into the parameters, one submodule at a time, and a
+key prefix selects the weights of a submodule without reading the others.
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import torch
+from lavis.common.dist_utils import download_cached_file
+from lavis.common.utils import is_url
+
+# entries sharded in the checkpoint, and whether they are kept in the checkpoint file when they fit
+# in a single shard
+SHARDED_ENTRIES = [(("model",), True), (("optimizer", "state"), False)]
+SHARDS_KEY = "__shards__"
+DEFAULT_SHARD_SIZE = 2 * 1024**3
+SAFETENSORS_EXTENSION = ".safetensors"
+
+
+def snapshot(obj):
+    """
+    Copies the tensors of a checkpoint to the cpu, so that training can go on while it is written.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    elif isinstance(obj, dict):
+        copied = OrderedDict() if isinstance(obj, OrderedDict) else {}
+        for key, value in obj.items():
+            copied[key] = snapshot(value)
+        if hasattr(obj, "_metadata"):
+            # versions of the modules, used by load_state_dict
+            copied._metadata = obj._metadata
+        return copied
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(x) for x in obj)
+    else:
+        return obj
+
+
+def _nbytes(obj):
+    if torch.is_tensor(obj):
+        return obj.numel() * obj.element_size()
+    elif isinstance(obj, dict):
+        return sum(_nbytes(value) for value in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(_nbytes(x) for x in obj)
+    else:
+        return 0
+
+
+def _split(mapping, shard_size):
+    """Splits the keys of a mapping into groups of at most shard_size bytes, in order."""
+    shards, size = [[]], 0
+    for key, value in mapping.items():
+        nbytes = _nbytes(value)
+        if shards[-1] and size + nbytes > shard_size:
+            shards.append([])
+            size = 0
+        shards[-1].append(key)
+        size += nbytes
+    return shards
+
+
+def _get_entry(checkpoint, path):
+    for key in path:
+        if not isinstance(checkpoint, dict) or key not in checkpoint:
+            return None
+        checkpoint = checkpoint[key]
+    return checkpoint
+
+
+def _set_entry(checkpoint, path, value):
+    for key in path[:-1]:
+        checkpoint = checkpoint[key]
+    checkpoint[path[-1]] = value
+
+
+def save_checkpoint_file(checkpoint, path, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Saves a checkpoint dict with its large state dicts in shards of at most shard_size bytes.
+    Replaces the shards of a previous checkpoint at the same path once it is saved.
+    """
+    root = os.path.splitext(path)[0]
+    shards_dir = "{}-shards-{}".format(root, uuid.uuid4().hex[:8])
+    tmp_dir = shards_dir + ".tmp"
+
+    # shallow copies of the dicts on the paths to the sharded entries
+    checkpoint = dict(checkpoint)
+    for entry, _ in SHARDED_ENTRIES:
+        for i in range(1, len(entry)):
+            value = _get_entry(checkpoint, entry[:i])
+            if isinstance(value, dict):
+                _set_entry(checkpoint, entry[:i], dict(value))
+
+    for entry, inline in SHARDED_ENTRIES:
+        mapping = _get_entry(checkpoint, entry)
+        if not isinstance(mapping, dict) or not mapping:
+            continue
+        if inline and _nbytes(mapping) <= shard_size:
+            continue
+
+        os.makedirs(tmp_dir, exist_ok=True)
+        files = []
+        for i, keys in enumerate(_split(mapping, shard_size)):
+            filename = "{}-{:05d}.pth".format(".".join(entry), i)
+            torch.save({key: mapping[key] for key in keys}, os.path.join(tmp_dir, filename))
+            files.append((filename, keys))
+
+        _set_entry(
+            checkpoint,
+            entry,
+            {
+                SHARDS_KEY: {
+                    "dir": os.path.basename(shards_dir),
+                    "files": files,
+                    "metadata": getattr(mapping, "_metadata", None),
+                }
+            },
+        )
+
+    if os.path.isdir(tmp_dir):
+        os.replace(tmp_dir, shards_dir)
+
+    tmp_path = path + ".tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+    # shards of the previous checkpoint at this path, or of interrupted saves
+    for name in os.listdir(os.path.dirname(os.path.abspath(path))):
+        stale = os.path.join(os.path.dirname(path), name)
+        if name.startswith(os.path.basename(root) + "-shards-") and stale != shards_dir:
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+class ShardedStateDict(Mapping):
+    """
+    Read-only state dict of a sharded checkpoint entry, loading each shard on first access.
+    """
+
+    def __init__(self, shards_dir, files, metadata=None, map_location="cpu"):
+        self.shards_dir = shards_dir
+        self.map_location = map_location
+        self._shard_of_key = OrderedDict(
+            (key, filename) for filename, keys in files for key in keys
+        )
+        self._shards = {}
+        if metadata is not None:
+            self._metadata = metadata
+
+    def _load_shard(self, filename):
+        if filename not in self._shards:
+            self._shards[filename] = torch.load(
+                os.path.join(self.shards_dir, filename), map_location=self.map_location
+            )
+        return self._shards[filename]
+
+    def __getitem__(self, key):
+        return self._load_shard(self._shard_of_key[key])[key]
+
+    def __iter__(self):
+        return iter(self._shard_of_key)
+
+    def __len__(self):
+        return len(self._shard_of_key)
+
+    @property
+    def num_loaded_shards(self):
+        return len(self._shards)
+
+
+def _resolve_shards(obj, directory, map_location):
+    if not isinstance(obj, dict):
+        return obj
+    if SHARDS_KEY in obj:
+        shards = obj[SHARDS_KEY]
+        return ShardedStateDict(
+            os.path.join(directory, shards["dir"]),
+            shards["files"],
+            metadata=shards.get("metadata"),
+            map_location=map_location,
+        )
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            obj[key] = _resolve_shards(value, directory, map_location)
+    return obj
+
+
+def load_checkpoint_file(path, map_location="cpu", mmap=False):
+    """
+    Loads a checkpoint saved by torch.save or save_checkpoint_file. Sharded entries are returned
+    as ShardedStateDict, whose shards are only read when their keys are accessed.
+
+    With mmap, the tensors of the checkpoint file are memory-mapped instead of read, when it is
+    in the zip format of torch.save.
+    """
+    checkpoint = None
+    if mmap:
+        try:
+            checkpoint = torch.load(path, map_location=map_location, mmap=True)
+        except (RuntimeError, TypeError):
+            # legacy format, or torch < 2.1, cannot be memory-mapped
+            pass
+    if checkpoint is None:
+        checkpoint = torch.load(path, map_location=map_location)
+    return _resolve_shards(checkpoint, os.path.dirname(path), map_location)
+
+
+class SafetensorsStateDict(Mapping):
+    """
+    Read-only state dict of a memory-mapped safetensors file, optionally restricted to the keys
+    starting with a prefix. Tensors are read from the file when they are accessed.
+    """
+
+    def __init__(self, path, prefix=None, device="cpu"):
+        from safetensors import safe_open
+
+        self.path = path
+        self._file = safe_open(path, framework="pt", device=str(device))
+        self._keys = [
+            key for key in self._file.keys() if prefix is None or key.startswith(prefix)
+        ]
+        self._key_set = set(self._keys)
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return self._file.get_tensor(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _source_metadata(path):
+    """Metadata identifying the version of the file at path, stored in its conversions."""
+    stat = os.stat(path)
+    return {"source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)}
+
+
+def _is_current_conversion(converted, path):
+    """
+    Whether the safetensors file converted was converted from the current version of path,
+    as recorded by convert_to_safetensors, or is newer than path if it has no such record.
+    """
+    from safetensors import safe_open
+
+    with safe_open(converted, framework="pt") as f:
+        metadata = f.metadata() or {}
+    if "source_mtime_ns" in metadata:
+        source = _source_metadata(path)
+        return all(metadata.get(key) == value for key, value in source.items())
+    return os.path.getmtime(converted) >= os.path.getmtime(path)
+
+
+def load_state_dict(url_or_filename, prefix=None, map_location="cpu"):
+    """
+    Loads the model state dict of a checkpoint, i.e. its "model" entry if it has one, without
+    reading its tensors. Prefers the safetensors conversion of a .pth file when it is next to it
+    and was converted from the current version of the .pth file.
+
+    Args:
+        url_or_filename (str): .safetensors or .pth file, or url.
+        prefix (str): if given, only the keys starting with prefix are loaded.
+        map_location: device of the tensors.
+    """
+    if is_url(url_or_filename):
+        path = download_cached_file(url_or_filename, check_hash=False, progress=True)
+    elif os.path.isfile(url_or_filename):
+        path = url_or_filename
+    else:
+        raise RuntimeError("checkpoint url or path is invalid")
+
+    converted = os.path.splitext(path)[0] + SAFETENSORS_EXTENSION
+    if not path.endswith(SAFETENSORS_EXTENSION) and os.path.isfile(converted):
+        if _is_current_conversion(converted, path):
+            logging.info("Loading {} instead of {}.".format(converted, path))
+            path = converted
+        else:
+            logging.warning(
+                "{} was converted from an earlier version of {}, which is loaded instead. "
+                "Convert the checkpoint again to load it faster.".format(converted, path)
+            )
+
+    if path.endswith(SAFETENSORS_EXTENSION):
+        return SafetensorsStateDict(path, prefix=prefix, device=map_location)
+
+    checkpoint = load_checkpoint_file(path, map_location=map_location, mmap=True)
+    state_dict = checkpoint["model"] if "model" in checkpoint else checkpoint
+    if prefix is not None:
+        state_dict = {key: state_dict[key] for key in state_dict if key.startswith(prefix)}
+    return state_dict
+
+
+def convert_to_safetensors(url_or_filename, output_path=None):
+    """
+    Saves the model state dict of a checkpoint as a safetensors file, by default next to it with
+    the .safetensors extension, where load_state_dict finds it. Returns the path of the file.
+    """
+    from safetensors.torch import save_file
+
+    path = url_or_filename
+    if is_url(url_or_filename):
+        path = download_cached_file(url_or_filename, check_hash=False, progress=True)
+    state_dict = load_state_dict(path)
+    if output_path is None:
+        output_path = os.path.splitext(path)[0] + SAFETENSORS_EXTENSION
+
+    tensors, storages = {}, set()
+    for key in state_dict:
+        tensor = state_dict[key]
+        if not torch.is_tensor(tensor):
+            logging.warning("Skipping {}, which is not a tensor.".format(key))
+            continue
+        # safetensors does not store tensors sharing memory, e.g. tied weights
+        storage = tensor.untyped_storage().data_ptr()
+        if storage in storages:
+            tensor = tensor.clone()
+        storages.add(storage)
+        tensors[key] = tensor.contiguous()
+
+    metadata = {"format": "pt"}
+    if not path.endswith(SAFETENSORS_EXTENSION):
+        # lets load_state_dict tell whether the checkpoint was overwritten since
+        metadata.update(_source_metadata(path))
+    # the previous conversion may be the file that state_dict reads from
+    tmp_path = output_path + ".tmp"
+    save_file(tensors, tmp_path, metadata=metadata)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def load_state_dict_into(module, state_dict, strict=False):
+    """
+    Same as module.load_state_dict(state_dict, strict), except that the tensors of state_dict
+    are read one submodule at a time instead of all at once, so that the tensors of a lazy state
+    dict are copied into the parameters without being held in memory together.
+    """
+    metadata = getattr(state_dict, "_metadata", None)
+    keys = set(state_dict.keys())
+    loaded = set()
+    missing_keys, unexpected_keys, error_msgs = [], [], []
+
+    with torch.no_grad():
+        for name, submodule in module.named_modules(remove_duplicate=False):
+            prefix = name + "." if name else ""
+            local_names = list(submodule._parameters) + [
+                buffer
+                for buffer in submodule._buffers
+                if buffer not in submodule._non_persistent_buffers_set
+            ]
+            if type(submodule).get_extra_state is not torch.nn.Module.get_extra_state:
+                local_names.append("_extra_state")
+
+            local_keys = [prefix + local_name for local_name in local_names]
+            local_state_dict = {key: state_dict[key] for key in local_keys if key in keys}
+            local_metadata = {} if metadata is None else metadata.get(name, {})
+
+            submodule._load_from_state_dict(
+                local_state_dict,
+                prefix,
+                local_metadata,
+                True,
+                missing_keys,
+                unexpected_keys,
+                error_msgs,
+            )
+            loaded.update(local_state_dict)
+            del local_state_dict
+
+    unexpected_keys.extend(key for key in state_dict.keys() if key not in loaded)
+    if strict:
+        if unexpected_keys:
+            error_msgs.insert(
+                0,
+                "Unexpected key(s) in state_dict: {}. ".format(
+                    ", ".join('"{}"'.format(k) for k in unexpected_keys)
+                ),
+            )
+        if missing_keys:
+            error_msgs.insert(
+                0,
+                "Missing key(s) in state_dict: {}. ".format(
+                    ", ".join('"{}"'.format(k) for k in missing_keys)
+                ),
+            )
+    if error_msgs:
+        raise RuntimeError(
+            "Error(s) in loading state_dict for {}:\n\t{}".format(
+                module.__class__.__name__, "\n\t".join(error_msgs)
+            )
+        )
+
+    return torch.nn.modules.module._IncompatibleKeys(missing_keys, unexpected_keys)
+
+
+def prune_checkpoints(directory, keep_last):
+    """
+    Removes all but the keep_last latest numbered checkpoints, e.g. checkpoint_3.pth, and their
+    shards. checkpoint_best.pth is kept.
+    """
+    numbered = []
+    for name in os.listdir(directory):
+        match = re.match(r"^checkpoint_(\d+)\.pth$", name)
+        if match is not None:
+            numbered.append((int(match.group(1)), name))
+
+    for _, name in sorted(numbered)[: max(len(numbered) - keep_last, 0)]:
+        root = os.path.splitext(name)[0]
+        os.remove(os.path.join(directory, name))
+        for shards in os.listdir(directory):
+            if shards.startswith(root + "-shards-"):
+                shutil.rmtree(os.path.join(directory, shards), ignore_errors=True)
+        logging.info("Removed checkpoint {}.".format(os.path.join(directory, name)))
+
+
+class CheckpointWriter:
+    """
+    Saves checkpoints with save_checkpoint_file in a background thread.
+
+    The tensors are copied to the cpu on the calling thread, which is the only time training is
+    blocked, unless the previous checkpoint is still being written. At most one checkpoint is
+    written at a time.
+
+    Args:
+        shard_size (int): maximum size of a shard in bytes.
+        keep_last (int): number of numbered checkpoints to keep. If None, all are kept.
+        asynchronous (bool): whether to write in a background thread.
+    """
+
+    def __init__(self, shard_size=DEFAULT_SHARD_SIZE, keep_last=None, asynchronous=True):
+        self.shard_size = shard_size
+        self.keep_last = keep_last
+        self.asynchronous = asynchronous
+
+        self._thread = None
+        self._error = None
+
+    def save(self, checkpoint, path):
+        self.wait()
+
+        start_time = time.time()
+        checkpoint = snapshot(checkpoint)
+        snapshot_time = time.time() - start_time
+
+        if self.asynchronous:
+            self._thread = threading.Thread(
+                target=self._write,
+                args=(checkpoint, path, snapshot_time),
+                name="checkpoint-writer",
+            )
+            self._thread.start()
+        else:
+            self._write(checkpoint, path, snapshot_time)
+            self.wait()
+
+    def _write(self, checkpoint, path, snapshot_time):
+        try:
+            start_time = time.time()
+            save_checkpoint_file(checkpoint, path, shard_size=self.shard_size)
+            if self.keep_last is not None:
+                prune_checkpoints(os.path.dirname(os.path.abspath(path)), self.keep_last)
+
+            logging.info(
+                "Saved checkpoint {} in {:.2f}s, training blocked for {:.2f}s.".format(
+                    path, time.time() - start_time, snapshot_time
+                )
+            )
+        except Exception as e:
+            self._error = e
+
+    def wait(self):
+        """Waits for the checkpoint being written, and raises the error if it failed."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Failed to save checkpoint.") from error
@@ -353,6 +353,36 @@ def create_runner_config_validator():
         "num_workers",
         help="Number of workers for data loading.",
     )
+    # add arguments for whether data loading workers persist across epochs
+    validator.add_argument(
+        "persistent_workers",
+        type=bool,
+        help="Whether to keep the data loading workers alive across epochs. Default: True for training, False for evaluation.",
+    )
+    # add arguments for number of batches loaded in advance by each worker
+    validator.add_argument(
+        "prefetch_factor",
+        type=int,
+        help="Number of batches loaded in advance by each data loading worker.",
+    )
+    # add arguments for number of batches copied to the device in advance
+    validator.add_argument(
+        "prefetch_depth",
+        type=int,
+        help="Number of batches copied to the device ahead of the batch in use. Default: 1.",
+    )
+    # add arguments for grouping evaluation samples by input length
+    validator.add_argument(
+        "group_eval_by_length",
+        type=bool,
+        help="Whether to batch evaluation samples of similar input lengths together. Default: False.",
+    )
+    # add arguments for annotation field with precomputed input lengths
+    validator.add_argument(
+        "eval_length_key",
+        type=str,
+        help="Annotation field with the token count of the input, used by group_eval_by_length.",
+    )
     # add arguments for warm up steps
     validator.add_argument(
         "warmup_steps",
@@ -371,6 +401,24 @@ def create_runner_config_validator():
         type=str,
         help="Output directory to save checkpoints and logs.",
     )
+    # add arguments for whether checkpoints are written in the background
+    validator.add_argument(
+        "async_checkpoint",
+        type=bool,
+        help="Whether to write checkpoints in a background thread. Default: True.",
+    )
+    # add arguments for maximum size of checkpoint shards
+    validator.add_argument(
+        "checkpoint_shard_mb",
+        type=int,
+        help="Maximum size of the checkpoint shards in MB. Default: 2048.",
+    )
+    # add arguments for number of numbered checkpoints to keep
+    validator.add_argument(
+        "keep_last_checkpoints",
+        type=int,
+        help="Number of latest numbered checkpoints to keep. If not provided, all are kept.",
+    )
     # add arguments for whether only use evaluation
     validator.add_argument(
         "evaluate",
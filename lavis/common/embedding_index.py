@@ -0,0 +1,285 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.f16"
+PATHS_FILE = "paths.txt"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGN_FILE = "ivf_assign.i32"
+
+# rows converted to float32 at once by exact search and k-means
+SEARCH_CHUNK_SIZE = 2**16
+DEFAULT_NPROBE = 16
+
+
+def _normalize(x):
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    norm = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norm, 1e-12)
+
+
+def _topk(scores, ids, k):
+    """Top-k of each row of scores (Q, N), sorted by decreasing score. ids (N,) or (Q, N)."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return (
+            np.zeros((scores.shape[0], 0), dtype=np.float32),
+            np.zeros((scores.shape[0], 0), dtype=np.int64),
+        )
+
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(k), scores.shape).copy()
+    top = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    part = np.take_along_axis(part, order, axis=1)
+
+    ids = np.broadcast_to(ids, scores.shape)
+    return np.take_along_axis(scores, part, axis=1), np.take_along_axis(ids, part, axis=1)
+
+
+class EmbeddingIndex:
+    """
+    Append-only index of L2-normalized embeddings for cosine similarity search.
+
+    The embeddings are stored as a raw float16 matrix that is memory-mapped for search,
+    next to a table with the path of each row:
+
+        index_dir/
+            meta.json           {"dim", "count", "paths_size", "nlist"}
+            embeddings.f16      (count, dim) float16
+            paths.txt           one path per row
+            ivf_centroids.npy   (nlist, dim) float32, once train_ivf() was called
+            ivf_assign.i32      (count,) inverted list of each row, idem
+
+    meta.json is rewritten atomically after the rows of an append are written, so rows
+    of an interrupted append are discarded by the next one.
+
+    Search is exact by default. Once an IVF index is trained, queries only score the rows
+    of the nprobe inverted lists closest to them, and rows appended later are assigned to
+    the existing lists.
+    """
+
+    def __init__(self, index_dir, dim=None):
+        self.index_dir = index_dir
+
+        if os.path.exists(self._file(META_FILE)):
+            with open(self._file(META_FILE), "r") as f:
+                self.meta = json.load(f)
+            assert dim is None or dim == self.meta["dim"], "dim does not match the index"
+        else:
+            assert dim is not None, "dim is required to create an index"
+            os.makedirs(index_dir, exist_ok=True)
+            self.meta = {"dim": int(dim), "count": 0, "paths_size": 0, "nlist": 0}
+            self._truncate()
+            self._write_meta()
+
+        with open(self._file(PATHS_FILE), "rb") as f:
+            paths = f.read(self.meta["paths_size"]).decode("utf-8")
+        self.paths = paths.split("\n")[: self.count] if self.count else []
+
+        self.centroids = None
+        if self.meta["nlist"]:
+            self.centroids = np.load(self._file(IVF_CENTROIDS_FILE))
+
+        self._embeddings = None
+        self._lists = None
+
+    def _file(self, name):
+        return os.path.join(self.index_dir, name)
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    @property
+    def count(self):
+        return self.meta["count"]
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            if self.count == 0:
+                self._embeddings = np.zeros((0, self.dim), dtype=np.float16)
+            else:
+                self._embeddings = np.memmap(
+                    self._file(EMBEDDINGS_FILE),
+                    dtype=np.float16,
+                    mode="r",
+                    shape=(self.count, self.dim),
+                )
+        return self._embeddings
+
+    def _write_meta(self):
+        tmp_path = self._file(META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._file(META_FILE))
+
+    def _truncate(self):
+        """Drops whatever an interrupted append wrote after the committed rows."""
+        sizes = [
+            (EMBEDDINGS_FILE, self.count * self.dim * 2),
+            (PATHS_FILE, self.meta["paths_size"]),
+        ]
+        if self.meta["nlist"]:
+            sizes.append((IVF_ASSIGN_FILE, self.count * 4))
+
+        for name, size in sizes:
+            with open(self._file(name), "ab") as f:
+                f.truncate(size)
+
+    def add(self, embeddings, paths):
+        """Appends embeddings (N, dim), normalized here, with the path of each row."""
+        embeddings = _normalize(embeddings)
+        paths = list(paths)
+        assert embeddings.shape == (len(paths), self.dim), "expected one embedding per path"
+        assert all("\n" not in path for path in paths), "paths cannot contain newlines"
+        if not paths:
+            return
+
+        self._truncate()
+        with open(self._file(EMBEDDINGS_FILE), "ab") as f:
+            f.write(embeddings.astype(np.float16).tobytes())
+
+        encoded = "".join(
+            ("\n" if i > 0 or self.count > 0 else "") + path for i, path in enumerate(paths)
+        ).encode("utf-8")
+        with open(self._file(PATHS_FILE), "ab") as f:
+            f.write(encoded)
+
+        if self.centroids is not None:
+            with open(self._file(IVF_ASSIGN_FILE), "ab") as f:
+                f.write(self._assign(embeddings).tobytes())
+
+        self.meta["count"] += len(paths)
+        self.meta["paths_size"] += len(encoded)
+        self._write_meta()
+
+        self.paths.extend(paths)
+        self._embeddings = None
+        self._lists = None
+
+    def _assign(self, embeddings):
+        assign = np.empty(len(embeddings), dtype=np.int32)
+        for i in range(0, len(embeddings), SEARCH_CHUNK_SIZE):
+            chunk = np.asarray(embeddings[i : i + SEARCH_CHUNK_SIZE], dtype=np.float32)
+            assign[i : i + len(chunk)] = (chunk @ self.centroids.T).argmax(1)
+        return assign
+
+    def train_ivf(self, nlist, niter=10, sample_size=None, seed=0):
+        """
+        Clusters the embeddings into nlist inverted lists with spherical k-means, trained
+        on a random sample of sample_size rows (default 64 * nlist).
+        """
+        assert 0 < nlist <= self.count, "nlist must be between 1 and the number of rows"
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(self.count, sample_size or 64 * nlist)
+        sample_idx = np.sort(rng.choice(self.count, sample_size, replace=False))
+        sample = np.asarray(self.embeddings[sample_idx], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(niter):
+            self.centroids = centroids
+            assign = self._assign(sample)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # restart empty lists from random samples
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        np.save(self._file(IVF_CENTROIDS_FILE), centroids)
+        with open(self._file(IVF_ASSIGN_FILE), "wb") as f:
+            f.write(self._assign(self.embeddings).tobytes())
+
+        self.meta["nlist"] = nlist
+        self._write_meta()
+        self._lists = None
+
+    @property
+    def lists(self):
+        """Row ids of each inverted list, in increasing order."""
+        if self._lists is None:
+            assign = np.fromfile(self._file(IVF_ASSIGN_FILE), dtype=np.int32, count=self.count)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(self.meta["nlist"] + 1))
+            self._lists = [order[bounds[i] : bounds[i + 1]] for i in range(self.meta["nlist"])]
+        return self._lists
+
+    def search(self, queries, k=10, nprobe=None, exact=False):
+        """
+        Returns the scores and row ids, each (Q, k), of the k rows most similar to each of
+        the queries (Q, dim), or (k,) for a single query (dim,). Uses the IVF index if one
+        was trained, unless exact is set.
+        """
+        single = np.ndim(queries) == 1
+        queries = _normalize(queries)
+
+        if self.centroids is None or exact:
+            scores, ids = self._search_exact(queries, k)
+        else:
+            scores, ids = self._search_ivf(queries, k, nprobe or DEFAULT_NPROBE)
+
+        if single:
+            return scores[0], ids[0]
+        return scores, ids
+
+    def _search_exact(self, queries, k):
+        scores, ids = _topk(np.zeros((len(queries), 0), dtype=np.float32), np.zeros(0), k)
+        for start in range(0, self.count, SEARCH_CHUNK_SIZE):
+            chunk = np.asarray(self.embeddings[start : start + SEARCH_CHUNK_SIZE], dtype=np.float32)
+            chunk_scores, chunk_ids = _topk(
+                queries @ chunk.T, np.arange(start, start + len(chunk)), k
+            )
+            scores, ids = _topk(
+                np.concatenate([scores, chunk_scores], axis=1),
+                np.concatenate([ids, chunk_ids], axis=1),
+                k,
+            )
+        return scores, ids
+
+    def _search_ivf(self, queries, k, nprobe):
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        all_scores, all_ids = [], []
+        for query, probe in zip(queries, probes):
+            rows = np.sort(np.concatenate([self.lists[i] for i in probe]))
+            query_scores = np.asarray(self.embeddings[rows], dtype=np.float32) @ query
+            scores, ids = _topk(query_scores[None], rows, k)
+
+            # pad when the probed lists hold fewer than k rows
+            pad = min(k, self.count) - scores.shape[1]
+            all_scores.append(np.pad(scores[0], (0, pad), constant_values=-np.inf))
+            all_ids.append(np.pad(ids[0], (0, pad), constant_values=-1))
+        return np.stack(all_scores), np.stack(all_ids)
+
+    @classmethod
+    def from_features(cls, index_dir, path2feat, batch_size=SEARCH_CHUNK_SIZE):
+        """Builds an index from a {path: feature} dict, e.g. a legacy path2feat .pth file."""
+        paths = sorted(path2feat.keys())
+        dim = len(np.asarray(path2feat[paths[0]]))
+
+        index = cls(index_dir, dim=dim)
+        for i in range(0, len(paths), batch_size):
+            batch = paths[i : i + batch_size]
+            index.add(np.stack([np.asarray(path2feat[p], dtype=np.float32) for p in batch]), batch)
+        return index
@@ -5,6 +5,8 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import importlib
+
 
 class Registry:
     mapping = {
@@ -18,6 +20,9 @@ class Registry:
         "paths": {},
     }
 
+    # {kind: {name: module}} of the names that are imported on first lookup
+    manifest = None
+
     @classmethod
     def register_builder(cls, name):
         r"""Register a dataset builder to registry with key 'name'
@@ -230,19 +235,19 @@ class Registry:
 
     @classmethod
     def get_builder_class(cls, name):
-        return cls.mapping["builder_name_mapping"].get(name, None)
+        return cls._get_registered("builder", name)
 
     @classmethod
     def get_model_class(cls, name):
-        return cls.mapping["model_name_mapping"].get(name, None)
+        return cls._get_registered("model", name)
 
     @classmethod
     def get_task_class(cls, name):
-        return cls.mapping["task_name_mapping"].get(name, None)
+        return cls._get_registered("task", name)
 
     @classmethod
     def get_processor_class(cls, name):
-        return cls.mapping["processor_name_mapping"].get(name, None)
+        return cls._get_registered("processor", name)
 
     @classmethod
     def get_lr_scheduler_class(cls, name):
@@ -258,15 +263,15 @@ class Registry:
 
     @classmethod
     def list_models(cls):
-        return sorted(cls.mapping["model_name_mapping"].keys())
+        return cls._list_registered("model")
 
     @classmethod
     def list_tasks(cls):
-        return sorted(cls.mapping["task_name_mapping"].keys())
+        return cls._list_registered("task")
 
     @classmethod
     def list_processors(cls):
-        return sorted(cls.mapping["processor_name_mapping"].keys())
+        return cls._list_registered("processor")
 
     @classmethod
     def list_lr_schedulers(cls):
@@ -274,7 +279,32 @@ class Registry:
 
     @classmethod
     def list_datasets(cls):
-        return sorted(cls.mapping["builder_name_mapping"].keys())
+        return cls._list_registered("builder")
+
+    @classmethod
+    def _get_manifest(cls):
+        if cls.manifest is None:
+            from lavis.common.registry_manifest import load_manifest
+
+            cls.manifest = load_manifest()
+        return cls.manifest
+
+    @classmethod
+    def _get_registered(cls, kind, name):
+        """
+        Class registered with name, importing the module that registers it on first lookup.
+        """
+        mapping = cls.mapping[kind + "_name_mapping"]
+        if name not in mapping:
+            module = cls._get_manifest()[kind].get(name, None)
+            if module is not None:
+                importlib.import_module(module)
+        return mapping.get(name, None)
+
+    @classmethod
+    def _list_registered(cls, kind):
+        names = set(cls.mapping[kind + "_name_mapping"]) | set(cls._get_manifest()[kind])
+        return sorted(names)
 
     @classmethod
     def get_path(cls, name):
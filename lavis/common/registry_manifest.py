@@ -0,0 +1,108 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Names of the builders, models, processors and tasks of the registry, and the modules that
+register them. The registry imports the module of a name on its first lookup, so that importing
+lavis does not import every model family and its dependencies.
+
+The manifest is lavis/configs/registry_manifest.json. Regenerate it after adding, renaming or
+moving a registered class:
+
+    python -m lavis.common.registry_manifest
+"""
+
+import ast
+import importlib
+import json
+import os
+
+KINDS = ("builder", "model", "processor", "task")
+
+LIBRARY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(LIBRARY_ROOT, "configs", "registry_manifest.json")
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def scan_registrations(library_root=LIBRARY_ROOT):
+    """
+    Finds the classes decorated with registry.register_<kind>("name") in the source of the
+    library, without importing it.
+    """
+    package_root = os.path.dirname(library_root)
+    manifest = {kind: {} for kind in KINDS}
+
+    for dirpath, dirnames, filenames in os.walk(library_root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            if "registry.register_" not in source:
+                continue
+
+            module = os.path.splitext(os.path.relpath(path, package_root))[0].replace(os.sep, ".")
+            for node in ast.walk(ast.parse(source)):
+                if not isinstance(node, ast.ClassDef):
+                    continue
+                for decorator in node.decorator_list:
+                    registration = _registration(decorator)
+                    if registration is not None:
+                        kind, name = registration
+                        manifest[kind][name] = module
+
+    return {kind: dict(sorted(names.items())) for kind, names in manifest.items()}
+
+
+def _registration(decorator):
+    if not (
+        isinstance(decorator, ast.Call)
+        and isinstance(decorator.func, ast.Attribute)
+        and isinstance(decorator.func.value, ast.Name)
+        and decorator.func.value.id == "registry"
+        and decorator.func.attr.startswith("register_")
+        and decorator.args
+        and isinstance(decorator.args[0], ast.Constant)
+    ):
+        return None
+    kind = decorator.func.attr[len("register_") :]
+    if kind not in KINDS:
+        return None
+    return kind, decorator.args[0].value
+
+
+def lazy_attributes(attributes):
+    """
+    Module __getattr__ importing attributes {name: module} of a package on first access.
+    """
+
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError("module has no attribute '{}'".format(name))
+        return getattr(importlib.import_module(attributes[name]), name)
+
+    return __getattr__
+
+
+def main():
+    manifest = scan_registrations()
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(
+        "Wrote {} ({})".format(
+            MANIFEST_PATH, ", ".join("{} {}s".format(len(manifest[kind]), kind) for kind in KINDS)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
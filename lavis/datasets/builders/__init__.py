@@ -5,124 +5,106 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
-from lavis.datasets.builders.base_dataset_builder import load_dataset_config
-from lavis.datasets.builders.caption_builder import (
-    COCOCapBuilder,
-    MSRVTTCapBuilder,
-    MSVDCapBuilder,
-    VATEXCapBuilder,
-    MSRVTTCapInstructBuilder,
-    MSVDCapInstructBuilder,
-    VATEXCapInstructBuilder,
-    WebVid2MCapBuilder,
-    WebVid2MCapInstructBuilder,
-    VALORCaptionBuilder,
-    VALORCaptionInstructBuilder,
-    ViolinCapBuilder,
-    ViolinCapInstructBuilder,
-    VlepCaptionInstructBuilder, 
-    VlepCaptionBuilder,
-    YouCookCaptionBuilder,
-    YouCookCaptionInstructBuilder,
-    COINCaptionBuilder,
-    COINCaptionInstructBuilder,
-    CharadeCaptionBuilder,
-    CharadeCaptionInstructBuilder,
-    TextCapsCapBuilder,
-    TextCapsCapInstructBuilder,
-    Flickr30kCapBuilder,
-    Flickr30kCapInstructBuilder
-
-)
-from lavis.datasets.builders.image_text_pair_builder import (
-    ConceptualCaption12MBuilder,
-    ConceptualCaption12MInstructBuilder,
-    ConceptualCaption3MBuilder,
-    ConceptualCaption3MInstructBuilder,
-    VGCaptionBuilder,
-    VGCaptionInstructBuilder,
-    SBUCaptionBuilder,
-    SBUCaptionInstructBuilder,
-    Laion400MBuilder,
-    Laion400MInstructBuilder
-)
-from lavis.datasets.builders.classification_builder import (
-    NLVRBuilder,
-    SNLIVisualEntailmentBuilder,
-    SNLIVisualEntailmentInstructBuilder,
-    ViolinEntailmentInstructBuilder,
-    ViolinEntailmentBuilder,
-    ESC50ClassificationBuilder
-)
-from lavis.datasets.builders.imagefolder_builder import ImageNetBuilder
-from lavis.datasets.builders.video_qa_builder import (
-    MSRVTTQABuilder, 
-    MSVDQABuilder,
-    MSRVTTQAInstructBuilder,
-    MSVDQAInstructBuilder,
-    MusicAVQABuilder,
-    MusicAVQAInstructBuilder
-)
-
-from lavis.datasets.builders.vqa_builder import (
-    COCOVQABuilder,
-    COCOVQAInstructBuilder,
-    OKVQABuilder,
-    OKVQAInstructBuilder,
-    AOKVQABuilder,
-    AOKVQAInstructBuilder,
-    VGVQABuilder,
-    VGVQAInstructBuilder,
-    GQABuilder,
-    GQAInstructBuilder,
-    IconQABuilder,
-    IconQAInstructBuilder,
-    ScienceQABuilder,
-    ScienceQAInstructBuilder,
-    OCRVQABuilder,
-    OCRVQAInstructBuilder,
-    VizWizVQABuilder
-)
-from lavis.datasets.builders.retrieval_builder import (
-    MSRVTTRetrievalBuilder,
-    DiDeMoRetrievalBuilder,
-    COCORetrievalBuilder,
-    Flickr30kBuilder,
-)
-
-from lavis.datasets.builders.audio_caption_builder import (
-    AudioSetBuilder,
-    AudioCapsCapBuilder,
-    AudioSetInstructBuilder,
-    AudioCapsInstructCapBuilder,
-    WavCapsCapInstructBuilder,
-    WavCapsCapBuilder
-)
-
-from lavis.datasets.builders.object3d_caption_builder import (
-    ObjaverseCaptionInstructBuilder,
-    ShapenetCaptionInstructBuilder,
-    ObjaverseCaptionBuilder,
-    ShapenetCaptionBuilder
-)
-from lavis.datasets.builders.object3d_qa_builder import ObjaverseQABuilder
-from lavis.datasets.builders.object3d_classification_builder import ModelNetClassificationBuilder
-
-from lavis.datasets.builders.audio_qa_builder import AudioCapsQABuilder, ClothoQABuilder
-
-from lavis.datasets.builders.dialogue_builder import (
-    AVSDDialBuilder, 
-    AVSDDialInstructBuilder,
-    YT8MDialBuilder,
-    LLaVA150kDialInstructBuilder,
-    VisDialBuilder,
-    VisDialInstructBuilder
-)
-from lavis.datasets.builders.text_to_image_generation_builder import BlipDiffusionFinetuneBuilder
-
-from lavis.datasets.builders.discrn_builders import DiscrnImagePcBuilder, DiscrnAudioVideoBuilder
-
 from lavis.common.registry import registry
+from lavis.common.registry_manifest import lazy_attributes
+
+# classes imported on first access, like the registry imports them on first lookup
+_LAZY_ATTRIBUTES = {
+    "load_dataset_config": "lavis.datasets.builders.base_dataset_builder",
+    "COCOCapBuilder": "lavis.datasets.builders.caption_builder",
+    "MSRVTTCapBuilder": "lavis.datasets.builders.caption_builder",
+    "MSVDCapBuilder": "lavis.datasets.builders.caption_builder",
+    "VATEXCapBuilder": "lavis.datasets.builders.caption_builder",
+    "MSRVTTCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "MSVDCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "VATEXCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "WebVid2MCapBuilder": "lavis.datasets.builders.caption_builder",
+    "WebVid2MCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "VALORCaptionBuilder": "lavis.datasets.builders.caption_builder",
+    "VALORCaptionInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "ViolinCapBuilder": "lavis.datasets.builders.caption_builder",
+    "ViolinCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "VlepCaptionInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "VlepCaptionBuilder": "lavis.datasets.builders.caption_builder",
+    "YouCookCaptionBuilder": "lavis.datasets.builders.caption_builder",
+    "YouCookCaptionInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "COINCaptionBuilder": "lavis.datasets.builders.caption_builder",
+    "COINCaptionInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "CharadeCaptionBuilder": "lavis.datasets.builders.caption_builder",
+    "CharadeCaptionInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "TextCapsCapBuilder": "lavis.datasets.builders.caption_builder",
+    "TextCapsCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "Flickr30kCapBuilder": "lavis.datasets.builders.caption_builder",
+    "Flickr30kCapInstructBuilder": "lavis.datasets.builders.caption_builder",
+    "ConceptualCaption12MBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "ConceptualCaption12MInstructBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "ConceptualCaption3MBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "ConceptualCaption3MInstructBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "VGCaptionBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "VGCaptionInstructBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "SBUCaptionBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "SBUCaptionInstructBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "Laion400MBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "Laion400MInstructBuilder": "lavis.datasets.builders.image_text_pair_builder",
+    "NLVRBuilder": "lavis.datasets.builders.classification_builder",
+    "SNLIVisualEntailmentBuilder": "lavis.datasets.builders.classification_builder",
+    "SNLIVisualEntailmentInstructBuilder": "lavis.datasets.builders.classification_builder",
+    "ViolinEntailmentInstructBuilder": "lavis.datasets.builders.classification_builder",
+    "ViolinEntailmentBuilder": "lavis.datasets.builders.classification_builder",
+    "ESC50ClassificationBuilder": "lavis.datasets.builders.classification_builder",
+    "ImageNetBuilder": "lavis.datasets.builders.imagefolder_builder",
+    "MSRVTTQABuilder": "lavis.datasets.builders.video_qa_builder",
+    "MSVDQABuilder": "lavis.datasets.builders.video_qa_builder",
+    "MSRVTTQAInstructBuilder": "lavis.datasets.builders.video_qa_builder",
+    "MSVDQAInstructBuilder": "lavis.datasets.builders.video_qa_builder",
+    "MusicAVQABuilder": "lavis.datasets.builders.video_qa_builder",
+    "MusicAVQAInstructBuilder": "lavis.datasets.builders.video_qa_builder",
+    "COCOVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "COCOVQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "OKVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "OKVQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "AOKVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "AOKVQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "VGVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "VGVQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "GQABuilder": "lavis.datasets.builders.vqa_builder",
+    "GQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "IconQABuilder": "lavis.datasets.builders.vqa_builder",
+    "IconQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "ScienceQABuilder": "lavis.datasets.builders.vqa_builder",
+    "ScienceQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "OCRVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "OCRVQAInstructBuilder": "lavis.datasets.builders.vqa_builder",
+    "VizWizVQABuilder": "lavis.datasets.builders.vqa_builder",
+    "MSRVTTRetrievalBuilder": "lavis.datasets.builders.retrieval_builder",
+    "DiDeMoRetrievalBuilder": "lavis.datasets.builders.retrieval_builder",
+    "COCORetrievalBuilder": "lavis.datasets.builders.retrieval_builder",
+    "Flickr30kBuilder": "lavis.datasets.builders.retrieval_builder",
+    "AudioSetBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "AudioCapsCapBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "AudioSetInstructBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "AudioCapsInstructCapBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "WavCapsCapInstructBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "WavCapsCapBuilder": "lavis.datasets.builders.audio_caption_builder",
+    "ObjaverseCaptionInstructBuilder": "lavis.datasets.builders.object3d_caption_builder",
+    "ShapenetCaptionInstructBuilder": "lavis.datasets.builders.object3d_caption_builder",
+    "ObjaverseCaptionBuilder": "lavis.datasets.builders.object3d_caption_builder",
+    "ShapenetCaptionBuilder": "lavis.datasets.builders.object3d_caption_builder",
+    "ObjaverseQABuilder": "lavis.datasets.builders.object3d_qa_builder",
+    "ModelNetClassificationBuilder": "lavis.datasets.builders.object3d_classification_builder",
+    "AudioCapsQABuilder": "lavis.datasets.builders.audio_qa_builder",
+    "ClothoQABuilder": "lavis.datasets.builders.audio_qa_builder",
+    "AVSDDialBuilder": "lavis.datasets.builders.dialogue_builder",
+    "AVSDDialInstructBuilder": "lavis.datasets.builders.dialogue_builder",
+    "YT8MDialBuilder": "lavis.datasets.builders.dialogue_builder",
+    "LLaVA150kDialInstructBuilder": "lavis.datasets.builders.dialogue_builder",
+    "VisDialBuilder": "lavis.datasets.builders.dialogue_builder",
+    "VisDialInstructBuilder": "lavis.datasets.builders.dialogue_builder",
+    "BlipDiffusionFinetuneBuilder": "lavis.datasets.builders.text_to_image_generation_builder",
+    "DiscrnImagePcBuilder": "lavis.datasets.builders.discrn_builders",
+    "DiscrnAudioVideoBuilder": "lavis.datasets.builders.discrn_builders",
+}
+__getattr__ = lazy_attributes(_LAZY_ATTRIBUTES)
 
 __all__ = [
     "BlipDiffusionFinetuneBuilder",
@@ -239,6 +221,8 @@ def load_dataset(name, cfg_path=None, vis_path=None, data_type=None):
     if cfg_path is None:
         cfg = None
     else:
+        from lavis.datasets.builders.base_dataset_builder import load_dataset_config
+
         cfg = load_dataset_config(cfg_path)
 
     try:
@@ -267,13 +251,20 @@ def load_dataset(name, cfg_path=None, vis_path=None, data_type=None):
 
 class DatasetZoo:
     def __init__(self) -> None:
-        self.dataset_zoo = {
-            k: list(v.DATASET_CONFIG_DICT.keys())
-            for k, v in sorted(registry.mapping["builder_name_mapping"].items())
-        }
+        self._dataset_zoo = None
+
+    @property
+    def dataset_zoo(self):
+        # imports every builder
+        if self._dataset_zoo is None:
+            self._dataset_zoo = {
+                k: list(registry.get_builder_class(k).DATASET_CONFIG_DICT.keys())
+                for k in registry.list_datasets()
+            }
+        return self._dataset_zoo
 
     def get_names(self):
-        return list(self.dataset_zoo.keys())
+        return registry.list_datasets()
 
 
 dataset_zoo = DatasetZoo()
@@ -15,6 +15,7 @@ import torch.distributed as dist
 from lavis.common.dist_utils import is_dist_avail_and_initialized, is_main_process
 from lavis.common.registry import registry
 from lavis.datasets.data_utils import extract_archive
+from lavis.datasets.datasets.feature_store import FeatureStore
 from lavis.processors.base_processor import BaseProcessor
 from omegaconf import OmegaConf
 from torchvision.datasets.utils import download_url
@@ -232,6 +233,23 @@ class BaseDatasetBuilder:
                 vis_root=vis_path,
             )
 
+            # visual encoder outputs written by precompute_features.py; they replace the
+            # random augmentation of the train processor, so train splits opt in separately
+            if build_info.get("cached", False) and (
+                not is_train or build_info.get("cached_train", False)
+            ):
+                cached_dir = build_info.cached_dir
+                if not os.path.isabs(cached_dir):
+                    cached_dir = utils.get_cache_path(cached_dir)
+                cached_dir = os.path.join(cached_dir, split)
+                if os.path.isdir(cached_dir):
+                    datasets[split].set_feature_store(
+                        FeatureStore(cached_dir),
+                        key=build_info.get("cached_key", "image_id"),
+                    )
+                else:
+                    warnings.warn("cached features {} do not exist.".format(cached_dir))
+
         return datasets
 
 
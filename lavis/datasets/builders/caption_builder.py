@@ -13,6 +13,7 @@ from lavis.datasets.datasets.coco_caption_datasets import (
     COCOCapEvalDataset,
     NoCapsEvalDataset,
 )
+from lavis.datasets.datasets.cryoet_caption_datasets import CryoETCapDataset, CryoETCapEvalDataset
 
 from lavis.common.registry import registry
 from lavis.datasets.datasets.video_caption_datasets import (
@@ -54,6 +55,22 @@ class CryoETCapBuilder(BaseDatasetBuilder):
         "default": "configs/datasets/cryoet/defaults_cryoet_cap.yaml",
     }
 
+@registry.register_builder("cryoet_caption_compact")
+class CryoETCapCompactBuilder(BaseDatasetBuilder):
+    train_dataset_cls = CryoETCapDataset
+    eval_dataset_cls = CryoETCapEvalDataset
+
+    DATASET_CONFIG_DICT = {
+        "default": "configs/datasets/cryoet/defaults_cryoet_cap_compact.yaml",
+    }
+
+    def build(self):
+        datasets = super().build()
+        variants_per_mask = self.config.build_info.get("variants_per_mask", None)
+        if variants_per_mask is not None and "train" in datasets:
+            datasets["train"].set_variants_per_mask(variants_per_mask)
+        return datasets
+
 @registry.register_builder("coco_caption_instruct")
 class COCOCapInstructBuilder(BaseDatasetBuilder):
     train_dataset_cls = COCOCapInstructDataset
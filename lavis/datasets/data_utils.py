@@ -8,46 +8,24 @@
 import gzip
 import logging
 import os
-import random as rnd
 import tarfile
 import zipfile
-import cv2
 
-import decord
 import webdataset as wds
 import numpy as np
 import torch
 from torch.utils.data.dataset import IterableDataset, ChainDataset
-from decord import VideoReader
 from lavis.common.registry import registry
 from lavis.datasets.datasets.base_dataset import ConcatDataset
+from lavis.datasets.video_reader import VideoClipReader
 from tqdm import tqdm
 
-decord.bridge.set_bridge("torch")
 MAX_INT = registry.get("MAX_INT")
 
 
 def load_video(video_path, n_frms=MAX_INT, height=-1, width=-1, sampling="uniform"):
-    vr = VideoReader(uri=video_path, height=height, width=width)
-
-    vlen = len(vr)
-    start, end = 0, vlen
-
-    n_frms = min(n_frms, vlen)
-
-    if sampling == "uniform":
-        indices = np.arange(start, end, vlen / n_frms).astype(int)
-    elif sampling == "headtail":
-        indices_h = sorted(rnd.sample(range(vlen // 2), n_frms // 2))
-        indices_t = sorted(rnd.sample(range(vlen // 2, vlen), n_frms // 2))
-        indices = indices_h + indices_t
-    else:
-        raise NotImplementedError
-
-    # get_batch -> T, H, W, C
-    frms = vr.get_batch(indices).permute(3, 0, 1, 2).float()  # (C, T, H, W)
-
-    return frms
+    reader = VideoClipReader(height=height, width=width, backend="decord")
+    return reader.read(video_path, n_frms, sampling).float()  # (C, T, H, W)
 
 
 def apply_to_sample(f, sample):
@@ -68,11 +46,19 @@ def apply_to_sample(f, sample):
     return _apply(sample)
 
 
-def move_to_cuda(sample):
-    def _move_to_cuda(tensor):
-        return tensor.cuda()
+def move_to_device(sample, device, non_blocking=True):
+    """
+    Copies the tensors of a sample to a device. Copies from pinned memory are asynchronous.
+    """
+
+    def _move_to_device(tensor):
+        return tensor.to(device, non_blocking=non_blocking)
 
-    return apply_to_sample(_move_to_cuda, sample)
+    return apply_to_sample(_move_to_device, sample)
+
+
+def move_to_cuda(sample):
+    return move_to_device(sample, "cuda")
 
 
 def prepare_sample(samples, cuda_enabled=True):
@@ -287,65 +273,22 @@ def save_frames_grid(img_array, out_path):
 
 
 def uniform_frame_sampling(video_path, num_frames, target_height, target_width, start_time=None, end_time=None):
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_rate = cap.get(cv2.CAP_PROP_FPS)
-
-    if start_time is None:
-        start_time = 0
-    if end_time is None:
-        end_time = total_frames / frame_rate
-
-    start_frame = int(start_time * frame_rate)
-    end_frame = int(end_time * frame_rate)
-    frame_indices = list(range(start_frame, end_frame + 1, (end_frame - start_frame + 1) // num_frames))
-
-    frames = []
-    for frame_index in frame_indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame = cv2.resize(frame, (target_width, target_height))
-        frames.append(frame)
-
-    cap.release()
-    return frames
+    return load_clip(video_path, num_frames, target_height, target_width, start_time, end_time, sampling="uniform")
 
 
 def head_tail_frame_sampling(video_path, num_frames, target_height, target_width, start_time=None, end_time=None):
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_rate = cap.get(cv2.CAP_PROP_FPS)
-
-    if start_time is None:
-        start_time = 0
-    if end_time is None:
-        end_time = total_frames / frame_rate
-
-    start_frame = int(start_time * frame_rate)
-    end_frame = int(end_time * frame_rate)
-    frame_indices = [start_frame] + [start_frame + (end_frame - start_frame) // (num_frames - 1) * i for i in range(1, num_frames - 1)] + [end_frame]
-
-    frames = []
-    for frame_index in frame_indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame = cv2.resize(frame, (target_width, target_height))
-        frames.append(frame)
-
-    cap.release()
-    if len(frames) == 0:
-        return None
-    return torch.stack([torch.tensor(f).permute(2,0,1).float() for f in frames], dim=1)
+    return load_clip(video_path, num_frames, target_height, target_width, start_time, end_time, sampling="headtail")
 
 
 def load_clip(video_path, num_frames, target_height, target_width, start_time=None, end_time=None, sampling="headtail"):
-    if sampling == "headtail":
-        return head_tail_frame_sampling(video_path, num_frames, target_height, target_width, start_time, end_time)
-    elif sampling == "uniform":
-        return uniform_frame_sampling(video_path, num_frames, target_height, target_width, start_time, end_time)
-    else:
-        raise NotImplementedError
\ No newline at end of file
+    """
+    Frames (C, T, H, W) of video_path between start_time and end_time decoded with OpenCV, as float,
+    or None if none could be decoded. headtail samples frames evenly from the first to the last.
+    """
+    if sampling not in ("headtail", "uniform"):
+        raise NotImplementedError
+    reader = VideoClipReader(height=target_height, width=target_width, backend="opencv")
+    clip = reader.read(
+        video_path, num_frames, "linspace" if sampling == "headtail" else "uniform", start_time, end_time
+    )
+    return clip.float() if clip is not None else None
@@ -0,0 +1,160 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import argparse
+import json
+import mmap
+import os
+from collections.abc import Sequence
+
+import numpy as np
+
+
+MMAP_JSONL_SUFFIX = ".mmap.jsonl"
+
+
+def is_mmap_annotation(ann_path):
+    return ann_path.endswith(MMAP_JSONL_SUFFIX)
+
+
+class MmapJsonlAnnotations(Sequence):
+    """
+    Read-only, list-like view over one or more JSONL annotation files.
+
+    The files are memory-mapped and only the byte offsets of their lines are kept,
+    as NumPy arrays. A row is parsed into a dict when it is accessed, so DataLoader
+    workers share the annotation pages instead of each growing a copy of a list of
+    dicts through copy-on-write and refcount updates.
+
+    Since rows are parsed on access, in-place changes to a returned dict are not
+    persisted.
+    """
+
+    def __init__(self, ann_paths):
+        self.ann_paths = list(ann_paths)
+        self.instance_id_key = None
+
+        self._starts, self._ends = [], []
+        for ann_path in self.ann_paths:
+            starts, ends = self._index_lines(ann_path)
+            self._starts.append(starts)
+            self._ends.append(ends)
+        self._cum_sizes = np.cumsum([len(s) for s in self._starts]).astype(np.int64)
+        self._mmaps = None
+
+    @staticmethod
+    def _open(ann_path):
+        with open(ann_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def _index_lines(cls, ann_path):
+        buf = cls._open(ann_path)
+        data = np.frombuffer(buf, dtype=np.uint8)
+        newlines = np.flatnonzero(data == ord("\n"))
+        num_bytes = len(data)
+        del data
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+        starts = np.concatenate([[0], newlines + 1])
+        ends = np.concatenate([newlines, [num_bytes]])
+        # drop empty lines, including the one after a trailing newline
+        keep = ends > starts
+        return starts[keep].astype(np.int64), ends[keep].astype(np.int64)
+
+    def __len__(self):
+        return int(self._cum_sizes[-1]) if len(self._cum_sizes) else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("annotation index out of range")
+
+        if self._mmaps is None:
+            # opened lazily so that the store can be pickled to spawned workers
+            self._mmaps = [self._open(ann_path) for ann_path in self.ann_paths]
+
+        file_idx = int(np.searchsorted(self._cum_sizes, index, side="right"))
+        row = index - (int(self._cum_sizes[file_idx - 1]) if file_idx > 0 else 0)
+        start, end = self._starts[file_idx][row], self._ends[file_idx][row]
+
+        ann = json.loads(self._mmaps[file_idx][start:end])
+        if self.instance_id_key is not None:
+            ann[self.instance_id_key] = str(index)
+        return ann
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_mmaps"] = None
+        return state
+
+
+def load_annotation_file(ann_path):
+    """Loads a json/jsonl/csv/tsv annotation file into a list of dicts, as BaseDataset does."""
+    if any(ext in ann_path for ext in ["csv", "tsv"]):
+        import pandas as pd
+
+        return pd.read_csv(ann_path).to_dict(orient="records")
+
+    with open(ann_path, "r") as f:
+        if "jsonl" in ann_path:
+            return [json.loads(line) for line in f if line.strip()]
+
+        loaded = json.load(f)
+    if isinstance(loaded, dict):
+        return [
+            {"sample_id": k, **v} if isinstance(v, dict) else {"sample_id": k, "data": v}
+            for k, v in loaded.items()
+        ]
+    return loaded
+
+
+def convert_to_mmap_jsonl(ann_path, out_path=None):
+    """Converts an annotation file into the `.mmap.jsonl` format read by MmapJsonlAnnotations."""
+    if out_path is None:
+        out_path = os.path.splitext(ann_path)[0] + MMAP_JSONL_SUFFIX
+    assert is_mmap_annotation(out_path), "output path must end with {}".format(
+        MMAP_JSONL_SUFFIX
+    )
+
+    annotation = load_annotation_file(ann_path)
+    with open(out_path, "w") as f:
+        for ann in annotation:
+            # one annotation per line; json.dumps escapes embedded newlines
+            f.write(json.dumps(ann) + "\n")
+
+    return out_path, len(annotation)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert annotation files to memory-mapped JSONL (*.mmap.jsonl)."
+    )
+    parser.add_argument("ann_paths", nargs="+", help="json/jsonl/csv/tsv annotation files.")
+    parser.add_argument(
+        "--output-dir", default=None, help="Defaults to the directory of each input."
+    )
+    args = parser.parse_args()
+
+    for ann_path in args.ann_paths:
+        out_path = None
+        if args.output_dir is not None:
+            name = os.path.splitext(os.path.basename(ann_path))[0]
+            out_path = os.path.join(args.output_dir, name + MMAP_JSONL_SUFFIX)
+        out_path, num_anns = convert_to_mmap_jsonl(ann_path, out_path)
+        print("Wrote {} annotations to {}".format(num_anns, out_path))
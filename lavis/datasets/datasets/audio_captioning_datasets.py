@@ -17,6 +17,7 @@ import torchaudio
 import torch
 from tqdm import tqdm
 
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 
 class __DisplMixin:
@@ -62,13 +63,13 @@ class AudioCaptioningDataset(BaseDataset, __DisplMixin):
         return waveform.nelement() == 0
     
     def get_existing_audio_annotations(self):
-        return [f.split('_')[0] for f in os.listdir(self.audio_root)]
+        return [f.split('_')[0] for f in listdir(self.audio_root)]
 
     def get_existing_video_annotations(self):
-        return os.listdir(self.video_root)
+        return listdir(self.video_root)
     
     def get_existing_images_annotations(self):
-        return os.listdir(self.vis_root)
+        return listdir(self.vis_root)
     
     def get_video_path(self, ann):
         return  pathlib.Path(os.path.join(self.video_root, ann[self.sample_id_key])).resolve()
@@ -172,7 +173,7 @@ class AudioCapsDataset(AudioCaptioningDataset):
         self.cached = kwargs.get('cached', False)
         self.cache_dir = kwargs.get('cached_dir', '')
         def get_existing_audio_annotations(self):
-            return [f.split('_')[0] for f in os.listdir(self.audio_root)] if not self.cached else [f.split('_')[0] for f in os.listdir(self.cached_dir)]
+            return [f.split('_')[0] for f in listdir(self.audio_root)] if not self.cached else [f.split('_')[0] for f in listdir(self.cached_dir)]
 
         self.sample_ids = set.intersection(*[set(getattr(self, f"existing_{modality}_annotation")) for modality in self.modalities])
         self.annotation = [ann for ann in self.annotation if ann[self.sample_id_key] in self.sample_ids and ann[self.sample_id_key] not in kwargs.get('missing_ids', [])]
@@ -17,6 +17,7 @@ import torchaudio
 import torch
 from tqdm import tqdm
 
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 
 class __DisplMixin:
@@ -64,13 +65,13 @@ class ESC50(BaseDataset, __DisplMixin):
         return waveform.nelement() == 0
     
     def get_existing_audio_annotations(self):
-        return [f for f in os.listdir(self.audio_root)]
+        return [f for f in listdir(self.audio_root)]
 
     def get_existing_video_annotations(self):
-        return os.listdir(self.video_root)
+        return listdir(self.video_root)
     
     def get_existing_images_annotations(self):
-        return os.listdir(self.vis_root)
+        return listdir(self.vis_root)
     
     def get_video_path(self, ann):
         return  pathlib.Path(os.path.join(self.video_root, ann[self.sample_id_key])).resolve()
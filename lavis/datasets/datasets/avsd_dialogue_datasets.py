@@ -10,6 +10,7 @@ import os
 import copy
 import random
 from PIL import Image
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.dialogue_datasets import (
     DialogueDataset,
     DialogueEvalDataset,
@@ -189,10 +190,10 @@ class AVSDDialInstructEvalDataset(DialogueDataset):
              self.annotation = [ann for ann in self.annotation if ann['answer'] == '__UNDISCLOSED__']
     
     def get_existing_audio_annotations(self):
-        return [f.split('.')[0] for f in os.listdir(self.audio_root)]
+        return [f.split('.')[0] for f in listdir(self.audio_root)]
     
     def get_existing_video_annotations(self):
-        return [f.split('.')[0] for f in os.listdir(self.video_root)]
+        return [f.split('.')[0] for f in listdir(self.video_root)]
     
     def get_audio_path(self, sample_key):
         return os.path.join(self.audio_root, sample_key) + '.mp4'
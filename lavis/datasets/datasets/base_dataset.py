@@ -5,7 +5,9 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import bisect
 import json
+import logging
 from typing import Iterable
 import pandas as pd
 import torch
@@ -13,8 +15,40 @@ import torch
 from torch.utils.data import Dataset, ConcatDataset
 from torch.utils.data.dataloader import default_collate
 
+from lavis.datasets.datasets.annotation_store import (
+    MmapJsonlAnnotations,
+    is_mmap_annotation,
+)
+
+
+# annotation fields with the text given to the model, see get_input_length()
+INPUT_TEXT_KEYS = (
+    "text_input",
+    "question",
+    "prompt",
+    "instruction",
+    "context",
+    "dialog",
+    "history",
+    "ocr_tokens",
+)
+
+
+def _count_words(value):
+    if isinstance(value, str):
+        return len(value.split())
+    elif isinstance(value, (list, tuple)):
+        return sum(_count_words(v) for v in value)
+    elif isinstance(value, dict):
+        return sum(_count_words(v) for v in value.values())
+    return 0
+
 
 class BaseDataset(Dataset):
+    # precomputed visual features, see set_feature_store()
+    feature_store = None
+    feature_key = "image_id"
+
     def __init__(
         self, vis_processor=None, text_processor=None, vis_root=None, ann_paths=[]
     ):
@@ -23,7 +57,19 @@ class BaseDataset(Dataset):
         ann_root (string): directory to store the annotation file
         """
         self.vis_root = vis_root
+        self.ann_paths = list(ann_paths)
         self.annotation = []
+        mmap_ann_paths = [p for p in ann_paths if is_mmap_annotation(p)]
+        if mmap_ann_paths and len(mmap_ann_paths) == len(ann_paths):
+            # opt-in columnar store, rows are parsed on access
+            self.annotation = MmapJsonlAnnotations(mmap_ann_paths)
+            ann_paths = []
+        elif mmap_ann_paths:
+            logging.warning(
+                "Annotations in {} are loaded into memory because they are mixed with "
+                "other annotation formats.".format(mmap_ann_paths)
+            )
+
         for ann_path in ann_paths:
             if any(ext in ann_path for ext in ['csv', 'tsv']):
                 df = pd.read_csv(ann_path)
@@ -65,11 +111,50 @@ class BaseDataset(Dataset):
         return collated_dict
         # return default_collate(samples)
 
+    def get_sample_id(self, index, key="image_id"):
+        """
+        Returns field `key` of the sample at `index` as __getitem__ would, but read from
+        the annotation only, without loading media. Returns None if unsupported.
+        """
+        return None
+
+    def get_input_length(self, index, length_key=None):
+        """
+        Estimated length of the text input of the sample at `index`, read from the annotation
+        only: ann[length_key] if it is a precomputed token count, else the number of words in
+        its INPUT_TEXT_KEYS fields. Returns None if unsupported.
+        """
+        if len(self.annotation) != len(self):
+            return None
+        ann = self.annotation[index]
+        if length_key is not None and length_key in ann:
+            return int(ann[length_key])
+        return sum(_count_words(ann[key]) for key in INPUT_TEXT_KEYS if key in ann)
+
+    def set_feature_store(self, feature_store, key="image_id"):
+        """
+        Makes datasets that support it return the features stored for ann[key] as
+        "vit_embeds" instead of loading and processing the image.
+        """
+        self.feature_store = feature_store
+        self.feature_key = key
+
+    def get_cached_features(self, ann):
+        """Returns the stored features of ann, or None if no feature store is set."""
+        if self.feature_store is None:
+            return None
+        # a sample missing from the store fails loudly, mixing features and images
+        # in a batch would not collate
+        return self.feature_store[ann[self.feature_key]]
+
     def set_processors(self, vis_processor, text_processor):
         self.vis_processor = vis_processor
         self.text_processor = text_processor
 
     def _add_instance_ids(self, key="instance_id"):
+        if isinstance(self.annotation, MmapJsonlAnnotations):
+            self.annotation.instance_id_key = key
+            return
         for idx, ann in enumerate(self.annotation):
             ann[key] = str(idx)
 
@@ -93,3 +178,11 @@ class ConcatDataset(ConcatDataset):
             samples_shared_keys.append({k: s[k] for k in s.keys() if k in shared_keys})
 
         return self.datasets[0].collater(samples_shared_keys)
+
+    def get_input_length(self, index, length_key=None):
+        dataset_idx = bisect.bisect_right(self.cumulative_sizes, index)
+        sample_idx = index - (self.cumulative_sizes[dataset_idx - 1] if dataset_idx > 0 else 0)
+        dataset = self.datasets[dataset_idx]
+        if not hasattr(dataset, "get_input_length"):
+            return None
+        return dataset.get_input_length(sample_idx, length_key)
@@ -46,6 +46,14 @@ class CaptionDataset(BaseDataset, __DisplMixin):
         # TODO this assumes image input, not general enough
         ann = self.annotation[index]
 
+        vit_embeds = self.get_cached_features(ann)
+        if vit_embeds is not None:
+            return {
+                "vit_embeds": vit_embeds,
+                "text_input": self.text_processor(ann["caption"]),
+                "image_id": ann["image_id"],
+            }
+
         image_path = os.path.join(self.vis_root, ann["image"])
         try:
             image = Image.open(image_path).convert("RGB")
@@ -74,6 +82,14 @@ class CaptionEvalDataset(BaseDataset, __DisplMixin):
 
         ann = self.annotation[index]
 
+        vit_embeds = self.get_cached_features(ann)
+        if vit_embeds is not None:
+            return {
+                "vit_embeds": vit_embeds,
+                "image_id": ann["image_id"],
+                "instance_id": ann["instance_id"],
+            }
+
         image_path = os.path.join(self.vis_root, ann["image"])
         image = Image.open(image_path).convert("RGB")
 
@@ -85,6 +101,11 @@ class CaptionEvalDataset(BaseDataset, __DisplMixin):
             "instance_id": ann["instance_id"],
         }
 
+    def get_sample_id(self, index, key="image_id"):
+        if key in ("image_id", "instance_id"):
+            return self.annotation[index][key]
+        return None
+
 class CaptionInstructDataset(CaptionDataset):
     def __getitem__(self, index):
         data = super().__getitem__(index)
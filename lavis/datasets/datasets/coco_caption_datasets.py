@@ -36,7 +36,7 @@ class COCOCapEvalDataset(CaptionEvalDataset):
 
         image = self.vis_processor(image)
 
-        img_id = ann["image"].split("/")[-1].strip(".jpg").split("_")[-1]
+        img_id = self._get_img_id(ann)
 
         return {
             "image": image,
@@ -44,6 +44,15 @@ class COCOCapEvalDataset(CaptionEvalDataset):
             "instance_id": ann["instance_id"],
         }
 
+    @staticmethod
+    def _get_img_id(ann):
+        return ann["image"].split("/")[-1].strip(".jpg").split("_")[-1]
+
+    def get_sample_id(self, index, key="image_id"):
+        if key == "image_id":
+            return self._get_img_id(self.annotation[index])
+        return super().get_sample_id(index, key)
+
 
 
 class NoCapsEvalDataset(CaptionEvalDataset):
@@ -69,4 +78,9 @@ class NoCapsEvalDataset(CaptionEvalDataset):
             "image": image,
             "image_id": img_id,
             "instance_id": ann["instance_id"],
-        }
\ No newline at end of file
+        }
+
+    def get_sample_id(self, index, key="image_id"):
+        if key == "image_id":
+            return self.annotation[index]["img_id"]
+        return super().get_sample_id(index, key)
\ No newline at end of file
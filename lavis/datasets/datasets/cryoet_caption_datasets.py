@@ -0,0 +1,132 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import os
+
+from PIL import Image
+from PIL import ImageFile
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+from lavis.datasets.datasets.caption_datasets import CaptionDataset, CaptionEvalDataset
+
+
+# the augmentations previously materialised on disk by download_cryoet.py
+EVAL_VARIANTS = [
+    (padding, rotation, flip)
+    for padding in (20, 40)
+    for rotation in (0, 90, 180, 270)
+    for flip in (False, True)
+]
+
+
+class CryoETCapDataset(CaptionDataset):
+    """
+    Cryo-ET captions stored as one normalized image per run plus the bbox of each mask,
+    e.g. {"image": "run/image.png", "bbox": [x_min, y_min, x_max, y_max], "caption": ..., "image_id": ...}.
+    Box drawing, rotation, flip and padding are applied by the cryoet_image_* processors.
+
+    Every mask is listed variants_per_mask times (build_info.variants_per_mask, by default
+    the 16 variants of the materialised dataset), so that an epoch has as many samples as
+    before, each with its own random augmentation.
+    """
+
+    def __init__(self, vis_processor, text_processor, vis_root, ann_paths):
+        super().__init__(vis_processor, text_processor, vis_root, ann_paths)
+
+        self.mask_annotation = self.annotation
+        self.set_variants_per_mask(len(EVAL_VARIANTS))
+
+    def set_variants_per_mask(self, variants_per_mask):
+        self.variants_per_mask = variants_per_mask
+        self.annotation = [ann for ann in self.mask_annotation for _ in range(variants_per_mask)]
+
+    def __getitem__(self, index):
+        ann = self.annotation[index]
+
+        vit_embeds = self.get_cached_features(ann)
+        if vit_embeds is not None:
+            return {
+                "vit_embeds": vit_embeds,
+                "text_input": self.text_processor(ann["caption"]),
+                "image_id": ann["image_id"],
+            }
+
+        image_path = os.path.join(self.vis_root, ann["image"])
+        try:
+            image = Image.open(image_path)
+        except:
+            return None # image does not exist
+
+        image = self.vis_processor({"image": image, "bbox": ann["bbox"]})
+        caption = self.text_processor(ann["caption"])
+
+        return {
+            "image": image,
+            "text_input": caption,
+            "image_id": ann["image_id"]
+        }
+
+
+class CryoETCapEvalDataset(CaptionEvalDataset):
+    def __init__(self, vis_processor, text_processor, vis_root, ann_paths):
+        """
+        vis_root (string): Root directory of images
+        ann_root (string): directory to store the annotation file
+        split (string): val or test
+
+        Each mask is expanded into the 16 padding/rotation/flip variants, so that
+        evaluation covers the same samples as the materialised dataset.
+        """
+        super().__init__(vis_processor, text_processor, vis_root, ann_paths)
+
+        annotation = []
+        for ann in self.annotation:
+            for padding, rotation, flip in EVAL_VARIANTS:
+                annotation.append(
+                    {
+                        **ann,
+                        "padding": padding,
+                        "rotation": rotation,
+                        "flip": flip,
+                        "image_id": "{}_bounded_p{}_r{}{}".format(
+                            ann["image_id"], padding, rotation, "_fh" if flip else ""
+                        ),
+                    }
+                )
+        self.annotation = annotation
+        self._add_instance_ids()
+
+    def __getitem__(self, index):
+        ann = self.annotation[index]
+
+        vit_embeds = self.get_cached_features(ann)
+        if vit_embeds is not None:
+            return {
+                "vit_embeds": vit_embeds,
+                "image_id": ann["image_id"],
+                "instance_id": ann["instance_id"],
+            }
+
+        image_path = os.path.join(self.vis_root, ann["image"])
+        image = Image.open(image_path)
+
+        image = self.vis_processor(
+            {
+                "image": image,
+                "bbox": ann["bbox"],
+                "padding": ann["padding"],
+                "rotation": ann["rotation"],
+                "flip": ann["flip"],
+            }
+        )
+
+        return {
+            "image": image,
+            "image_id": ann["image_id"],
+            "instance_id": ann["instance_id"],
+        }
@@ -7,9 +7,11 @@
 
 import time
 import random
+from collections import deque
+
 import torch
-from lavis.datasets.data_utils import move_to_cuda
-from torch.utils.data import DataLoader
+from lavis.datasets.data_utils import move_to_device
+from torch.utils.data import DataLoader, Sampler
 
 
 class MultiIterLoader:
@@ -41,87 +43,93 @@ class MultiIterLoader:
         loader_idx = random.choices(range(len(self.loaders)), self.ratios, k=1)[0]
         return next(self.loaders[loader_idx])
 
+    @property
+    def device(self):
+        """Device the batches are copied to by all the loaders, None if they are not copied."""
+        devices = set(getattr(loader, "device", None) for loader in self.loaders)
+        return devices.pop() if len(devices) == 1 else None
+
 
 class PrefetchLoader(object):
     """
     Modified from https://github.com/ChenRocks/UNITER.
 
-    overlap compute and cuda data transfer
-    (copied and then modified from nvidia apex)
+    Overlaps loading and host to device copies of the next batches with compute. On cuda
+    devices, the batches are copied from pinned memory by non-blocking copies on a side stream,
+    up to prefetch_depth batches ahead of the batch in use. On other devices, the batches are
+    returned as loaded.
+
+    Args:
+        loader (DataLoader): loader of the batches, with pin_memory=True for cuda devices.
+        device (torch.device): device to copy the batches to. Defaults to cuda if available.
+        prefetch_depth (int): number of batches copied ahead of the batch in use.
     """
 
-    def __init__(self, loader):
+    def __init__(self, loader, device=None, prefetch_depth=1):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
         self.loader = loader
-        self.stream = torch.cuda.Stream()
+        self.device = torch.device(device)
+        self.prefetch_depth = max(int(prefetch_depth), 1)
+
+        if self.device.type == "cuda":
+            self.stream = torch.cuda.Stream(device=self.device)
+        else:
+            self.stream = None
 
     def __iter__(self):
+        if self.stream is None:
+            yield from self.loader
+            return
+
         loader_it = iter(self.loader)
-        self.preload(loader_it)
-        batch = self.next(loader_it)
-        while batch is not None:
-            is_tuple = isinstance(batch, tuple)
-            if is_tuple:
-                task, batch = batch
-
-            if is_tuple:
-                yield task, batch
-            else:
-                yield batch
-            batch = self.next(loader_it)
+        prefetched = deque()
+
+        for _ in range(self.prefetch_depth):
+            self.preload(loader_it, prefetched)
+
+        while prefetched:
+            batch, copied = prefetched.popleft()
+            # wait for the copies of this batch only, later batches may still be copying
+            torch.cuda.current_stream(self.device).wait_event(copied)
+            record_cuda_stream(batch, torch.cuda.current_stream(self.device))
+
+            self.preload(loader_it, prefetched)
+            yield batch
 
     def __len__(self):
         return len(self.loader)
 
-    def preload(self, it):
+    def preload(self, it, prefetched):
         try:
-            self.batch = next(it)
+            batch = next(it)
         except StopIteration:
-            self.batch = None
             return
-        # if record_stream() doesn't work, another option is to make sure
-        # device inputs are created on the main stream.
-        # self.next_input_gpu = torch.empty_like(self.next_input,
-        #                                        device='cuda')
-        # self.next_target_gpu = torch.empty_like(self.next_target,
-        #                                         device='cuda')
-        # Need to make sure the memory allocated for next_* is not still in use
-        # by the main stream at the time we start copying to next_*:
-        # self.stream.wait_stream(torch.cuda.current_stream())
+
+        # the copies are allocated on the side stream, and record_cuda_stream keeps their
+        # memory from being reused before the main stream is done with them
         with torch.cuda.stream(self.stream):
-            self.batch = move_to_cuda(self.batch)
-            # more code for the alternative if record_stream() doesn't work:
-            # copy_ will record the use of the pinned source tensor in this
-            # side stream.
-            # self.next_input_gpu.copy_(self.next_input, non_blocking=True)
-            # self.next_target_gpu.copy_(self.next_target, non_blocking=True)
-            # self.next_input = self.next_input_gpu
-            # self.next_target = self.next_target_gpu
-
-    def next(self, it):
-        torch.cuda.current_stream().wait_stream(self.stream)
-        batch = self.batch
-        if batch is not None and batch is not {}:
-            record_cuda_stream(batch)
-        self.preload(it)
-        return batch
-    
-    def __next__(self, it):
-        return self.next(it)
+            batch = move_to_device(batch, self.device)
+            copied = torch.cuda.Event()
+            copied.record(self.stream)
+
+        prefetched.append((batch, copied))
 
     def __getattr__(self, name):
         method = self.loader.__getattribute__(name)
         return method
 
 
-def record_cuda_stream(batch):
+def record_cuda_stream(batch, stream):
     if isinstance(batch, torch.Tensor):
-        batch.record_stream(torch.cuda.current_stream())
+        batch.record_stream(stream)
     elif isinstance(batch, list) or isinstance(batch, tuple):
         for t in batch:
-            record_cuda_stream(t)
+            record_cuda_stream(t, stream)
     elif isinstance(batch, dict):
         for t in batch.values():
-            record_cuda_stream(t)
+            record_cuda_stream(t, stream)
     else:
         pass
 
@@ -151,7 +159,8 @@ class IterLoader:
             self._epoch += 1
             if hasattr(self._dataloader.sampler, "set_epoch") and self._use_distributed:
                 self._dataloader.sampler.set_epoch(self._epoch)
-            time.sleep(2)  # Prevent possible deadlock during epoch transition
+            if not getattr(self._dataloader, "persistent_workers", False):
+                time.sleep(2)  # Prevent possible deadlock during epoch transition
             self.iter_loader = iter(self._dataloader)
             data = next(self.iter_loader)
 
@@ -162,3 +171,84 @@ class IterLoader:
 
     def __len__(self):
         return len(self._dataloader)
+
+    @property
+    def device(self):
+        """Device the batches are copied to by the loader, None if they are not copied."""
+        return getattr(self._dataloader, "device", None)
+
+
+def estimate_input_lengths(dataset, length_key=None):
+    """
+    Estimated text input length of every sample of a dataset, see
+    BaseDataset.get_input_length(). Returns None if the dataset does not support it.
+    """
+    if not hasattr(dataset, "get_input_length"):
+        return None
+
+    lengths = []
+    for index in range(len(dataset)):
+        length = dataset.get_input_length(index, length_key)
+        if length is None:
+            return None
+        lengths.append(length)
+    return lengths
+
+
+class LengthGroupedBatchSampler(Sampler):
+    """
+    Evaluation batch sampler grouping samples of similar input lengths, so that batches are
+    padded, and generate, to the length of similar samples instead of the longest sample of a
+    random group. Longest samples come first, so that running out of memory happens early.
+
+    The samples of this process are the ones of `sampler`, e.g. a DistributedSampler, so the
+    split across processes is unchanged. restore_order() puts the results of the batches back
+    in the order of `sampler`, before they are saved.
+
+    Args:
+        sampler (Sampler): sampler of the indices of this process.
+        lengths (List[int]): estimated input length of every sample of the dataset.
+        batch_size (int): batch size.
+    """
+
+    def __init__(self, sampler, lengths, batch_size):
+        self.sampler = sampler
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.batches = None
+        self._position = None
+
+    def __iter__(self):
+        indices = list(self.sampler)
+        position = {index: i for i, index in enumerate(indices)}
+        # stable sort, samples of equal lengths stay in the order of the sampler
+        indices = sorted(indices, key=lambda index: -self.lengths[index])
+
+        self.batches = [
+            indices[i : i + self.batch_size] for i in range(0, len(indices), self.batch_size)
+        ]
+        self._position = position
+        return iter(self.batches)
+
+    def __len__(self):
+        return (len(self.sampler) + self.batch_size - 1) // self.batch_size
+
+    def restore_order(self, batch_results):
+        """
+        Sorts the results of the batches, a list with the list of results of each batch, in the
+        order of the sampler. When a batch does not have one result per sample, its results are
+        kept together at the position of its first sample.
+        """
+        assert self.batches is not None and len(batch_results) == len(
+            self.batches
+        ), "restore_order() expects the results of every batch of the last iteration."
+
+        keyed = []
+        for batch, results in zip(self.batches, batch_results):
+            positions = [self._position[index] for index in batch]
+            if len(results) != len(batch):
+                positions = [min(positions)] * len(results)
+            keyed.extend(zip(positions, results))
+
+        keyed.sort(key=lambda item: item[0])
+        return [result for _, result in keyed]
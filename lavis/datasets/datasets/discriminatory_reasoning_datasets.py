@@ -10,6 +10,7 @@ from collections import OrderedDict
 from PIL import Image
 import copy
 
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 from lavis.common.utils import is_serializable
 
@@ -70,7 +71,7 @@ class DisCRnDataset(BaseDataset, __DisplMixin):
 
     def get_existing_image_annotations(self):
         if self.ds_name == 'objaverse':
-            return [f.split('_')[0] for f in os.listdir(os.path.join(self.vis_root, f'compressed_imgs_view{self.view}/Cap3D_imgs_view{self.view}/'))]
+            return [f.split('_')[0] for f in listdir(os.path.join(self.vis_root, f'compressed_imgs_view{self.view}/Cap3D_imgs_view{self.view}/'))]
     
     def get_image_path(self, ann, entity_index):
         if self.ds_name == 'objaverse':
@@ -78,7 +79,7 @@ class DisCRnDataset(BaseDataset, __DisplMixin):
             return os.path.join(self.vis_root, f'compressed_imgs_view{self.view}/Cap3D_imgs_view{self.view}/', ann['sample_ids'][entity_index]+f'_{self.view}.jpeg')
 
     def get_existing_audio_annotations(self):
-        return [f.split('_')[0] for f in os.listdir(self.audio_root)]
+        return [f.split('_')[0] for f in listdir(self.audio_root)]
     
     def get_audio_path(self, ann, entity_index):
         if self.ds_name == 'audiocaps':
@@ -89,11 +90,11 @@ class DisCRnDataset(BaseDataset, __DisplMixin):
             return str(os.path.realpath(os.path.join(self.video_root,ann['sample_ids'][entity_index] + '_{}.mp4'.format(int(ann['start_seconds'][entity_index])))))
 
     def get_existing_video_annotations(self):
-        return [f.split('_')[0] for f in os.listdir(self.video_root)]
+        return [f.split('_')[0] for f in listdir(self.video_root)]
     
     def get_existing_pc_annotations(self):
         if self.ds_name == 'objaverse':
-            return os.listdir(self.pc_root)
+            return listdir(self.pc_root)
 
     def get_pc_path(self, ann, entity_index):
         if self.ds_name == 'objaverse':
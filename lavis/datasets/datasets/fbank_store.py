@@ -0,0 +1,168 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+import torch
+
+
+META_SUFFIX = ".meta.json"
+
+
+def _meta_path(root, part):
+    return os.path.join(root, part + META_SUFFIX)
+
+
+def _load_meta(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class FbankStoreWriter:
+    """
+    Writes fbank features (num_frames, num_mel_bins) of audio files as float16, concatenated
+    in shards of at most shard_size files.
+
+    Files are keyed by their path relative to audio_root, both resolved with os.path.realpath
+    as FbankStore.key does, so that symlinks do not change keys. Like FeatureStoreWriter, every
+    writer owns a part of the store described by <part>.meta.json, rewritten atomically
+    whenever a shard is completed.
+    """
+
+    def __init__(self, root, audio_root, part="rank0", shard_size=1024):
+        self.root = root
+        self.part = part
+        self.shard_size = shard_size
+        os.makedirs(root, exist_ok=True)
+
+        meta_path = _meta_path(root, part)
+        if os.path.exists(meta_path):
+            self.meta = _load_meta(meta_path)
+        else:
+            self.meta = {"audio_root": os.path.realpath(audio_root), "num_mel_bins": None, "shards": []}
+
+        self._file = None
+        self._keys = []
+        self._offsets = [0]
+
+    def add(self, key, fbank):
+        fbank = fbank.detach().cpu() if torch.is_tensor(fbank) else torch.as_tensor(fbank)
+        fbank = fbank.to(torch.float16).numpy()
+        if self.meta["num_mel_bins"] is None:
+            self.meta["num_mel_bins"] = fbank.shape[1]
+        assert fbank.shape[1] == self.meta["num_mel_bins"], "number of mel bins mismatch"
+
+        if self._file is None:
+            self._file = open(self._shard_path(len(self.meta["shards"])), "wb")
+        self._file.write(np.ascontiguousarray(fbank).tobytes())
+        self._keys.append(str(key))
+        self._offsets.append(self._offsets[-1] + len(fbank))
+
+        if len(self._keys) == self.shard_size:
+            self._commit_shard()
+
+    def close(self):
+        if self._keys:
+            self._commit_shard()
+
+    def _shard_path(self, index):
+        return os.path.join(self.root, "{}-{:05d}.f16".format(self.part, index))
+
+    def _commit_shard(self):
+        self._file.close()
+        self.meta["shards"].append(
+            {
+                "file": os.path.basename(self._file.name),
+                "keys": self._keys,
+                "offsets": self._offsets,
+            }
+        )
+        self._file = None
+        self._keys = []
+        self._offsets = [0]
+
+        meta_path = _meta_path(self.root, self.part)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FbankStore:
+    """
+    Read-only mapping from audio path (a key of the store, or a path to the file under the
+    audio root of the store) to the fbank features written by FbankStoreWriter, for all parts
+    found in root.
+
+    Shards are memory-mapped on first access, so that DataLoader workers share pages.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.audio_root = None
+        self.num_mel_bins = None
+        self.shard_files = []
+        self.index = {}
+
+        for meta_path in sorted(glob.glob(os.path.join(root, "*" + META_SUFFIX))):
+            meta = _load_meta(meta_path)
+            if meta["num_mel_bins"] is None:
+                continue
+            self.audio_root = os.path.realpath(meta["audio_root"])
+            self.num_mel_bins = meta["num_mel_bins"]
+
+            for shard in meta["shards"]:
+                shard_idx = len(self.shard_files)
+                self.shard_files.append((shard["file"], shard["offsets"][-1]))
+                for i, key in enumerate(shard["keys"]):
+                    self.index[key] = (shard_idx, shard["offsets"][i], shard["offsets"][i + 1])
+
+        self._shards = None
+
+    def key(self, path):
+        path = str(path)
+        if path in self.index or self.audio_root is None:
+            return path
+        # datasets build paths from symlinked or resolved roots alike
+        return os.path.relpath(os.path.realpath(path), self.audio_root)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, path):
+        return self.key(path) in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def __getitem__(self, path):
+        if self._shards is None:
+            self._shards = [None] * len(self.shard_files)
+
+        shard_idx, start, end = self.index[self.key(path)]
+        if self._shards[shard_idx] is None:
+            filename, num_rows = self.shard_files[shard_idx]
+            self._shards[shard_idx] = np.memmap(
+                os.path.join(self.root, filename),
+                dtype=np.float16,
+                mode="r",
+                shape=(num_rows, self.num_mel_bins),
+            )
+        return torch.from_numpy(self._shards[shard_idx][start:end].astype(np.float32))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
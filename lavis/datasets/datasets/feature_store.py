@@ -0,0 +1,165 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+import torch
+
+
+META_SUFFIX = ".meta.json"
+
+
+def _meta_path(root, part):
+    return os.path.join(root, part + META_SUFFIX)
+
+
+def _load_meta(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class FeatureStoreWriter:
+    """
+    Writes fixed-shape features as float16 to shards of at most shard_size rows.
+
+    Every writer owns a part of the store (e.g. one per rank), described by
+    <part>.meta.json, which lists the shards and the key of each row. The meta file is
+    rewritten atomically whenever a shard is completed, so an interrupted run loses at
+    most the current shard; use FeatureStore(root) to skip the keys already written.
+    """
+
+    def __init__(self, root, part="rank0", shard_size=4096):
+        self.root = root
+        self.part = part
+        self.shard_size = shard_size
+        os.makedirs(root, exist_ok=True)
+
+        meta_path = _meta_path(root, part)
+        if os.path.exists(meta_path):
+            self.meta = _load_meta(meta_path)
+        else:
+            self.meta = {"shape": None, "dtype": "float16", "shards": []}
+
+        self._file = None
+        self._keys = []
+
+    def add(self, keys, features):
+        features = features.detach().cpu() if torch.is_tensor(features) else torch.as_tensor(features)
+        features = features.to(torch.float16).numpy()
+        keys = [str(key) for key in keys]
+        assert len(keys) == len(features), "expected one feature per key"
+
+        if self.meta["shape"] is None:
+            self.meta["shape"] = list(features.shape[1:])
+        assert list(features.shape[1:]) == self.meta["shape"], "feature shape mismatch"
+
+        start = 0
+        while start < len(keys):
+            if self._file is None:
+                self._file = open(self._shard_path(len(self.meta["shards"])), "wb")
+
+            num = min(len(keys) - start, self.shard_size - len(self._keys))
+            self._file.write(np.ascontiguousarray(features[start : start + num]).tobytes())
+            self._keys.extend(keys[start : start + num])
+            start += num
+
+            if len(self._keys) == self.shard_size:
+                self._commit_shard()
+
+    def close(self):
+        if self._keys:
+            self._commit_shard()
+
+    def _shard_path(self, index):
+        return os.path.join(self.root, "{}-{:05d}.f16".format(self.part, index))
+
+    def _commit_shard(self):
+        self._file.close()
+        self.meta["shards"].append(
+            {
+                "file": os.path.basename(self._file.name),
+                "keys": self._keys,
+            }
+        )
+        self._file = None
+        self._keys = []
+
+        meta_path = _meta_path(self.root, self.part)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FeatureStore:
+    """
+    Read-only mapping from sample key (e.g. image_id) to the features written by
+    FeatureStoreWriter, for all parts found in root.
+
+    Shards are memory-mapped on first access, so that DataLoader workers share pages
+    and the store can be pickled to spawned workers.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.shape = None
+        self.shard_files = []
+        self.index = {}
+
+        for meta_path in sorted(glob.glob(os.path.join(root, "*" + META_SUFFIX))):
+            meta = _load_meta(meta_path)
+            if meta["shape"] is None:
+                continue
+            assert self.shape is None or self.shape == tuple(meta["shape"]), (
+                "parts of {} have different feature shapes".format(root)
+            )
+            self.shape = tuple(meta["shape"])
+
+            for shard in meta["shards"]:
+                shard_idx = len(self.shard_files)
+                self.shard_files.append((shard["file"], len(shard["keys"])))
+                for row, key in enumerate(shard["keys"]):
+                    self.index[key] = (shard_idx, row)
+
+        self._shards = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return str(key) in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def __getitem__(self, key):
+        if self._shards is None:
+            self._shards = [None] * len(self.shard_files)
+
+        shard_idx, row = self.index[str(key)]
+        if self._shards[shard_idx] is None:
+            filename, num_rows = self.shard_files[shard_idx]
+            self._shards[shard_idx] = np.memmap(
+                os.path.join(self.root, filename),
+                dtype=np.float16,
+                mode="r",
+                shape=(num_rows,) + self.shape,
+            )
+        return torch.from_numpy(np.array(self._shards[shard_idx][row]))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
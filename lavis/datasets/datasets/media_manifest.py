@@ -0,0 +1,158 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch.distributed as dist
+from torch.utils.data import get_worker_info
+
+from lavis.common.dist_utils import is_dist_avail_and_initialized, is_main_process
+from lavis.common.utils import get_cache_path
+
+
+MANIFEST_DIR = "manifests"
+NUM_SCAN_THREADS = 32
+
+# manifests already loaded by this process, by (root, depth, mtime)
+_manifests = {}
+
+
+class MediaManifest:
+    """
+    Entries of a media root, scanned once and shared by all datasets, ranks and runs.
+
+    With depth=2, the entries of every subdirectory of root are listed as well, with
+    NUM_SCAN_THREADS threads, so that datasets with one directory per sample do not list it
+    on every __getitem__.
+
+    A manifest is saved to <cache_root>/manifests and reused as long as the modification time
+    of root, as seen by the main process, does not change. Only root is checked, so call
+    MediaManifest.get(..., refresh=True) after changing the content of its subdirectories.
+
+    In distributed runs, every call of MediaManifest.get or listdir outside of DataLoader
+    workers is a collective: all ranks must make the same calls, in the same order, or they
+    hang. Build the datasets on all ranks, and do not call them from __getitem__.
+    """
+
+    def __init__(self, root, names, children=None):
+        self.root = root
+        self.names = names
+        self.children = children
+
+    def __len__(self):
+        return len(self.names)
+
+    def listdir(self, name=None):
+        """Entries of root, or of its subdirectory name (empty if it does not exist)."""
+        if name is None:
+            return self.names
+        assert self.children is not None, "the manifest of {} has no subdirectories".format(self.root)
+        return self.children.get(name, [])
+
+    @classmethod
+    def get(cls, root, depth=1, refresh=False):
+        """
+        The manifest of root.
+
+        A collective in distributed runs: all ranks must call it for the same roots in the
+        same order, since they decide together whether the manifest is cached, from the
+        modification time seen by the main process. In DataLoader workers, which do not take
+        part in collectives, each worker decides from the modification time it sees.
+        """
+        root = os.path.abspath(root)
+        mtime = os.stat(root).st_mtime_ns
+        collective = is_dist_avail_and_initialized() and get_worker_info() is None
+        if collective:
+            # the mtime seen by each rank may differ, e.g. on NFS or while root is written
+            mtime = [mtime]
+            dist.broadcast_object_list(mtime, src=0)
+            mtime = mtime[0]
+        key = (root, depth, mtime)
+        if key in _manifests and not refresh:
+            return _manifests[key]
+
+        path = cls._cache_file(root, depth)
+        if is_main_process():
+            manifest = None if refresh else cls._load(path, root, mtime)
+            if manifest is None:
+                manifest = cls.scan(root, depth)
+                cls._save(manifest, path, mtime)
+        if collective:
+            # other ranks read the manifest of the main process instead of scanning root again
+            dist.barrier()
+        if not is_main_process():
+            manifest = cls._load(path, root, mtime) or cls.scan(root, depth)
+
+        _manifests[key] = manifest
+        return manifest
+
+    @classmethod
+    def scan(cls, root, depth=1):
+        logging.info("Scanning {}".format(root))
+        names = sorted(os.listdir(root))
+        children = None
+        if depth > 1:
+
+            def listdir(name):
+                try:
+                    return sorted(os.listdir(os.path.join(root, name)))
+                except NotADirectoryError:
+                    return None
+
+            with ThreadPoolExecutor(NUM_SCAN_THREADS) as pool:
+                children = {
+                    name: entries
+                    for name, entries in zip(names, pool.map(listdir, names))
+                    if entries is not None
+                }
+        return cls(root, names, children)
+
+    @staticmethod
+    def _cache_file(root, depth):
+        digest = hashlib.sha1("{}:{}".format(root, depth).encode()).hexdigest()
+        return os.path.join(get_cache_path(MANIFEST_DIR), digest + ".json.gz")
+
+    @classmethod
+    def _load(cls, path, root, mtime):
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data["root"] != root or data["mtime"] != mtime:
+            return None
+        return cls(root, data["names"], data.get("children", None))
+
+    @staticmethod
+    def _save(manifest, path, mtime):
+        data = {"root": manifest.root, "mtime": mtime, "names": manifest.names}
+        if manifest.children is not None:
+            data["children"] = manifest.children
+        # one temporary file per process, since DataLoader workers may save at the same time
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(tmp_path, "wt") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning("Could not save the manifest of {}: {}".format(manifest.root, e))
+
+
+def listdir(root):
+    """
+    os.listdir(root), scanned once per modification of root. A collective in distributed
+    runs, see MediaManifest.get.
+    """
+    return MediaManifest.get(root).listdir()
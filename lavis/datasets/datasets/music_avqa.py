@@ -12,6 +12,7 @@ import random
 import json
 import ast
 from PIL import Image
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 
 class MusicAVQADataset(BaseDataset):
@@ -31,10 +32,10 @@ class MusicAVQADataset(BaseDataset):
         self.annotation = [ann for ann in self.annotation if ann['video_id'] in self.sample_ids]
     
     def get_existing_audio_annotations(self):
-        return [f.split('.')[0] for f in os.listdir(self.audio_root)]
+        return [f.split('.')[0] for f in listdir(self.audio_root)]
     
     def get_existing_video_annotations(self):
-        return [f.split('.')[0] for f in os.listdir(self.video_root)]
+        return [f.split('.')[0] for f in listdir(self.video_root)]
     
     def get_audio_path(self, ann):
         # return os.path.join(self.audio_root, f'{ann["video_id"]}.flac')
@@ -9,7 +9,9 @@ import os, sys
 from collections import OrderedDict
 import random
 
+from lavis.datasets.datasets.media_manifest import MediaManifest, listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
+from lavis.datasets.datasets.point_cloud_store import PointCloudStore
 from lavis.common.utils import is_serializable
 
 from PIL import Image
@@ -33,6 +35,13 @@ class __DisplMixin:
 
 
 
+def objaverse_images_path(vis_root, sample_key):
+    # data downloaded from: https://huggingface.co/datasets/tiange/Cap3D/tree/main/RenderedImage_zips
+    # one of the 8 rendered views, drawn as random.choice over all views would
+    view = random.randrange(8)
+    return os.path.join(vis_root, f'compressed_imgs_view{view}/Cap3D_imgs_view{view}/', sample_key+f'_{view}.jpeg')
+
+
 class Object3dCaptionDataset(BaseDataset, __DisplMixin):
     def __init__(self, **kwargs):
         super().__init__(kwargs['vis_processor'], kwargs['text_processor'], kwargs['vis_root'], kwargs['ann_paths'])
@@ -40,6 +49,8 @@ class Object3dCaptionDataset(BaseDataset, __DisplMixin):
         self.modalities = kwargs['modalities']
         self.npoints = 8192
         self.sample_points_num = self.npoints
+        # packed point clouds keyed by sample_id, see pack_point_clouds.py
+        self.pc_store = PointCloudStore(kwargs['pc_store']) if kwargs.get('pc_store', None) else None
 
         for modality in self.modalities:
             if 'image' in modality:
@@ -47,15 +58,18 @@ class Object3dCaptionDataset(BaseDataset, __DisplMixin):
                 continue
             setattr(self, f"{modality}_root", kwargs[f"{modality}_root"])
             setattr(self, f"{modality}_processor", kwargs[f"{modality}_processor"])
+            if modality == 'pc' and self.pc_store is not None:
+                self.existing_pc_annotation = list(self.pc_store.keys())
+                continue
             setattr(self, f"existing_{modality}_annotation",getattr(self, f'get_existing_{modality}_annotations')())
         self.sample_ids = set.intersection(*[set(getattr(self, f"existing_{modality}_annotation")) for modality in self.modalities])
         self.annotation = [ann for ann in self.annotation if ann['sample_id'] in self.sample_ids]
     
     def get_existing_depth_annotations(self):
-        return os.listdir(self.depth_root)
+        return listdir(self.depth_root)
     
     def get_existing_images_annotations(self):
-        return os.listdir(self.vis_root)
+        return listdir(self.vis_root)
     
     def get_existing_pc_annotations(self):
         raise NotImplementedError("Subclasses should implement this!")
@@ -80,6 +94,8 @@ class Object3dCaptionDataset(BaseDataset, __DisplMixin):
                 ann[f"{modality}_path"] = random.choice(ann[f"{modality}_path"])
             if 'image' in modality:
                 ann['image'] = self.vis_processor(Image.open(ann[f"images_path"]))
+            elif modality == 'pc' and self.pc_store is not None:
+                ann['pc'] = self.pc_processor(self.pc_store[ann['sample_id']]).to(torch.float32)
             else:
                 ann[modality] = getattr(self, f"{modality}_processor")(ann[f"{modality}_path"]).to(torch.float32)
         return ann
@@ -101,17 +117,16 @@ class ObjaverseCaptionDataset(Object3dCaptionDataset, __DisplMixin):
         super().__init__(**kwargs)
     
     def get_existing_images_annotations(self):
-       return [f.split('_')[0] for f in os.listdir(os.path.join(self.vis_root, f'compressed_imgs_view{0}/Cap3D_imgs_view{0}/'))]
+       return [f.split('_')[0] for f in listdir(os.path.join(self.vis_root, f'compressed_imgs_view{0}/Cap3D_imgs_view{0}/'))]
     
     def get_existing_pc_annotations(self):
-        return list(set(os.listdir(self.pc_root)).intersection(set(ann['sample_id'] for ann in self.annotation)))
+        return list(set(listdir(self.pc_root)).intersection(set(ann['sample_id'] for ann in self.annotation)))
 
     def get_pc_path(self, sample_key):
         return os.path.join(self.pc_root, sample_key, '{}_{}.npz'.format(sample_key, self.npoints))
        
     def get_images_path(self, sample_key):
-        # data downloaded from: https://huggingface.co/datasets/tiange/Cap3D/tree/main/RenderedImage_zips
-        return [os.path.join(self.vis_root, f'compressed_imgs_view{i}/Cap3D_imgs_view{i}/', sample_key+f'_{i}.jpeg') for i in range(8)]
+        return objaverse_images_path(self.vis_root, sample_key)
         
     def __getitem__(self, index):
         ann = super().__getitem__(index)
@@ -141,13 +156,19 @@ class ShapenetCaptionDataset(Object3dCaptionDataset, __DisplMixin):
         super().__init__(**kwargs)
     
     def get_existing_pc_annotations(self):
-        return list(set([f.replace('.npy', '') for f in os.listdir(self.pc_root)]))
+        return list(set([f.replace('.npy', '') for f in listdir(self.pc_root)]))
 
     def get_pc_path(self, sample_key):
         return os.path.join(self.pc_root, sample_key+'.npy')
     
+    def get_existing_images_annotations(self):
+        # also lists the views in the directory of every sample, for get_images_path
+        self.images_manifest = MediaManifest.get(self.vis_root, depth=2)
+        return self.images_manifest.listdir()
+
     def get_images_path(self, sample_key):
-        return [os.path.join(self.vis_root,sample_key, img_path) for img_path in os.listdir(os.path.join(self.vis_root, sample_key))]
+        # one of the views, drawn as random.choice over the paths of all views would
+        return os.path.join(self.vis_root, sample_key, random.choice(self.images_manifest.listdir(sample_key)))
         
     def __getitem__(self, index):
         ann = super().__getitem__(index)
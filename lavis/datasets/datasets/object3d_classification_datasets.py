@@ -12,12 +12,16 @@ from collections import OrderedDict
 import numpy as np
 from tqdm import tqdm
 import torch
+import torch.distributed as dist
 import copy
 import random
 import pickle
 from PIL import Image
-from lavis.processors.ulip_processors import farthest_point_sample, pc_normalize
+from lavis.common.dist_utils import is_dist_avail_and_initialized, is_main_process
+from lavis.processors.ulip_processors import pc_normalize
+from lavis.processors.point_sampling import batched_farthest_point_indices, sample_point_indices
 from lavis.datasets.datasets.base_dataset import BaseDataset
+from lavis.datasets.datasets.point_cloud_store import PointCloudStore
 
 
 class __DisplMixin:
@@ -48,6 +52,9 @@ class ModelNetClassificationDataset(BaseDataset, __DisplMixin):
         self.process_data = True
         self.uniform = True
         self.generate_from_raw_data = False
+        self.fps_mode = kwargs.get('fps_mode', 'exact')
+        # packed point clouds keyed by shape id, see pack_point_clouds.py
+        self.pc_store = PointCloudStore(kwargs['pc_store']) if kwargs.get('pc_store', None) else None
         ann_paths = kwargs['ann_paths']
 
         assert 'pc_root' in kwargs, "Point cloud root needs to be provided to retrieve labels."
@@ -72,61 +79,79 @@ class ModelNetClassificationDataset(BaseDataset, __DisplMixin):
 
 
     def _prepare_data(self):
-        # Check for pre-processed data
-        if self.process_data:
-            if not os.path.exists(self.save_path):
-                if self.generate_from_raw_data:
-                    print('Processing data %s (only running in the first time)...' % self.save_path)
-                    self._process_raw_data()
-            else:
-                print('Load processed data from %s...' % self.save_path)
-                with open(self.save_path, 'rb') as f:
-                    self.list_of_points, self.list_of_labels = pickle.load(f)
-        else:
-            print('Load processed data from %s...' % self.save_path)
-            with open(self.save_path, 'rb') as f:
-                self.list_of_points, self.list_of_labels = pickle.load(f)
-
-    def _process_raw_data(self):
+        if self.pc_store is not None:
+            self.list_of_labels = [np.array([self.classes[name]]).astype(np.int32) for name, _ in self.datapath]
+            return
+
+        # Check for pre-processed data; the main process processes the raw data once and
+        # the other ranks load what it saved
+        if self.process_data and self.generate_from_raw_data:
+            processed = False
+            if is_main_process() and not os.path.exists(self.save_path):
+                print('Processing data %s (only running in the first time)...' % self.save_path)
+                self._process_raw_data()
+                processed = True
+            if is_dist_avail_and_initialized():
+                dist.barrier()
+            if processed:
+                return
+
+        if self.process_data and not os.path.exists(self.save_path):
+            return
+        print('Load processed data from %s...' % self.save_path)
+        with open(self.save_path, 'rb') as f:
+            self.list_of_points, self.list_of_labels = pickle.load(f)
+
+    def _process_raw_data(self, batch_size=64):
         self.list_of_points = [None] * len(self.datapath)
         self.list_of_labels = [None] * len(self.datapath)
-        for index in tqdm(range(len(self.datapath)), total=len(self.datapath)):
-            fn = self.datapath[index]
-            cls = self.classes[self.datapath[index][0]]
-            cls = np.array([cls]).astype(np.int32)
-            point_set = np.loadtxt(fn[1], delimiter=',').astype(np.float32)
+        device = torch.device('cuda', torch.cuda.current_device()) if torch.cuda.is_available() else torch.device('cpu')
+        for start in tqdm(range(0, len(self.datapath), batch_size)):
+            indices = range(start, min(start + batch_size, len(self.datapath)))
+            point_sets = [self._load_points(index) for index in indices]
 
             if self.uniform:
-                point_set = farthest_point_sample(point_set, self.npoints)
-                print("uniformly sampled out {} points".format(self.npoints))
+                # sample all clouds of the batch at once, padded to the largest one
+                lengths = [len(point_set) for point_set in point_sets]
+                xyz = torch.zeros(len(point_sets), max(lengths), 3)
+                for i, point_set in enumerate(point_sets):
+                    xyz[i, :lengths[i]] = torch.from_numpy(point_set[:, :3])
+                fps_indices = batched_farthest_point_indices(xyz.to(device), self.npoints, lengths=lengths).cpu()
+                point_sets = [point_set[idx.numpy()] for point_set, idx in zip(point_sets, fps_indices)]
             else:
-                point_set = point_set[0:self.npoints, :]
+                point_sets = [point_set[0:self.npoints, :] for point_set in point_sets]
 
-            self.list_of_points[index] = point_set
-            self.list_of_labels[index] = cls
+            for index, point_set in zip(indices, point_sets):
+                self.list_of_points[index] = point_set
+                self.list_of_labels[index] = np.array([self.classes[self.datapath[index][0]]]).astype(np.int32)
 
         with open(self.save_path, 'wb') as f:
             pickle.dump([self.list_of_points, self.list_of_labels], f)
 
+    def _load_points(self, index):
+        return np.loadtxt(self.datapath[index][1], delimiter=',').astype(np.float32)
+
     def __len__(self):
         return len(self.list_of_labels)
 
     def _get_item(self, index):
-        if self.process_data:
+        if self.pc_store is not None:
+            point_set, label = self.pc_store[self.shape_ids[index]], self.list_of_labels[index]
+        elif self.process_data:
             point_set, label = self.list_of_points[index], self.list_of_labels[index]
         else:
             fn = self.datapath[index]
             cls = self.classes[self.datapath[index][0]]
             label = np.array([cls]).astype(np.int32)
-            point_set = np.loadtxt(fn[1], delimiter=',').astype(np.float32)
+            point_set = self._load_points(index)
             
             # Uniform sampling or trimming
             if self.uniform:
-                point_set = farthest_point_sample(point_set, self.npoints)
+                point_set = point_set[sample_point_indices(point_set, self.npoints, self.fps_mode)]
             else:
                 point_set = point_set[0:self.npoints, :]
         if self.npoints < point_set.shape[0]:
-            point_set = farthest_point_sample(point_set, self.npoints)
+            point_set = point_set[sample_point_indices(point_set, self.npoints, self.fps_mode)]
 
         point_set[:, 0:3] = pc_normalize(point_set[:, 0:3])
         if not self.use_normals:
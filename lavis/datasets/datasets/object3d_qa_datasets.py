@@ -11,7 +11,8 @@ import random
 from PIL import Image
 import torch
 
-from lavis.datasets.datasets.object3d_captioning_datasets import Object3dCaptionDataset
+from lavis.datasets.datasets.media_manifest import listdir
+from lavis.datasets.datasets.object3d_captioning_datasets import Object3dCaptionDataset, objaverse_images_path
 
 class ObjaverseQADataset(Object3dCaptionDataset):
     def __init__(self, **kwargs):
@@ -23,14 +24,13 @@ class ObjaverseQADataset(Object3dCaptionDataset):
             self.annotation = [ann for ann in self.annotation if 'model' not in ann['answer']]
     
     def get_existing_pc_annotations(self):
-        return list(set(os.listdir(self.pc_root)).intersection(set(ann['sample_id'] for ann in self.annotation)))
+        return list(set(listdir(self.pc_root)).intersection(set(ann['sample_id'] for ann in self.annotation)))
 
     def get_pc_path(self, sample_key):
         return os.path.join(self.pc_root, sample_key, '{}_{}.npz'.format(sample_key, self.npoints))
        
     def get_images_path(self, sample_key):
-        # data downloaded from: https://huggingface.co/datasets/tiange/Cap3D/tree/main/RenderedImage_zips
-        return [os.path.join(self.vis_root, f'compressed_imgs_view{i}/Cap3D_imgs_view{i}/', sample_key+f'_{i}.jpeg') for i in range(8)]
+        return objaverse_images_path(self.vis_root, sample_key)
         
     def __getitem__(self, index):
         ann = copy.deepcopy(self.annotation[index])
@@ -0,0 +1,115 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+POINTS_FILE = "points.bin"
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+
+
+def load_point_cloud(path):
+    """Reads a point cloud (N, C) from a .npz (arr_0), .npy or comma-separated .txt file."""
+    if path.endswith(".npz"):
+        return np.load(path, allow_pickle=True)["arr_0"]
+    if path.endswith(".npy"):
+        return np.load(path, allow_pickle=True)
+    return np.loadtxt(path, delimiter=",")
+
+
+class PointCloudStoreWriter:
+    """
+    Packs point clouds of any number of points and a fixed number of channels into one
+    contiguous array (points.bin), with the offsets of every cloud (index.npy) and their keys
+    (meta.json). The index and meta are written on close.
+    """
+
+    def __init__(self, root, dtype="float32"):
+        assert dtype in ("float16", "float32"), "dtype must be float16 or float32"
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        os.makedirs(root, exist_ok=True)
+
+        self._file = open(os.path.join(root, POINTS_FILE), "wb")
+        self.keys = []
+        self.offsets = [0]
+        self.channels = None
+
+    def add(self, key, points):
+        points = np.asarray(points)
+        assert points.ndim == 2, "expected points of shape (N, C)"
+        if self.channels is None:
+            self.channels = points.shape[1]
+        assert points.shape[1] == self.channels, "all point clouds must have the same number of channels"
+
+        self._file.write(np.ascontiguousarray(points, dtype=self.dtype).tobytes())
+        self.keys.append(str(key))
+        self.offsets.append(self.offsets[-1] + len(points))
+
+    def close(self):
+        self._file.close()
+        np.save(os.path.join(self.root, INDEX_FILE), np.asarray(self.offsets, dtype=np.int64))
+        with open(os.path.join(self.root, META_FILE), "w") as f:
+            json.dump({"dtype": self.dtype.name, "channels": self.channels, "keys": self.keys}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PointCloudStore:
+    """
+    Read-only mapping from sample key to the point cloud (N, C) written by PointCloudStoreWriter,
+    as float32.
+
+    points.bin is memory-mapped on first access, so that DataLoader workers share its pages
+    instead of each holding a copy of the dataset, and reading a cloud is a slice of it.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, META_FILE), "r") as f:
+            meta = json.load(f)
+        self.dtype = np.dtype(meta["dtype"])
+        self.channels = meta["channels"]
+        self.sample_keys = meta["keys"]
+        self.index = {key: i for i, key in enumerate(self.sample_keys)}
+        self.offsets = np.load(os.path.join(root, INDEX_FILE))
+
+        self._points = None
+
+    def __len__(self):
+        return len(self.sample_keys)
+
+    def __contains__(self, key):
+        return str(key) in self.index
+
+    def keys(self):
+        return self.sample_keys
+
+    def __getitem__(self, key):
+        if self._points is None:
+            self._points = np.memmap(
+                os.path.join(self.root, POINTS_FILE),
+                dtype=self.dtype,
+                mode="r",
+                shape=(int(self.offsets[-1]), self.channels),
+            )
+
+        i = self.index[str(key)]
+        return self._points[self.offsets[i] : self.offsets[i + 1]].astype(np.float32)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_points"] = None
+        return state
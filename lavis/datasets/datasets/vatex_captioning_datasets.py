@@ -12,6 +12,7 @@ import os
 import random
 import json
 from PIL import Image
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 
 class VATEXCaptionDataset(BaseDataset):
@@ -36,10 +37,10 @@ class VATEXCaptionDataset(BaseDataset):
         return len(self.annotation)
     
     def get_existing_audio_annotations(self):
-        return ['.'.join(f.split('.')[:-1]) for f in os.listdir(self.audio_root)]
+        return ['.'.join(f.split('.')[:-1]) for f in listdir(self.audio_root)]
     
     def get_existing_video_annotations(self):
-        return ['.'.join(f.split('.')[:-1]) for f in os.listdir(self.video_root)]
+        return ['.'.join(f.split('.')[:-1]) for f in listdir(self.video_root)]
     
 
     def get_audio_path(self, ann):
@@ -7,6 +7,7 @@
 
 import os
 import random
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import BaseDataset
 import math
 
@@ -21,7 +22,7 @@ class VlepVideoDataset(BaseDataset):
         split (string): val or test
         """
         super().__init__(vis_processor, text_processor, vis_root, ann_paths)
-        existing_videos = [f.replace('.mp4', '') for f in os.listdir(self.vis_root)]
+        existing_videos = [f.replace('.mp4', '') for f in listdir(self.vis_root)]
         self.annotation = [ann for ann in self.annotation if ann['vid_name'] in existing_videos]
 
 
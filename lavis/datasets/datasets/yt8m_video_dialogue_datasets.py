@@ -10,6 +10,7 @@ import os
 import copy
 import random
 from PIL import Image
+from lavis.datasets.datasets.media_manifest import listdir
 from lavis.datasets.datasets.base_dataset import (
     BaseDataset
 )
@@ -32,10 +33,10 @@ class YT8MDialDataset(BaseDataset):
         self.annotation = [ann for ann in self.annotation if ann['youtube_id'] in self.sample_ids]
     
     def get_existing_audio_annotations(self):
-        return [f.split('_')[0] for f in os.listdir(self.audio_root)]
+        return [f.split('_')[0] for f in listdir(self.audio_root)]
     
     def get_existing_video_annotations(self):
-        return [f.split('_')[0] for f in os.listdir(self.video_root)]
+        return [f.split('_')[0] for f in listdir(self.video_root)]
     
     def get_audio_path(self, ann):
         return os.path.join(self.audio_root, f'{ann["youtube_id"]}_{ann["start_sec"]}_{ann["end_sec"]}.flac')
@@ -2,7 +2,8 @@
 import argparse
 import json
 import os
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 import cv2
 import numpy as np
@@ -11,6 +12,22 @@ from PIL import Image
 import SABER_reader2
 
 
+SPLITS = ("train", "val", "test")
+BOX_COLOR = (0, 0, 255)
+BOX_THICKNESS = 6
+PADDINGS = (20, 40)
+ROTATION_OPS = [
+    (lambda img: img,                                             "r0"),
+    (lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),        "r90"),
+    (lambda img: cv2.rotate(img, cv2.ROTATE_180),                 "r180"),
+    (lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE), "r270"),
+]
+FLIP_OPS = [
+    (None, ""),    # no flip → original
+    (1, "fh"),     # horizontal flip
+]
+
+
 def normalize_to_uint8(arr: np.ndarray, p_low: float, p_high: float) -> np.ndarray:
     """Min-max normalize using percentile clipping and map to [0, 255] uint8."""
     p_lo = np.percentile(arr, p_low)
@@ -22,41 +39,51 @@ def normalize_to_uint8(arr: np.ndarray, p_low: float, p_high: float) -> np.ndarr
     return arr.astype(np.uint8)
 
 
-def process_single_run(zarr_path: str, run_idx: int, output_folder: str,
+def split_runs(num_runs: int, seed: int = 42):
+    """Deterministically assign run indices to train/val/test (80/10/10)."""
+    shuffled_indices = np.arange(num_runs)
+    np.random.seed(seed)
+    np.random.shuffle(shuffled_indices)
+    train_indices, val_indices, test_indices = np.split(
+        shuffled_indices, [int(0.8 * num_runs), int(0.9 * num_runs)]
+    )
+    split_of_run = {}
+    for split, indices in zip(SPLITS, (train_indices, val_indices, test_indices)):
+        for idx in indices:
+            split_of_run[int(idx)] = split
+    return split_of_run
+
+
+def prepare_single_run(zarr_path: str, run_idx: int, output_folder: str,
                        p_low: float, p_high: float, verbose: bool = True):
     """
-    Worker function that processes a single run and returns JSON entries for that run.
+    Writes the normalized base image of a run and returns the mask jobs for it.
     Re-opens the zarr inside the worker (safer for multiprocessing).
+    The base image is reused when it already exists (resumed extraction).
     """
     zarr_root = SABER_reader2.SABERZarr(zarr_path)
     run = zarr_root.runs[run_idx]
 
     if run.run_name.startswith("140") or run.run_name == "260":
         print(f"Skipping run {run.run_name} due to known issues.")
-        return [] 
-
-    # if run.run_name.startswith("14069") or run.run_name.startswith("14070"):
-    #     print(f"Skipping run {run.run_name} due to known issues.")
-    #     return [] 
+        return None, []
 
     sub_output_folder = os.path.join(output_folder, run.run_name)
     os.makedirs(sub_output_folder, exist_ok=True)
-
-    np_array = np.array(run.image_array)
-    if verbose:
-        print(f"[{run.run_name}] Image array shape: {np_array.shape}, "
-              f"min: {np_array.min()}, max: {np_array.max()}")
-
-    norm_img = normalize_to_uint8(np_array, p_low, p_high)
-
-    # Save base image
     base_image_path = os.path.join(sub_output_folder, "image.png")
-    Image.fromarray(norm_img).save(base_image_path)
 
-    # array of arrays (each subarray is per mask)
-    entries = []
+    if not os.path.exists(base_image_path):
+        np_array = np.array(run.image_array)
+        if verbose:
+            print(f"[{run.run_name}] Image array shape: {np_array.shape}, "
+                  f"min: {np_array.min()}, max: {np_array.max()}")
 
-    # Prepare a BGR version for drawing boxes (only when needed)
+        norm_img = normalize_to_uint8(np_array, p_low, p_high)
+        tmp_path = base_image_path[: -len(".png")] + ".tmp.png"
+        Image.fromarray(norm_img).save(tmp_path, format="PNG")
+        os.replace(tmp_path, base_image_path)
+
+    mask_jobs = []
     for mask in run.masks:
         try:
             bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max = mask.bbox
@@ -67,56 +94,147 @@ def process_single_run(zarr_path: str, run_idx: int, output_folder: str,
         if (bbox_x_max - bbox_x_min) < 20 or (bbox_y_max - bbox_y_min) < 20 or (bbox_x_max - bbox_x_min) * (bbox_y_max - bbox_y_min) < 400:
             continue
 
-        if not mask.description:
+        description = mask.description
+        if not description:
             continue
 
-        if mask.description == "#membrane":
+        if description == "#membrane":
             continue
 
-        caption = mask.description.replace("#", "").replace("_", " ")
+        caption = description.replace("#", "").replace("_", " ")
 
         if not caption:
             continue
 
-        h, w = norm_img.shape[:2]
+        mask_jobs.append({
+            "base_image_path": base_image_path,
+            "mask_name": mask.mask_name,
+            "bbox": (bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max),
+            "caption": caption,
+        })
+
+    return run.run_name, mask_jobs
 
-        for padding in (20, 40):
+
+def mask_output_paths(job):
+    sub_output_folder = os.path.dirname(job["base_image_path"])
+    paths = []
+    for padding in PADDINGS:
+        for _, rtag in ROTATION_OPS:
+            for _, ftag in FLIP_OPS:
+                aug_name = f"{job['mask_name']}_bounded_p{padding}_{rtag}{('_' + ftag) if ftag else ''}.png"
+                paths.append((padding, rtag, ftag, os.path.join(sub_output_folder, aug_name)))
+    return paths
+
+
+def process_single_mask(job, crop_margin=None, png_compression=3):
+    """
+    Worker function that writes the bounded (optionally cropped), rotated and flipped
+    images of one mask and returns (entries, num_written, num_skipped).
+    Outputs that already exist are not rewritten.
+    """
+    outputs = mask_output_paths(job)
+    missing = [o for o in outputs if not os.path.exists(o[-1])]
+
+    if missing:
+        # IMREAD_COLOR decodes the grayscale base image straight to BGR
+        base = cv2.imread(job["base_image_path"], cv2.IMREAD_COLOR)
+        h, w = base.shape[:2]
+        bbox_x_min, bbox_y_min, bbox_x_max, bbox_y_max = job["bbox"]
+        missing_paddings = sorted({o[0] for o in missing})
+
+        for padding in missing_paddings:
             x_min = max(0, bbox_x_min - padding)
             y_min = max(0, bbox_y_min - padding)
             x_max = min(w, bbox_x_max + padding)
             y_max = min(h, bbox_y_max + padding)
 
-            # Bounded image with rectangle
-            bounded = norm_img.copy()
-            if bounded.ndim == 2 or (bounded.ndim == 3 and bounded.shape[2] == 1):
-                bounded = cv2.cvtColor(bounded, cv2.COLOR_GRAY2BGR)
-            cv2.rectangle(bounded, (x_min, y_min), (x_max, y_max), (0, 0, 255), 6)
-
-            rotation_ops = [
-                (0,   lambda img: img,                                      "r0"),
-                (90,  lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE), "r90"),
-                (180, lambda img: cv2.rotate(img, cv2.ROTATE_180),          "r180"),
-                (270, lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE), "r270"),
-            ]
-            flip_ops = [
-                (None, ""),    # no flip → original
-                (1, "fh"),     # horizontal flip
-            ]
-
-            for _, rot_fn, rtag in rotation_ops:
-                rotated = rot_fn(bounded)
-                for flip_code, ftag in flip_ops:
+            # Only the pixels under the rectangle are saved and restored,
+            # instead of copying the full frame per mask.
+            t = BOX_THICKNESS
+            ry0, ry1 = max(0, y_min - t), min(h, y_max + t + 1)
+            rx0, rx1 = max(0, x_min - t), min(w, x_max + t + 1)
+            saved = base[ry0:ry1, rx0:rx1].copy()
+            cv2.rectangle(base, (x_min, y_min), (x_max, y_max), BOX_COLOR, BOX_THICKNESS)
+
+            if crop_margin is None:
+                bounded = base
+            else:
+                bounded = base[
+                    max(0, y_min - crop_margin):min(h, y_max + crop_margin),
+                    max(0, x_min - crop_margin):min(w, x_max + crop_margin),
+                ]
+
+            for rot_fn, rtag in ROTATION_OPS:
+                rotated = None
+                for flip_code, ftag in FLIP_OPS:
+                    path = next(o[-1] for o in outputs if o[:3] == (padding, rtag, ftag))
+                    if os.path.exists(path):
+                        continue
+                    if rotated is None:
+                        rotated = rot_fn(bounded)
                     aug = rotated if flip_code is None else cv2.flip(rotated, flip_code)
-                    aug_name = f"{mask.mask_name}_bounded_p{padding}_{rtag}{('_' + ftag) if ftag else ''}.png"
-                    aug_path = os.path.join(sub_output_folder, aug_name)
-                    cv2.imwrite(aug_path, aug)
-                    entries.append({
-                        "image": aug_path,
-                        "image_id": aug_path.replace("/", "_").replace(".png", ""),
-                        "caption": [caption],
-                    })
-
-    return entries
+                    _atomic_imwrite(path, aug, png_compression)
+
+            base[ry0:ry1, rx0:rx1] = saved
+
+    entries = [
+        {
+            "image": aug_path,
+            "image_id": aug_path.replace("/", "_").replace(".png", ""),
+            "caption": [job["caption"]],
+        }
+        for *_, aug_path in outputs
+    ]
+    return entries, len(missing), len(outputs) - len(missing)
+
+
+def compact_entry(job):
+    """Single annotation per mask; the cryoet_image_* processors draw and augment at load time."""
+    sub_output_folder = os.path.dirname(job["base_image_path"])
+    return {
+        "image": job["base_image_path"],
+        "image_id": os.path.join(sub_output_folder, job["mask_name"]).replace("/", "_"),
+        "bbox": [int(v) for v in job["bbox"]],
+        "caption": [job["caption"]],
+    }
+
+
+def _atomic_imwrite(path, img, png_compression=3):
+    # write under a temporary name so that interrupted runs never leave truncated files
+    tmp_path = path[: -len(".png")] + ".tmp.png"
+    cv2.imwrite(tmp_path, img, [cv2.IMWRITE_PNG_COMPRESSION, png_compression])
+    os.replace(tmp_path, path)
+
+
+def load_written_ids(jsonl_path):
+    written = set()
+    if not os.path.exists(jsonl_path):
+        return written
+    with open(jsonl_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                written.add(json.loads(line)["image_id"])
+            except (json.JSONDecodeError, KeyError):
+                # trailing partial line of an interrupted run
+                continue
+    return written
+
+
+def jsonl_to_json(jsonl_path, json_path):
+    with open(jsonl_path, "r") as f_in, open(json_path, "w") as f_out:
+        f_out.write("[")
+        first = True
+        for line in f_in:
+            line = line.strip()
+            if not line:
+                continue
+            f_out.write(("" if first else ",\n") + line)
+            first = False
+        f_out.write("]\n")
 
 
 def parse_args():
@@ -135,7 +253,7 @@ def parse_args():
     parser.add_argument(
         "--output-folder",
         default="output_images",
-        help="Folder where images and labels.json will be written."
+        help="Folder where images and labels_{train,val,test}.jsonl will be written."
     )
     parser.add_argument(
         "--p-low", type=float, default=5.0,
@@ -149,6 +267,25 @@ def parse_args():
         "--workers", type=int, default=0,
         help="Number of worker processes (0 = use os.cpu_count())."
     )
+    parser.add_argument(
+        "--crop-margin", type=int, default=None,
+        help="If set, write the region around the padded box plus this margin (in pixels) "
+             "instead of the full frame."
+    )
+    parser.add_argument(
+        "--png-compression", type=int, default=3,
+        help="PNG compression level 0-9 (lower is faster, default: 3)."
+    )
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Write one annotation per mask with its bbox instead of 16 augmented images "
+             "(for the cryoet_caption_compact dataset)."
+    )
+    parser.add_argument(
+        "--jsonl-only", action="store_true",
+        help="Only write labels_{train,val,test}.jsonl, which cryoet_caption_compact reads, "
+             "without converting them to the labels_{train,val,test}.json arrays when done."
+    )
     parser.add_argument(
         "--verbose", action="store_true",
         help="Print per-run image stats."
@@ -160,26 +297,56 @@ def main():
     args = parse_args()
 
     os.makedirs(args.output_folder, exist_ok=True)
-    output_train_json = os.path.join(args.output_folder, "labels_train.json")
-    output_val_json = os.path.join(args.output_folder, "labels_val.json")
-    output_test_json = os.path.join(args.output_folder, "labels_test.json")
+    jsonl_paths = {
+        split: os.path.join(args.output_folder, f"labels_{split}.jsonl") for split in SPLITS
+    }
 
     # Discover runs (single pass) so we know how many jobs to schedule.
     root = SABER_reader2.SABERZarr(args.zarr_path)
     num_runs = len(root.runs)
+    split_of_run = split_runs(num_runs)
 
     # Choose worker count
     max_workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
 
-    all_entries = [] # list of lists of augmented boxes 
-
-    # Parallelize over run indices
-    with ProcessPoolExecutor(max_workers=max_workers) as ex:
-        futures = []
-        for run_idx in range(num_runs):
-            futures.append(
-                ex.submit(
-                    process_single_run,
+    # Entries already recorded by an interrupted run are not written twice.
+    written = {split: load_written_ids(path) for split, path in jsonl_paths.items()}
+    num_entries = {split: len(ids) for split, ids in written.items()}
+    out_files = {split: open(path, "a") for split, path in jsonl_paths.items()}
+
+    stats = {"runs": 0, "masks": 0, "images_written": 0, "images_skipped": 0}
+    start_time = time.time()
+
+    def record(entries, split):
+        lines = []
+        for entry in entries:
+            if entry["image_id"] in written[split]:
+                continue
+            written[split].add(entry["image_id"])
+            # train annotations carry a single caption string
+            if split == "train":
+                entry["caption"] = entry["caption"][0]
+            lines.append(json.dumps(entry) + "\n")
+        out_files[split].writelines(lines)
+        out_files[split].flush()
+        num_entries[split] += len(lines)
+
+    def report():
+        elapsed = max(time.time() - start_time, 1e-9)
+        print(
+            f"[{elapsed:.0f}s] runs {stats['runs']}/{num_runs}, masks {stats['masks']} "
+            f"({stats['masks'] / elapsed:.2f}/s), images written {stats['images_written']} "
+            f"({stats['images_written'] / elapsed:.2f}/s), skipped {stats['images_skipped']}",
+            flush=True,
+        )
+
+    try:
+        # Runs are prepared in parallel, then each mask is scheduled as its own job.
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            pending = {}
+            for run_idx in range(num_runs):
+                fut = ex.submit(
+                    prepare_single_run,
                     args.zarr_path,
                     run_idx,
                     args.output_folder,
@@ -187,45 +354,53 @@ def main():
                     args.p_high,
                     args.verbose,
                 )
-            )
-
-        # Collect results as they complete; preserve original order by sorting later if needed
-        # Here we just extend as completed; JSON order isn't critical, but you can reorder if desired.
-        for fut in as_completed(futures):
-            entries = fut.result()
-            all_entries.append(entries)
-
-    # check 
-    len_inner_lists = [len(inner_list) for inner_list in all_entries]
-    print(f"Number of lens {len(set(len_inner_lists))}")
-    
-    shuffled_indices = np.arange(len(all_entries))
-
-    #all_entries = np.array(all_entries)
-    np.random.seed(42)
-    np.random.shuffle(shuffled_indices)
-    # Split entries into train/val/test sets
-    train_indices, val_indices, test_indices = np.split(shuffled_indices, [int(0.8 * len(shuffled_indices)), int(0.9 * len(shuffled_indices))])
-    train_entries, val_entries, test_entries = [], [], [] 
-    for idx in train_indices:
-        train_entries.extend(all_entries[idx]) 
-    for idx in val_indices:
-        val_entries.extend(all_entries[idx])
-    for idx in test_indices:
-        test_entries.extend(all_entries[idx])
-   
-
-    # For all train entries, we modify the "caption" to be the first element in the list
-    for entry in train_entries:
-        entry["caption"] = entry["caption"][0]
-    # Write JSON files
-    with open(output_train_json, 'w') as f:
-        json.dump(train_entries, f, indent=4)
-    with open(output_val_json, 'w') as f:
-        json.dump(val_entries, f, indent=4)
-    with open(output_test_json, 'w') as f:
-        json.dump(test_entries, f, indent=4)
-    print(f"Wrote {len(all_entries)} entries to {output_train_json}, {output_val_json}, and {output_test_json}")
+                pending[fut] = ("run", run_idx)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    kind, run_idx = pending.pop(fut)
+                    if kind == "run":
+                        stats["runs"] += 1
+                        _, mask_jobs = fut.result()
+                        if args.compact:
+                            record([compact_entry(job) for job in mask_jobs], split_of_run[run_idx])
+                            stats["masks"] += len(mask_jobs)
+                            continue
+                        for job in mask_jobs:
+                            mask_fut = ex.submit(
+                                process_single_mask, job, args.crop_margin, args.png_compression
+                            )
+                            pending[mask_fut] = ("mask", run_idx)
+                        continue
+
+                    entries, num_written, num_skipped = fut.result()
+                    record(entries, split_of_run[run_idx])
+
+                    stats["masks"] += 1
+                    stats["images_written"] += num_written
+                    stats["images_skipped"] += num_skipped
+                    if stats["masks"] % 100 == 0:
+                        report()
+    finally:
+        for f in out_files.values():
+            f.close()
+
+    report()
+
+    output_paths = dict(jsonl_paths)
+    if not args.jsonl_only:
+        # the JSON arrays read by cryoet_caption and benchmark.py --image-json
+        for split, path in jsonl_paths.items():
+            output_paths[split] = path[: -len(".jsonl")] + ".json"
+            jsonl_to_json(path, output_paths[split])
+
+    print(
+        "Wrote {} entries to {}".format(
+            sum(num_entries.values()),
+            ", ".join(f"{output_paths[s]} ({num_entries[s]})" for s in SPLITS),
+        )
+    )
 
 
 if __name__ == "__main__":
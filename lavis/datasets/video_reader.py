@@ -0,0 +1,175 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import random as rnd
+import time
+
+import cv2
+import decord
+import numpy as np
+import torch
+
+decord.bridge.set_bridge("torch")
+
+BACKENDS = ("decord", "opencv")
+SAMPLING_MODES = ("uniform", "headtail", "linspace")
+
+# forward gap (in frames) above which the OpenCV backend seeks instead of decoding through
+SEEK_GAP = 48
+
+
+def plan_frame_indices(vlen, n_frms, sampling="uniform", start_frame=0, end_frame=None):
+    """
+    Sorted indices of the frames of a video of vlen frames to decode.
+
+    - uniform: min(n_frms, number of frames) frames evenly spaced in [start_frame, end_frame).
+    - headtail: n_frms // 2 random frames in each half of [start_frame, end_frame).
+    - linspace: n_frms frames evenly spaced from start_frame to end_frame, both included.
+
+    end_frame defaults to the end of the video. Indices past its last frame are dropped.
+    """
+    if end_frame is None:
+        end_frame = vlen - 1 if sampling == "linspace" else vlen
+    span = end_frame - start_frame
+
+    if sampling == "uniform":
+        n_frms = min(n_frms, span)
+        if n_frms <= 0:
+            return []
+        indices = np.arange(start_frame, end_frame, span / n_frms).astype(int)[:n_frms].tolist()
+    elif sampling == "headtail":
+        n_frms = max(min(n_frms, span), 0)
+        mid = start_frame + span // 2
+        indices_h = sorted(rnd.sample(range(start_frame, mid), n_frms // 2))
+        indices_t = sorted(rnd.sample(range(mid, end_frame), n_frms // 2))
+        indices = indices_h + indices_t
+    elif sampling == "linspace":
+        if n_frms == 1:
+            indices = [start_frame]
+        else:
+            step = span // (n_frms - 1)
+            indices = [start_frame + step * i for i in range(n_frms - 1)] + [end_frame]
+    else:
+        raise NotImplementedError
+
+    return [index for index in indices if index < vlen]
+
+
+class VideoClipReader:
+    """
+    Decodes the frames of a clip as a uint8 tensor (C, T, H, W), RGB, resized to (height, width)
+    while decoding (-1 keeps the size of the video).
+
+    Frame indices are planned up front, so that frames are decoded in order:
+    - decord: VideoReader.get_batch, which looks up the keyframes of the video and only seeks
+      when the next frame is not reachable by decoding forward. Frames are returned zero-copy.
+    - opencv: frames closer than seek_gap to the current position are reached by grabbing
+      (decoding without conversion) the frames in between, instead of seeking, which restarts
+      decoding from the previous keyframe. Frames are written into a buffer owned by the
+      reader and reused by the next read, so the clip returned is only valid until then.
+
+    Frames stay uint8 until the processors convert them, and last_decode_time is the time in
+    seconds spent opening and decoding the last clip.
+    """
+
+    def __init__(self, height=-1, width=-1, backend="decord", seek_gap=SEEK_GAP):
+        assert backend in BACKENDS, "backend must be one of {}".format(BACKENDS)
+        self.height = height
+        self.width = width
+        self.backend = backend
+        self.seek_gap = seek_gap
+
+        self.last_decode_time = 0.0
+        self._buffer = None
+
+    def read(self, video_path, n_frms, sampling="uniform", start_time=None, end_time=None):
+        """
+        Returns the clip of n_frms frames between start_time and end_time (in seconds, the whole
+        video by default), or None if no frame could be decoded.
+        """
+        start = time.perf_counter()
+        if self.backend == "decord":
+            clip = self._read_decord(video_path, n_frms, sampling, start_time, end_time)
+        else:
+            clip = self._read_opencv(video_path, n_frms, sampling, start_time, end_time)
+        self.last_decode_time = time.perf_counter() - start
+
+        return clip
+
+    @staticmethod
+    def _frame_range(fps, start_time, end_time):
+        start_frame = int(start_time * fps) if start_time is not None else 0
+        end_frame = int(end_time * fps) if end_time is not None else None
+        return start_frame, end_frame
+
+    def _read_decord(self, video_path, n_frms, sampling, start_time, end_time):
+        vr = decord.VideoReader(uri=video_path, height=self.height, width=self.width)
+
+        vlen = len(vr)
+        start_frame, end_frame = self._frame_range(vr.get_avg_fps(), start_time, end_time)
+        indices = plan_frame_indices(vlen, n_frms, sampling, start_frame, end_frame)
+        if len(indices) == 0:
+            return None
+
+        # get_batch -> T, H, W, C
+        return vr.get_batch(indices).permute(3, 0, 1, 2)
+
+    def _read_opencv(self, video_path, n_frms, sampling, start_time, end_time):
+        cap = cv2.VideoCapture(video_path)
+        try:
+            vlen = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            start_frame, end_frame = self._frame_range(cap.get(cv2.CAP_PROP_FPS), start_time, end_time)
+            indices = plan_frame_indices(vlen, n_frms, sampling, start_frame, end_frame)
+
+            height = self.height if self.height > 0 else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            width = self.width if self.width > 0 else int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            frames = self._get_buffer(len(indices), height, width)
+
+            num_frames = 0
+            position = 0  # index of the frame the next read returns
+            frame = resized = None
+            for i, index in enumerate(indices):
+                if i > 0 and index == indices[i - 1]:
+                    frames[i] = frames[i - 1]
+                    num_frames += 1
+                    continue
+
+                if index < position or index - position > self.seek_gap:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                else:
+                    while position < index and cap.grab():
+                        position += 1
+                ret, frame = cap.read(frame)
+                if not ret:
+                    break
+                position = index + 1
+
+                if frame.shape[:2] != (height, width):
+                    resized = cv2.resize(frame, (width, height), dst=resized)
+                    cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=frames[i])
+                else:
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frames[i])
+                num_frames += 1
+        finally:
+            cap.release()
+
+        if num_frames == 0:
+            return None
+        # T, H, W, C -> C, T, H, W
+        return torch.from_numpy(frames[:num_frames]).permute(3, 0, 1, 2)
+
+    def _get_buffer(self, num_frames, height, width):
+        buffer = self._buffer
+        if buffer is None or len(buffer) < num_frames or buffer.shape[1:3] != (height, width):
+            buffer = np.empty((max(num_frames, 1), height, width, 3), dtype=np.uint8)
+            self._buffer = buffer
+        return buffer
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_buffer"] = None
+        return state
@@ -9,51 +9,49 @@ import logging
 import torch
 from omegaconf import OmegaConf
 from lavis.common.registry import registry
+from lavis.common.registry_manifest import lazy_attributes
 
 from lavis.models.base_model import BaseModel
-
-from lavis.models.albef_models.albef_classification import AlbefClassification
-from lavis.models.albef_models.albef_feature_extractor import AlbefFeatureExtractor
-from lavis.models.albef_models.albef_nlvr import AlbefNLVR
-from lavis.models.albef_models.albef_pretrain import AlbefPretrain
-from lavis.models.albef_models.albef_retrieval import AlbefRetrieval
-from lavis.models.albef_models.albef_vqa import AlbefVQA
-from lavis.models.alpro_models.alpro_qa import AlproQA
-from lavis.models.alpro_models.alpro_retrieval import AlproRetrieval
-
-from lavis.models.blip_models.blip import BlipBase
-from lavis.models.blip_models.blip_caption import BlipCaption
-from lavis.models.blip_models.blip_classification import BlipClassification
-from lavis.models.blip_models.blip_feature_extractor import BlipFeatureExtractor
-from lavis.models.blip_models.blip_image_text_matching import BlipITM
-from lavis.models.blip_models.blip_nlvr import BlipNLVR
-from lavis.models.blip_models.blip_pretrain import BlipPretrain
-from lavis.models.blip_models.blip_retrieval import BlipRetrieval
-from lavis.models.blip_models.blip_vqa import BlipVQA
-
-from lavis.models.blip2_models.blip2 import Blip2Base
-from lavis.models.blip2_models.blip2_opt import Blip2OPT
-from lavis.models.blip2_models.blip2_t5 import Blip2T5
-from lavis.models.blip2_models.blip2_qformer import Blip2Qformer
-from lavis.models.blip2_models.blip2_image_text_matching import Blip2ITM
-
-from lavis.models.blip2_models.blip2_t5_instruct import Blip2T5Instruct
-from lavis.models.blip2_models.blip2_vicuna_instruct import Blip2VicunaInstruct
-from lavis.models.blip2_models.blip2_vicuna_xinstruct import Blip2VicunaXInstruct
-
-from lavis.models.blip_diffusion_models.blip_diffusion import BlipDiffusion
-
-from lavis.models.pnp_vqa_models.pnp_vqa import PNPVQA
-from lavis.models.pnp_vqa_models.pnp_unifiedqav2_fid import PNPUnifiedQAv2FiD
-from lavis.models.img2prompt_models.img2prompt_vqa import Img2PromptVQA
-from lavis.models.med import XBertLMHeadDecoder
-from lavis.models.vit import VisionTransformerEncoder
-from lavis.models.clip_models.model import CLIP
-
-from lavis.models.gpt_models.gpt_dialogue import GPTDialogue
-
 from lavis.processors.base_processor import BaseProcessor
 
+# classes imported on first access, like the registry imports them on first lookup
+_LAZY_ATTRIBUTES = {
+    "AlbefClassification": "lavis.models.albef_models.albef_classification",
+    "AlbefFeatureExtractor": "lavis.models.albef_models.albef_feature_extractor",
+    "AlbefNLVR": "lavis.models.albef_models.albef_nlvr",
+    "AlbefPretrain": "lavis.models.albef_models.albef_pretrain",
+    "AlbefRetrieval": "lavis.models.albef_models.albef_retrieval",
+    "AlbefVQA": "lavis.models.albef_models.albef_vqa",
+    "AlproQA": "lavis.models.alpro_models.alpro_qa",
+    "AlproRetrieval": "lavis.models.alpro_models.alpro_retrieval",
+    "BlipBase": "lavis.models.blip_models.blip",
+    "BlipCaption": "lavis.models.blip_models.blip_caption",
+    "BlipClassification": "lavis.models.blip_models.blip_classification",
+    "BlipFeatureExtractor": "lavis.models.blip_models.blip_feature_extractor",
+    "BlipITM": "lavis.models.blip_models.blip_image_text_matching",
+    "BlipNLVR": "lavis.models.blip_models.blip_nlvr",
+    "BlipPretrain": "lavis.models.blip_models.blip_pretrain",
+    "BlipRetrieval": "lavis.models.blip_models.blip_retrieval",
+    "BlipVQA": "lavis.models.blip_models.blip_vqa",
+    "Blip2Base": "lavis.models.blip2_models.blip2",
+    "Blip2OPT": "lavis.models.blip2_models.blip2_opt",
+    "Blip2T5": "lavis.models.blip2_models.blip2_t5",
+    "Blip2Qformer": "lavis.models.blip2_models.blip2_qformer",
+    "Blip2ITM": "lavis.models.blip2_models.blip2_image_text_matching",
+    "Blip2T5Instruct": "lavis.models.blip2_models.blip2_t5_instruct",
+    "Blip2VicunaInstruct": "lavis.models.blip2_models.blip2_vicuna_instruct",
+    "Blip2VicunaXInstruct": "lavis.models.blip2_models.blip2_vicuna_xinstruct",
+    "BlipDiffusion": "lavis.models.blip_diffusion_models.blip_diffusion",
+    "PNPVQA": "lavis.models.pnp_vqa_models.pnp_vqa",
+    "PNPUnifiedQAv2FiD": "lavis.models.pnp_vqa_models.pnp_unifiedqav2_fid",
+    "Img2PromptVQA": "lavis.models.img2prompt_models.img2prompt_vqa",
+    "XBertLMHeadDecoder": "lavis.models.med",
+    "VisionTransformerEncoder": "lavis.models.vit",
+    "CLIP": "lavis.models.clip_models.model",
+    "GPTDialogue": "lavis.models.gpt_models.gpt_dialogue",
+}
+__getattr__ = lazy_attributes(_LAZY_ATTRIBUTES)
+
 
 __all__ = [
     "load_model",
@@ -240,10 +238,17 @@ class ModelZoo:
     """
 
     def __init__(self) -> None:
-        self.model_zoo = {
-            k: list(v.PRETRAINED_MODEL_CONFIG_DICT.keys())
-            for k, v in registry.mapping["model_name_mapping"].items()
-        }
+        self._model_zoo = None
+
+    @property
+    def model_zoo(self):
+        # imports every model
+        if self._model_zoo is None:
+            self._model_zoo = {
+                k: list(registry.get_model_class(k).PRETRAINED_MODEL_CONFIG_DICT.keys())
+                for k in registry.list_models()
+            }
+        return self._model_zoo
 
     def __str__(self) -> str:
         return (
@@ -18,6 +18,7 @@ from lavis.common.dist_utils import download_cached_file
 from lavis.common.logger import MetricLogger
 from lavis.common.utils import is_url
 from lavis.models.base_model import BaseModel
+from lavis.models.retrieval_utils import max_sim_matrix, rerank_topk
 from lavis.models.vit import interpolate_pos_embed
 from transformers import BertTokenizer
 
@@ -75,6 +76,7 @@ class AlbefBase(BaseModel):
 
 def compute_sim_matrix(model, data_loader, **kwargs):
     k_test = kwargs.pop("k_test")
+    itm_batch_size = kwargs.pop("itm_batch_size", None)
 
     metric_logger = MetricLogger(delimiter="  ")
     header = "Evaluation:"
@@ -127,64 +129,40 @@ def compute_sim_matrix(model, data_loader, **kwargs):
     image_feats = torch.cat(image_feats, dim=0)
     image_embeds = torch.cat(image_embeds, dim=0)
 
-    sims_matrix = image_embeds @ text_embeds.t()
-    score_matrix_i2t = torch.full(
-        (len(data_loader.dataset.image), len(texts)), -100.0
-    ).to(model.device)
-
-    num_tasks = dist_utils.get_world_size()
-    rank = dist_utils.get_rank()
-    step = sims_matrix.size(0) // num_tasks + 1
-    start = rank * step
-    end = min(sims_matrix.size(0), start + step)
-
-    for i, sims in enumerate(
-        metric_logger.log_every(sims_matrix[start:end], 50, header)
-    ):
-        # topk_sim, topk_idx = sims.topk(k=config["k_test"], dim=0)
-        topk_sim, topk_idx = sims.topk(k=k_test, dim=0)
-
-        encoder_output = image_feats[start + i].repeat(k_test, 1, 1).to(model.device)
-        encoder_att = torch.ones(encoder_output.size()[:-1], dtype=torch.long).to(
+    sims_matrix = max_sim_matrix(image_embeds, text_embeds)
+
+    def itm_score(image_inputs, text_idx):
+        encoder_att = torch.ones(image_inputs.size()[:-1], dtype=torch.long).to(
             model.device
         )
         output = model.text_encoder(
-            text_ids[topk_idx],
-            attention_mask=text_atts[topk_idx],
-            encoder_hidden_states=encoder_output,
+            text_ids[text_idx],
+            attention_mask=text_atts[text_idx],
+            encoder_hidden_states=image_inputs,
             encoder_attention_mask=encoder_att,
             return_dict=True,
         )
-        score = model.itm_head(output.last_hidden_state[:, 0, :])[:, 1]
-        score_matrix_i2t[start + i, topk_idx] = score + topk_sim
-
-    sims_matrix = sims_matrix.t()
-    score_matrix_t2i = torch.full(
-        (len(texts), len(data_loader.dataset.image)), -100.0
-    ).to(model.device)
-
-    step = sims_matrix.size(0) // num_tasks + 1
-    start = rank * step
-    end = min(sims_matrix.size(0), start + step)
+        return model.itm_head(output.last_hidden_state[:, 0, :])[:, 1]
 
-    for i, sims in enumerate(
-        metric_logger.log_every(sims_matrix[start:end], 50, header)
-    ):
-
-        topk_sim, topk_idx = sims.topk(k=k_test, dim=0)
-        encoder_output = image_feats[topk_idx.cpu()].to(model.device)
-        encoder_att = torch.ones(encoder_output.size()[:-1], dtype=torch.long).to(
-            model.device
+    def i2t_itm(query_idx, topk_idx):
+        image_inputs = image_feats[query_idx.cpu()].to(model.device)
+        return itm_score(
+            image_inputs.repeat_interleave(topk_idx.size(1), dim=0),
+            topk_idx.flatten(),
         )
-        output = model.text_encoder(
-            text_ids[start + i].repeat(k_test, 1),
-            attention_mask=text_atts[start + i].repeat(k_test, 1),
-            encoder_hidden_states=encoder_output,
-            encoder_attention_mask=encoder_att,
-            return_dict=True,
+
+    def t2i_itm(query_idx, topk_idx):
+        image_inputs = image_feats[topk_idx.flatten().cpu()].to(model.device)
+        return itm_score(
+            image_inputs, query_idx.repeat_interleave(topk_idx.size(1), dim=0)
         )
-        score = model.itm_head(output.last_hidden_state[:, 0, :])[:, 1]
-        score_matrix_t2i[start + i, topk_idx] = score + topk_sim
+
+    score_matrix_i2t = rerank_topk(
+        sims_matrix, i2t_itm, k_test, itm_batch_size, metric_logger, header
+    )
+    score_matrix_t2i = rerank_topk(
+        sims_matrix.t(), t2i_itm, k_test, itm_batch_size, metric_logger, header
+    )
 
     if dist_utils.is_dist_avail_and_initialized():
         dist.barrier()
@@ -340,5 +340,11 @@ class AlbefRetrieval(AlbefBase, MomentumDistilationMixin, SharedQueueMixin):
         Compute similarity i2t, t2i matrix for the given data loader.
         """
         k_test = task_cfg.k_test
+        itm_batch_size = task_cfg.get("itm_batch_size", None)
 
-        return compute_sim_matrix(model=self, data_loader=data_loader, k_test=k_test)
+        return compute_sim_matrix(
+            model=self,
+            data_loader=data_loader,
+            k_test=k_test,
+            itm_batch_size=itm_batch_size,
+        )
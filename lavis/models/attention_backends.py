@@ -0,0 +1,96 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import logging
+import math
+
+import torch
+import torch.nn.functional as F
+
+# "math" keeps the explicit attention matrix of each module, "sdpa" routes through
+# torch.nn.functional.scaled_dot_product_attention (torch >= 2.0) and "chunked"
+# materializes the attention matrix for chunk_size queries at a time.
+ATTN_BACKENDS = ("math", "sdpa", "chunked")
+DEFAULT_CHUNK_SIZE = 64
+
+
+def has_sdpa():
+    return hasattr(F, "scaled_dot_product_attention")
+
+
+def attention(
+    query,
+    key,
+    value,
+    attn_bias=None,
+    dropout_p=0.0,
+    scale=None,
+    backend="sdpa",
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Computes softmax(query @ key^T * scale + attn_bias) @ value.
+
+    query (B, H, Lq, D), key and value (B, H, Lk, D); attn_bias is an additive bias
+    broadcastable to (B, H, Lq, Lk), e.g. an extended attention mask or a relative
+    position bias. scale defaults to 1 / sqrt(D).
+    """
+    head_dim = query.size(-1)
+    if scale is None:
+        scale = 1.0 / math.sqrt(head_dim)
+    if attn_bias is not None:
+        attn_bias = attn_bias.to(query.dtype)
+
+    if backend == "sdpa" and has_sdpa():
+        # scaled_dot_product_attention only takes a scale argument from torch 2.1
+        query = query * (scale * math.sqrt(head_dim))
+        return F.scaled_dot_product_attention(
+            query, key, value, attn_mask=attn_bias, dropout_p=dropout_p
+        )
+
+    chunk_size = chunk_size if backend == "chunked" else query.size(-2)
+    key = key.transpose(-2, -1)
+
+    outputs = []
+    for start in range(0, query.size(-2), chunk_size):
+        attn = (query[..., start : start + chunk_size, :] * scale) @ key
+        if attn_bias is not None:
+            if attn_bias.size(-2) == 1:
+                attn = attn + attn_bias
+            else:
+                attn = attn + attn_bias[..., start : start + chunk_size, :]
+        attn = attn.softmax(dim=-1)
+        if dropout_p > 0:
+            attn = F.dropout(attn, p=dropout_p)
+        outputs.append(attn @ value)
+    return torch.cat(outputs, dim=-2)
+
+
+def set_attn_backend(model, backend, chunk_size=None):
+    """Selects the attention backend of every module of model that supports several."""
+    assert backend in ATTN_BACKENDS, "Unknown attention backend {}, expected one of {}".format(
+        backend, ATTN_BACKENDS
+    )
+    if backend == "sdpa" and not has_sdpa():
+        logging.warning(
+            "scaled_dot_product_attention requires torch >= 2.0, using the chunked backend."
+        )
+        backend = "chunked"
+
+    for module in model.modules():
+        if hasattr(module, "attn_backend"):
+            module.attn_backend = backend
+            if chunk_size is not None:
+                module.attn_chunk_size = chunk_size
+    return model
+
+
+def set_attn_backend_from_config(model, cfg):
+    backend = cfg.get("attn_backend", None)
+    if backend is not None:
+        set_attn_backend(model, backend, cfg.get("attn_chunk_size", None))
+    return model
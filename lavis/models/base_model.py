@@ -11,8 +11,10 @@ import os
 import numpy as np
 import torch
 import torch.nn as nn
+from lavis.common.checkpoint import load_state_dict, load_state_dict_into
 from lavis.common.dist_utils import download_cached_file, is_dist_avail_and_initialized
 from lavis.common.utils import get_abs_path, is_url
+from lavis.models.attention_backends import set_attn_backend_from_config
 from omegaconf import OmegaConf
 
 
@@ -33,22 +35,9 @@ class BaseModel(nn.Module):
         This should expect no mismatch in the model keys and the checkpoint keys.
         """
 
-        if is_url(url_or_filename):
-            cached_file = download_cached_file(
-                url_or_filename, check_hash=False, progress=True
-            )
-            checkpoint = torch.load(cached_file, map_location="cpu")
-        elif os.path.isfile(url_or_filename):
-            checkpoint = torch.load(url_or_filename, map_location="cpu")
-        else:
-            raise RuntimeError("checkpoint url or path is invalid")
-
-        if "model" in checkpoint.keys():
-            state_dict = checkpoint["model"]
-        else:
-            state_dict = checkpoint
-
-        msg = self.load_state_dict(state_dict, strict=False)
+        # safetensors and .pth files are memory-mapped and copied into the parameters
+        state_dict = load_state_dict(url_or_filename)
+        msg = load_state_dict_into(self, state_dict)
 
         logging.info("Missing keys {}".format(msg.missing_keys))
         logging.info("load checkpoint from %s" % url_or_filename)
@@ -68,6 +57,7 @@ class BaseModel(nn.Module):
         """
         model_cfg = OmegaConf.load(cls.default_config_path(model_type)).model
         model = cls.from_config(model_cfg)
+        set_attn_backend_from_config(model, model_cfg)
 
         return model
 
@@ -45,6 +45,8 @@ from transformers.modeling_utils import (
 from transformers.utils import logging
 from transformers.models.bert.configuration_bert import BertConfig
 
+from lavis.models.attention_backends import DEFAULT_CHUNK_SIZE, attention
+
 logger = logging.get_logger(__name__)
 
 
@@ -146,6 +148,10 @@ class BertSelfAttention(nn.Module):
             )
         self.save_attention = False
 
+        # see lavis.models.attention_backends.set_attn_backend
+        self.attn_backend = "math"
+        self.attn_chunk_size = DEFAULT_CHUNK_SIZE
+
     def save_attn_gradients(self, attn_gradients):
         self.attn_gradients = attn_gradients
 
@@ -201,6 +207,29 @@ class BertSelfAttention(nn.Module):
 
         past_key_value = (key_layer, value_layer)
 
+        if (
+            self.attn_backend != "math"
+            and self.position_embedding_type == "absolute"
+            and head_mask is None
+            and not output_attentions
+            and not (is_cross_attention and self.save_attention)
+        ):
+            # the attention probabilities are not materialized, fall back to the
+            # math path when they are needed
+            context_layer = attention(
+                query_layer,
+                key_layer,
+                value_layer,
+                attn_bias=attention_mask,
+                dropout_p=self.dropout.p if self.training else 0.0,
+                backend=self.attn_backend,
+                chunk_size=self.attn_chunk_size,
+            )
+            context_layer = context_layer.permute(0, 2, 1, 3).contiguous()
+            new_context_layer_shape = context_layer.size()[:-2] + (self.all_head_size,)
+            context_layer = context_layer.view(*new_context_layer_shape)
+            return (context_layer, past_key_value)
+
         # Take the dot product between "query" and "key" to get the raw attention scores.
         attention_scores = torch.matmul(query_layer, key_layer.transpose(-1, -2))
 
@@ -5,10 +5,12 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 import contextlib
+import hashlib
 import logging
 import os
 import time
 import datetime
+from collections import OrderedDict
 
 import torch
 import torch.nn as nn
@@ -16,6 +18,7 @@ import torch.distributed as dist
 import torch.nn.functional as F
 
 import lavis.common.dist_utils as dist_utils
+from lavis.common.checkpoint import load_state_dict, load_state_dict_into
 from lavis.common.dist_utils import download_cached_file
 from lavis.common.utils import is_url
 from lavis.common.logger import MetricLogger
@@ -23,6 +26,7 @@ from lavis.models.base_model import BaseModel
 from lavis.models.blip2_models.Qformer import BertConfig, BertLMHeadModel
 from lavis.models.eva_vit import create_eva_vit_g
 from lavis.models.clip_vit import create_clip_vit_L
+from lavis.models.retrieval_utils import max_sim_matrix, rerank_topk
 from transformers import BertTokenizer
 
 
@@ -82,20 +86,31 @@ class Blip2Base(BaseModel):
         self.vit_name = model_name
         return visual_encoder, ln_vision
 
-    def load_from_pretrained(self, url_or_filename):
-        if is_url(url_or_filename):
-            cached_file = download_cached_file(
-                url_or_filename, check_hash=False, progress=True
+    def get_image_embeds(self, samples):
+        """
+        Returns ln_vision(visual_encoder(image)).
+
+        The visual encoder is skipped when samples holds its output as "vit_embeds",
+        e.g. features precomputed by precompute_features.py for a frozen ViT.
+        """
+        if "vit_embeds" in samples and any(p.requires_grad for p in self.visual_encoder.parameters()):
+            raise ValueError(
+                "Precomputed vit_embeds skip the visual encoder, which is not frozen. Build the "
+                "model with freeze_vit=True, or unset build_info.cached of the datasets."
             )
-            checkpoint = torch.load(cached_file, map_location="cpu")
-        elif os.path.isfile(url_or_filename):
-            checkpoint = torch.load(url_or_filename, map_location="cpu")
-        else:
-            raise RuntimeError("checkpoint url or path is invalid")
 
-        state_dict = checkpoint["model"]
+        with self.maybe_autocast():
+            if "vit_embeds" in samples:
+                vit_embeds = samples["vit_embeds"].to(self.ln_vision.weight.dtype)
+            else:
+                vit_embeds = self.visual_encoder(samples["image"])
+            return self.ln_vision(vit_embeds)
+
+    def load_from_pretrained(self, url_or_filename):
+        # safetensors and .pth files are memory-mapped and copied into the parameters
+        state_dict = load_state_dict(url_or_filename)
 
-        msg = self.load_state_dict(state_dict, strict=False)
+        msg = load_state_dict_into(self, state_dict)
 
         # logging.info("Missing keys {}".format(msg.missing_keys))
         logging.info("load checkpoint from %s" % url_or_filename)
@@ -199,8 +214,67 @@ class LayerNorm(nn.LayerNorm):
         return ret.type(orig_type)
 
 
+class VisualPrefixCache:
+    """
+    LRU cache of per-image visual features keyed by the hash of the image content.
+
+    Entries are evicted least-recently-used first once their total size exceeds
+    `max_bytes`. Cached tensors stay on the device they were computed on.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(image):
+        image = image.detach()
+        if image.dtype == torch.bfloat16:
+            image = image.float()
+        data = image.cpu().contiguous().numpy().tobytes()
+        return "{}-{}-{}".format(
+            hashlib.sha1(data).hexdigest(), tuple(image.shape), image.dtype
+        )
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.num_bytes -= self._size(self._entries.pop(key))
+        self._entries[key] = value.detach()
+        self.num_bytes += size
+        while self.num_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.num_bytes -= self._size(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.num_bytes = 0
+
+    @staticmethod
+    def _size(value):
+        return value.numel() * value.element_size()
+
+
 def compute_sim_matrix(model, data_loader, **kwargs):
     k_test = kwargs.pop("k_test")
+    itm_batch_size = kwargs.pop("itm_batch_size", None)
 
     metric_logger = MetricLogger(delimiter="  ")
     header = "Evaluation:"
@@ -249,55 +323,30 @@ def compute_sim_matrix(model, data_loader, **kwargs):
     vit_feats = torch.cat(vit_feats, dim=0)
     image_embeds = torch.cat(image_embeds, dim=0)
 
-    sims_matrix = []
-    for image_embed in image_embeds:
-        sim_q2t = image_embed @ text_embeds.t()
-        sim_i2t, _ = sim_q2t.max(0)
-        sims_matrix.append(sim_i2t)
-    sims_matrix = torch.stack(sims_matrix, dim=0)
-
-    score_matrix_i2t = torch.full(
-        (len(data_loader.dataset.image), len(texts)), -100.0
-    ).to(model.device)
-
-    num_tasks = dist_utils.get_world_size()
-    rank = dist_utils.get_rank()
-    step = sims_matrix.size(0) // num_tasks + 1
-    start = rank * step
-    end = min(sims_matrix.size(0), start + step)
-
-    for i, sims in enumerate(
-        metric_logger.log_every(sims_matrix[start:end], 50, header)
-    ):
-        topk_sim, topk_idx = sims.topk(k=k_test, dim=0)
-        image_inputs = vit_feats[start + i].repeat(k_test, 1, 1).to(model.device)
-        score = model.compute_itm(
-            image_inputs=image_inputs,
-            text_ids=text_ids[topk_idx],
-            text_atts=text_atts[topk_idx],
-        ).float()
-        score_matrix_i2t[start + i, topk_idx] = score + topk_sim
-
-    sims_matrix = sims_matrix.t()
-    score_matrix_t2i = torch.full(
-        (len(texts), len(data_loader.dataset.image)), -100.0
-    ).to(model.device)
-
-    step = sims_matrix.size(0) // num_tasks + 1
-    start = rank * step
-    end = min(sims_matrix.size(0), start + step)
-
-    for i, sims in enumerate(
-        metric_logger.log_every(sims_matrix[start:end], 50, header)
-    ):
-        topk_sim, topk_idx = sims.topk(k=k_test, dim=0)
-        image_inputs = vit_feats[topk_idx.cpu()].to(model.device)
-        score = model.compute_itm(
+    sims_matrix = max_sim_matrix(image_embeds, text_embeds)
+
+    def i2t_itm(query_idx, topk_idx):
+        image_inputs = vit_feats[query_idx.cpu()].to(model.device)
+        return model.compute_itm(
+            image_inputs=image_inputs.repeat_interleave(topk_idx.size(1), dim=0),
+            text_ids=text_ids[topk_idx.flatten()],
+            text_atts=text_atts[topk_idx.flatten()],
+        )
+
+    def t2i_itm(query_idx, topk_idx):
+        image_inputs = vit_feats[topk_idx.flatten().cpu()].to(model.device)
+        return model.compute_itm(
             image_inputs=image_inputs,
-            text_ids=text_ids[start + i].repeat(k_test, 1),
-            text_atts=text_atts[start + i].repeat(k_test, 1),
-        ).float()
-        score_matrix_t2i[start + i, topk_idx] = score + topk_sim
+            text_ids=text_ids[query_idx].repeat_interleave(topk_idx.size(1), dim=0),
+            text_atts=text_atts[query_idx].repeat_interleave(topk_idx.size(1), dim=0),
+        )
+
+    score_matrix_i2t = rerank_topk(
+        sims_matrix, i2t_itm, k_test, itm_batch_size, metric_logger, header
+    )
+    score_matrix_t2i = rerank_topk(
+        sims_matrix.t(), t2i_itm, k_test, itm_batch_size, metric_logger, header
+    )
 
     if dist_utils.is_dist_avail_and_initialized():
         dist.barrier()
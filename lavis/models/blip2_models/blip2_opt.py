@@ -12,7 +12,11 @@ from torch.cuda.amp import autocast as autocast
 import torch.nn as nn
 
 from lavis.common.registry import registry
-from lavis.models.blip2_models.blip2 import Blip2Base, disabled_train
+from lavis.models.blip2_models.blip2 import (
+    Blip2Base,
+    VisualPrefixCache,
+    disabled_train,
+)
 # from lavis.models.blip2_models.modeling_opt import OPTForCausalLM, OPTConfig
 from transformers import AutoTokenizer, OPTForCausalLM, OPTConfig
 import transformers
@@ -54,9 +58,11 @@ class Blip2OPT(Blip2Base):
         prompt="",
         max_txt_len=32,
         apply_lemmatizer=False,
+        prefix_cache_mb=0,
     ):
         """
         apply_lemmatizer: when set to True, postprocess predict_answers() result with lemmas.
+        prefix_cache_mb: memory budget (in MB) of the visual prefix cache used by encode_image() in eval mode. 0 disables the cache.
         """
         super().__init__()
         transformers_version = version.parse(transformers.__version__)
@@ -106,14 +112,23 @@ class Blip2OPT(Blip2Base):
         self._apply_lemmatizer = apply_lemmatizer
         self._lemmatizer = None       
 
-    def forward(self, samples):
-        image = samples["image"]
-        with self.maybe_autocast():
-            image_embeds = self.ln_vision(self.visual_encoder(image))
-        image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(
-            image.device
+        self.prefix_cache = (
+            VisualPrefixCache(int(prefix_cache_mb * 1024 ** 2))
+            if prefix_cache_mb > 0
+            else None
         )
 
+    def train(self, mode=True):
+        # cached prefixes are stale once the weights may have changed
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+        return super().train(mode)
+
+    def forward(self, samples):
+        image_embeds = self.get_image_embeds(samples)
+        device = image_embeds.device
+        image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(device)
+
         query_tokens = self.query_tokens.expand(image_embeds.shape[0], -1, -1)
         query_output = self.Qformer.bert(
             query_embeds=query_tokens,
@@ -123,7 +138,7 @@ class Blip2OPT(Blip2Base):
         )
 
         inputs_opt = self.opt_proj(query_output.last_hidden_state)
-        atts_opt = torch.ones(inputs_opt.size()[:-1], dtype=torch.long).to(image.device)
+        atts_opt = torch.ones(inputs_opt.size()[:-1], dtype=torch.long).to(device)
 
         self.opt_tokenizer.padding_side = "right"
 
@@ -135,7 +150,7 @@ class Blip2OPT(Blip2Base):
             padding="longest",
             truncation=True,
             max_length=self.max_txt_len,
-        ).to(image.device)
+        ).to(device)
 
         targets = opt_tokens.input_ids.masked_fill(
             opt_tokens.input_ids == self.opt_tokenizer.pad_token_id, -100
@@ -144,7 +159,7 @@ class Blip2OPT(Blip2Base):
             targets[:, : self.prompt_length] = -100  # do not apply loss to the prompt
 
         empty_targets = (
-            torch.ones(atts_opt.size(), dtype=torch.long).to(image.device).fill_(-100)
+            torch.ones(atts_opt.size(), dtype=torch.long).to(device).fill_(-100)
         )
         targets = torch.cat([empty_targets, targets], dim=1)
 
@@ -181,6 +196,8 @@ class Blip2OPT(Blip2Base):
         Args:
             samples (dict): A dictionary containing the following keys:
                 - image (torch.Tensor): A tensor of shape (batch_size, 3, H, W)
+                - inputs_opt, atts_opt (torch.Tensor): optional, a visual prefix returned by encode_image(), used instead of image.
+                - vit_embeds (torch.Tensor): optional, precomputed visual encoder outputs, used instead of image.
             use_nucleus_sampling (bool): Whether to use nucleus sampling. If False, use top-k sampling.
             num_beams (int): Number of beams for beam search. 1 means no beam search.
             max_length (int): The maximum length of the sequence to be generated.
@@ -191,32 +208,14 @@ class Blip2OPT(Blip2Base):
         Returns:
             captions (list): A list of strings of length batch_size * num_captions.
         """
-        image = samples["image"]
+        inputs_opt, atts_opt = self._get_visual_prefix(samples)
         with self.maybe_autocast():
-            image_embeds = self.ln_vision(self.visual_encoder(image))
-            image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(
-                image.device
-            )
-
-            query_tokens = self.query_tokens.expand(image_embeds.shape[0], -1, -1)
-            query_output = self.Qformer.bert(
-                query_embeds=query_tokens,
-                encoder_hidden_states=image_embeds,
-                encoder_attention_mask=image_atts,
-                return_dict=True,
-            )
-
-            inputs_opt = self.opt_proj(query_output.last_hidden_state)
-            atts_opt = torch.ones(inputs_opt.size()[:-1], dtype=torch.long).to(
-                image.device
-            )
-
             if "prompt" in samples.keys():
                 prompt = samples["prompt"]
             else:
                 prompt = self.prompt
 
-            prompt = [prompt] * image.size(0)
+            prompt = [prompt] * inputs_opt.size(0)
 
             opt_tokens = self.opt_tokenizer(
                 prompt,
@@ -224,7 +223,7 @@ class Blip2OPT(Blip2Base):
                 padding="longest",
                 truncation=True,
                 max_length=self.max_txt_len,
-            ).to(image.device)
+            ).to(inputs_opt.device)
             attention_mask = torch.cat([atts_opt, opt_tokens.attention_mask], dim=1)
             
             # new version for transformers>=4.27
@@ -281,24 +280,49 @@ class Blip2OPT(Blip2Base):
             return output_text
         
         
-    def predict_answers(
-        self,
-        samples,
-        num_beams=5,
-        inference_method="generate",
-        max_len=10,
-        min_len=1,
-        num_ans_candidates=128,
-        answer_list=None,
-        prompt="",
-        length_penalty=0,
-        **kwargs
-    ):
-        image = samples["image"]
+    @torch.no_grad()
+    def encode_image(self, samples):
+        """
+        Computes the visual prefix (ViT, Q-Former and OPT projection) fed to the language model.
+
+        The returned dictionary can be passed to generate() or predict_answers() in place of
+        the image, e.g. to caption an image with several prompts or decoding settings without
+        re-running the vision tower. In eval mode, prefixes are additionally kept in an LRU
+        cache keyed by image content when `prefix_cache_mb` > 0.
+
+        Args:
+            samples (dict): A dictionary containing the following keys:
+                - image (torch.Tensor): A tensor of shape (batch_size, 3, H, W)
+                - vit_embeds (torch.Tensor): optional, precomputed visual encoder outputs, used instead of image.
+        Returns:
+            prefix (dict): A dictionary containing the following keys:
+                - inputs_opt (torch.Tensor): A tensor of shape (batch_size, num_query_token, opt_hidden_size)
+                - atts_opt (torch.Tensor): A tensor of shape (batch_size, num_query_token)
+        """
+        if self.prefix_cache is None or self.training or "vit_embeds" in samples:
+            inputs_opt = self._compute_visual_prefix(samples)
+        else:
+            image = samples["image"]
+            keys = [self.prefix_cache.key(img) for img in image]
+            prefixes = [self.prefix_cache.get(key) for key in keys]
+            missing = [i for i, prefix in enumerate(prefixes) if prefix is None]
+            if missing:
+                computed = self._compute_visual_prefix({"image": image[missing]})
+                for i, prefix in zip(missing, computed):
+                    prefixes[i] = prefix
+                    self.prefix_cache.put(keys[i], prefix)
+            inputs_opt = torch.stack(prefixes, dim=0)
+
+        atts_opt = torch.ones(inputs_opt.size()[:-1], dtype=torch.long).to(
+            inputs_opt.device
+        )
+        return {"inputs_opt": inputs_opt, "atts_opt": atts_opt}
+
+    def _compute_visual_prefix(self, samples):
+        image_embeds = self.get_image_embeds(samples)
         with self.maybe_autocast():
-            image_embeds = self.ln_vision(self.visual_encoder(image))
             image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(
-                image.device
+                image_embeds.device
             )
 
             query_tokens = self.query_tokens.expand(image_embeds.shape[0], -1, -1)
@@ -310,10 +334,28 @@ class Blip2OPT(Blip2Base):
             )
 
             inputs_opt = self.opt_proj(query_output.last_hidden_state)
-            atts_opt = torch.ones(inputs_opt.size()[:-1], dtype=torch.long).to(
-                image.device
-            )
+        return inputs_opt
+
+    def _get_visual_prefix(self, samples):
+        if "inputs_opt" not in samples:
+            samples = self.encode_image(samples)
+        return samples["inputs_opt"], samples["atts_opt"]
 
+    def predict_answers(
+        self,
+        samples,
+        num_beams=5,
+        inference_method="generate",
+        max_len=10,
+        min_len=1,
+        num_ans_candidates=128,
+        answer_list=None,
+        prompt="",
+        length_penalty=0,
+        **kwargs
+    ):
+        inputs_opt, atts_opt = self._get_visual_prefix(samples)
+        with self.maybe_autocast():
             if isinstance(samples["text_input"], str):
                 samples["text_input"] = [samples["text_input"]]
             if prompt:
@@ -328,7 +370,7 @@ class Blip2OPT(Blip2Base):
                 padding="longest",
                 truncation=True,
                 max_length=self.max_txt_len,
-            ).to(image.device)
+            ).to(inputs_opt.device)
         
             attention_mask = torch.cat([atts_opt, opt_tokens.attention_mask], dim=1)
             
@@ -409,6 +451,8 @@ class Blip2OPT(Blip2Base):
         
         apply_lemmatizer = cfg.get("apply_lemmatizer", False)
 
+        prefix_cache_mb = cfg.get("prefix_cache_mb", 0)
+
         model = cls(
             vit_model=vit_model,
             img_size=img_size,
@@ -421,6 +465,7 @@ class Blip2OPT(Blip2Base):
             prompt=prompt,
             max_txt_len=max_txt_len,
             apply_lemmatizer=apply_lemmatizer,
+            prefix_cache_mb=prefix_cache_mb,
         )
         model.load_checkpoint_from_config(cfg)
 
@@ -34,6 +34,7 @@ from lavis.models.ulip_models.ULIP_models import ULIP_PointBERT
 from lavis.tasks.multimodal_classification import MultimodalClassificationTask
 
 from lavis.common.utils import is_url
+from lavis.common.checkpoint import load_state_dict
 from lavis.models.blip2_models.Qformer import BertConfig, BertLMHeadModel
 from lavis.common.dist_utils import download_cached_file
 from lavis.processors.blip_processors import BlipCaptionProcessor
@@ -2378,21 +2379,12 @@ class Blip2VicunaXInstruct(Blip2Base):
         if load_ln_path and load_ln_type:
             url_or_filename=load_ln_path
             logging.info(f"Loading pretrained layer norm weights from {url_or_filename} of type {load_ln_type}")
-            if is_url(url_or_filename):
-                cached_file = download_cached_file(
-                    url_or_filename, check_hash=False, progress=True
-                )
-                checkpoint = torch.load(cached_file, map_location="cpu")
-            elif os.path.isfile(url_or_filename):
-                checkpoint = torch.load(url_or_filename, map_location="cpu")
-            else:
-                raise RuntimeError("checkpoint url or path is invalid")
+            # memory-mapped, only the tensors used below are read
+            checkpoint = load_state_dict(url_or_filename)
             
             if load_ln_type:
                 load_ln_type = f"{load_ln_type}_ln" if "vision" not in load_ln_type else "ln_vision"
             loaded_state_dict = {}
-            if 'model' in checkpoint:
-                checkpoint = checkpoint['model'] 
             for k in checkpoint.keys():
                 if load_ln_type in k:
                     loaded_state_dict['.'.join(k.split('.')[1:])] = checkpoint[k]
@@ -2406,21 +2398,12 @@ class Blip2VicunaXInstruct(Blip2Base):
         if load_proj_path and load_proj_type:
             url_or_filename=load_proj_path
             logging.info(f"Loading shared Qformer encoder projection weights from {url_or_filename} of type {load_proj_type}")
-            if is_url(url_or_filename):
-                cached_file = download_cached_file(
-                    url_or_filename, check_hash=False, progress=True
-                )
-                checkpoint = torch.load(cached_file, map_location="cpu")
-            elif os.path.isfile(url_or_filename):
-                checkpoint = torch.load(url_or_filename, map_location="cpu")
-            else:
-                raise RuntimeError("checkpoint url or path is invalid")
+            # memory-mapped, only the tensors used below are read
+            checkpoint = load_state_dict(url_or_filename)
             
             if load_proj_type:
                 load_proj_type = f"{load_proj_type}_"
             loaded_state_dict = {}
-            if 'model' in checkpoint:
-                checkpoint = checkpoint['model'] 
             for k in checkpoint.keys():
                 if load_proj_type+'encoder_projection' in k:
                     loaded_state_dict['.'.join(k.split('.')[1:])] = checkpoint[k]
@@ -2434,20 +2417,11 @@ class Blip2VicunaXInstruct(Blip2Base):
         if load_projection_path:
             url_or_filename=load_projection_path
             logging.info(f"Loading pretrained projection weights from {url_or_filename} of type {load_projection_type} with key {projection_key if projection_key else load_projection_type+'_llm_proj.'}")
-            if is_url(url_or_filename):
-                cached_file = download_cached_file(
-                    url_or_filename, check_hash=False, progress=True
-                )
-                checkpoint = torch.load(cached_file, map_location="cpu")
-            elif os.path.isfile(url_or_filename):
-                checkpoint = torch.load(url_or_filename, map_location="cpu")
-            else:
-                raise RuntimeError("checkpoint url or path is invalid")
+            # memory-mapped, only the tensors used below are read
+            checkpoint = load_state_dict(url_or_filename)
             if load_projection_type:
                 load_projection_type = f"{load_projection_type}_"
             loaded_state_dict = {}
-            if 'model' in checkpoint:
-                checkpoint = checkpoint['model'] 
             for k in checkpoint.keys():
                 if projection_key:
                     if projection_key in k:
@@ -2477,21 +2451,12 @@ class Blip2VicunaXInstruct(Blip2Base):
         if pretrained_qformer:
             url_or_filename=pretrained_qformer
             logging.info(f"Loading pretrained qformer weights and query tokens from {url_or_filename} of type {load_qformer_type}")
-            if is_url(url_or_filename):
-                cached_file = download_cached_file(
-                    url_or_filename, check_hash=False, progress=True
-                )
-                checkpoint = torch.load(cached_file, map_location="cpu")
-            elif os.path.isfile(url_or_filename):
-                checkpoint = torch.load(url_or_filename, map_location="cpu")
-            else:
-                raise RuntimeError("checkpoint url or path is invalid")
+            # memory-mapped, only the tensors used below are read
+            checkpoint = load_state_dict(url_or_filename)
             
             if load_qformer_type:
                 load_qformer_type = f"{load_qformer_type}_"
             loaded_state_dict = {}
-            if 'model' in checkpoint:
-                checkpoint = checkpoint['model'] 
             for k in checkpoint.keys():
                 if load_qformer_type+'Qformer.' in k:
                     if not load_attention and 'attention' in k:
@@ -2503,21 +2468,8 @@ class Blip2VicunaXInstruct(Blip2Base):
         return Qformer, query_tokens
     
     def get_state_dict(self, url_or_filename, **kwargs):
-        if is_url(url_or_filename):
-            cached_file = download_cached_file(
-                url_or_filename, check_hash=False, progress=True
-            )
-            checkpoint = torch.load(cached_file, map_location="cpu")
-        elif os.path.isfile(url_or_filename):
-            checkpoint = torch.load(url_or_filename, map_location="cpu")
-        else:
-            raise RuntimeError("checkpoint url or path is invalid")
-
-        if "model" in checkpoint.keys():
-            state_dict = checkpoint["model"]
-        else:
-            state_dict = checkpoint
-        return state_dict
+        # memory-mapped, the tensors are read when they are loaded
+        return load_state_dict(url_or_filename)
     
     def load_from_pretrained(self, url_or_filename, **kwargs):
         state_dict = self.get_state_dict(url_or_filename)
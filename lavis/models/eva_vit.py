@@ -16,6 +16,7 @@ from timm.models.layers import drop_path, to_2tuple, trunc_normal_
 from timm.models.registry import register_model
 
 from lavis.common.dist_utils import download_cached_file
+from lavis.models.attention_backends import DEFAULT_CHUNK_SIZE, attention
 
 def _cfg(url='', **kwargs):
     return {
@@ -61,7 +62,33 @@ class Mlp(nn.Module):
         return x
 
 
-class Attention(nn.Module):
+class CachedRelativePositionBias:
+    """
+    Caches the relative position bias gathered from relative_position_bias_table, as long
+    as the table is not modified in place, moved or trained with autograd.
+    """
+
+    _rel_pos_bias_cache = None
+
+    def get_relative_position_bias(self):
+        table = self.relative_position_bias_table
+        if torch.is_grad_enabled() and table.requires_grad:
+            return self._gather_relative_position_bias()
+
+        key = (table.data_ptr(), table._version, table.dtype, table.device)
+        if self._rel_pos_bias_cache is None or self._rel_pos_bias_cache[0] != key:
+            self._rel_pos_bias_cache = (key, self._gather_relative_position_bias())
+        return self._rel_pos_bias_cache[1]
+
+    def _gather_relative_position_bias(self):
+        relative_position_bias = \
+            self.relative_position_bias_table[self.relative_position_index.view(-1)].view(
+                self.window_size[0] * self.window_size[1] + 1,
+                self.window_size[0] * self.window_size[1] + 1, -1)  # Wh*Ww,Wh*Ww,nH
+        return relative_position_bias.permute(2, 0, 1).contiguous()  # nH, Wh*Ww, Wh*Ww
+
+
+class Attention(CachedRelativePositionBias, nn.Module):
     def __init__(
             self, dim, num_heads=8, qkv_bias=False, qk_scale=None, attn_drop=0.,
             proj_drop=0., window_size=None, attn_head_dim=None):
@@ -115,6 +142,10 @@ class Attention(nn.Module):
         self.proj = nn.Linear(all_head_dim, dim)
         self.proj_drop = nn.Dropout(proj_drop)
 
+        # see lavis.models.attention_backends.set_attn_backend
+        self.attn_backend = "math"
+        self.attn_chunk_size = DEFAULT_CHUNK_SIZE
+
     def forward(self, x, rel_pos_bias=None):
         B, N, C = x.shape
         qkv_bias = None
@@ -125,15 +156,24 @@ class Attention(nn.Module):
         qkv = qkv.reshape(B, N, 3, self.num_heads, -1).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]   # make torchscript happy (cannot use tensor as tuple)
 
+        if self.attn_backend != "math":
+            attn_bias = rel_pos_bias
+            if self.relative_position_bias_table is not None:
+                relative_position_bias = self.get_relative_position_bias().unsqueeze(0)
+                attn_bias = relative_position_bias if attn_bias is None else attn_bias + relative_position_bias
+            x = attention(
+                q, k, v, attn_bias=attn_bias, dropout_p=self.attn_drop.p if self.training else 0.,
+                scale=self.scale, backend=self.attn_backend, chunk_size=self.attn_chunk_size)
+            x = x.transpose(1, 2).reshape(B, N, -1)
+            x = self.proj(x)
+            x = self.proj_drop(x)
+            return x
+
         q = q * self.scale
         attn = (q @ k.transpose(-2, -1))
 
         if self.relative_position_bias_table is not None:
-            relative_position_bias = \
-                self.relative_position_bias_table[self.relative_position_index.view(-1)].view(
-                    self.window_size[0] * self.window_size[1] + 1,
-                    self.window_size[0] * self.window_size[1] + 1, -1)  # Wh*Ww,Wh*Ww,nH
-            relative_position_bias = relative_position_bias.permute(2, 0, 1).contiguous()  # nH, Wh*Ww, Wh*Ww
+            relative_position_bias = self.get_relative_position_bias()
             attn = attn + relative_position_bias.unsqueeze(0)
 
         if rel_pos_bias is not None:
@@ -204,7 +244,7 @@ class PatchEmbed(nn.Module):
         return x
 
 
-class RelativePositionBias(nn.Module):
+class RelativePositionBias(CachedRelativePositionBias, nn.Module):
 
     def __init__(self, window_size, num_heads):
         super().__init__()
@@ -236,11 +276,7 @@ class RelativePositionBias(nn.Module):
         # trunc_normal_(self.relative_position_bias_table, std=.02)
 
     def forward(self):
-        relative_position_bias = \
-            self.relative_position_bias_table[self.relative_position_index.view(-1)].view(
-                self.window_size[0] * self.window_size[1] + 1,
-                self.window_size[0] * self.window_size[1] + 1, -1)  # Wh*Ww,Wh*Ww,nH
-        return relative_position_bias.permute(2, 0, 1).contiguous()  # nH, Wh*Ww, Wh*Ww
+        return self.get_relative_position_bias()
 
 
 class VisionTransformer(nn.Module):
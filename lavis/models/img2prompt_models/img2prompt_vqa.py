@@ -21,6 +21,7 @@ from lavis.common.dist_utils import download_cached_file
 from lavis.common.registry import registry
 from lavis.models.base_model import BaseModel
 from lavis.models.blip_models.blip_image_text_matching import compute_gradcam
+from lavis.models.pnp_vqa_models import sample_captions
 
 open_pos = ["NOUN", "VERB", "ADJ", "ADV", "NUM"]
 
@@ -145,6 +146,7 @@ class Img2PromptVQA(BaseModel):
         repetition_penalty=1.0,
         num_captions=100,
         num_patches=20,
+        max_rounds=10,
     ):
         """
         Args:
@@ -159,6 +161,8 @@ class Img2PromptVQA(BaseModel):
             repetition_penalty (float): The parameter for repetition penalty. 1.0 means no penalty.
             num_captions (int): Number of captions generated for each image.
             num_patches (int): Number of patches sampled for each image.
+            max_rounds (int): Maximum number of sampling rounds. Images still short of captions
+                              that pass the filter after max_rounds keep fewer than num_captions.
 
         Returns:
             samples (dict): A dictionary containing the following keys:
@@ -168,82 +172,27 @@ class Img2PromptVQA(BaseModel):
                 - captions (nested list): A nested list of strings of total length batch_size * num_captions
         """
         encoder_out = self.image_captioning_model.forward_encoder(samples)
-        captions = [[] for _ in range(encoder_out.size(0))]
-
-        min_num_captions = 0
-
-        while min_num_captions < num_captions:
-            encoder_out_samples = []
-            for i in range(num_captions):
-                patch_id = (
-                    torch.multinomial(
-                        samples["gradcams"].to(self.image_captioning_model.device),
-                        num_patches,
-                    ).reshape(encoder_out.size(0), -1)
-                    + 1
-                )
-                patch_id = (
-                    patch_id.sort(dim=1)
-                    .values.unsqueeze(-1)
-                    .expand(-1, -1, encoder_out.size(2))
-                )
-                encoder_out_sample = torch.gather(encoder_out, 1, patch_id)
-                encoder_out_samples.append(encoder_out_sample)
-
-            stacked = torch.stack(encoder_out_samples, dim=1)
-            image_embeds = torch.flatten(
-                stacked, start_dim=0, end_dim=1
-            )  # (bsz*num_seq, num_patch, dim)
-
-            image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(
-                self.image_captioning_model.device
-            )
-            model_kwargs = {
-                "encoder_hidden_states": image_embeds,
-                "encoder_attention_mask": image_atts,
-            }
-
-            prompt = [self.image_captioning_model.prompt] * image_embeds.size(0)
-            prompt = self.image_captioning_model.tokenizer(
-                prompt, return_tensors="pt"
-            ).to(self.image_captioning_model.device)
-            prompt.input_ids[:, 0] = self.image_captioning_model.tokenizer.bos_token_id
-            prompt.input_ids = prompt.input_ids[:, :-1]
-
-            decoder_out = self.image_captioning_model.text_decoder.generate(
-                input_ids=prompt.input_ids,
-                max_length=cap_max_length,
-                min_length=cap_min_length,
-                do_sample=True,
-                top_p=top_p,
-                top_k=top_k,
-                num_return_sequences=1,
-                eos_token_id=self.image_captioning_model.tokenizer.sep_token_id,
-                pad_token_id=self.image_captioning_model.tokenizer.pad_token_id,
-                repetition_penalty=repetition_penalty,
-                **model_kwargs
-            )
 
+        def caption_filter(image_embeds, image_atts, decoder_out):
             itm_outputs = self.image_question_matching_model.itm_rank(
                 image_embeds, image_atts, encoder_input_ids=decoder_out
-            )  # caption filter
-
-            outputs = self.image_captioning_model.tokenizer.batch_decode(
-                decoder_out, skip_special_tokens=True
             )
+            return itm_outputs >= 0.5
 
-            for counter, output in enumerate(outputs):
-                ind = counter // num_captions
-                if len(captions[ind]) < num_captions:
-                    caption = output[len(self.image_captioning_model.prompt) :]
-                    overlap_caption = [1 for caps in captions[ind] if caption in caps]
-                    # print(itm_outputs)
-                    if (
-                        len(overlap_caption) == 0 and itm_outputs[counter] >= 0.5
-                    ):  # image filter
-                        captions[ind].append(caption)
-
-            min_num_captions = min([len(i) for i in captions])
+        captions = sample_captions(
+            self.image_captioning_model,
+            encoder_out,
+            samples["gradcams"],
+            num_captions=num_captions,
+            num_patches=num_patches,
+            max_rounds=max_rounds,
+            caption_filter=caption_filter,
+            max_length=cap_max_length,
+            min_length=cap_min_length,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+        )
 
         samples["captions"] = captions
 
@@ -478,6 +427,7 @@ class Img2PromptVQA(BaseModel):
         repetition_penalty=1,
         num_patches=20,
         block_num=7,
+        max_rounds=10,
     ):
         """
         Args:
@@ -499,6 +449,7 @@ class Img2PromptVQA(BaseModel):
             repetition_penalty (float): The parameter for repetition penalty. 1.0 means no penalty.
             num_patches (int): Number of patches sampled for each image.
             block_num (int): The index of cross-attention block for gradcam computation.
+            max_rounds (int): Maximum number of caption sampling rounds.
 
         Returns:
             List: A list of strings, each string is an answer.
@@ -527,6 +478,7 @@ class Img2PromptVQA(BaseModel):
             repetition_penalty=repetition_penalty,
             num_captions=num_captions,
             num_patches=num_patches,
+            max_rounds=max_rounds,
         )
 
         if self.offload_model:
@@ -5,25 +5,142 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import logging
+
 import torch
 
 
 def prepare_qa_input(sample, num_captions, num_captions_fid):
+    """
+    Concatenates each question with groups of num_captions_fid of its first num_captions
+    captions into sample['question_captions'], the contexts of Fusion-in-Decoder. Images may
+    have fewer captions when caption sampling ran out of rounds, their last group is shorter.
+    Questions without captions get the question alone as context.
+    """
     sample_question_captions = []
 
     for question, captions in zip(sample['text_input'], sample['captions']):
         assert isinstance(captions, list)
+        question = question.lower().strip()
+        captions = captions[:num_captions]
         question_captions = []
-        question_caption = ''
-        for cap_id, cap_ in enumerate(captions[0:num_captions]):
-            question_caption += (cap_.strip() + '. ')
-            if (cap_id + 1) != num_captions and ((cap_id + 1) % num_captions_fid == 0):
-                question_caption = question.lower().strip() + " \\n " + question_caption.lower().strip()
-                question_captions.append(question_caption)
-                question_caption = ''
-            if (cap_id + 1) == num_captions:
-                question_caption = question.lower().strip() + " \\n " + question_caption.lower().strip()
-                question_captions.append(question_caption)
+        for start in range(0, len(captions), num_captions_fid):
+            question_caption = ''.join(cap_.strip() + '. ' for cap_ in captions[start:start + num_captions_fid])
+            question_captions.append(question + " \\n " + question_caption.lower().strip())
+        if not question_captions:
+            question_captions.append(question)
         sample_question_captions.append(question_captions)
 
     sample['question_captions'] = sample_question_captions
+
+
+def fid_batches(question_captions, context_lengths, batch_size):
+    """
+    Groups the question indices of question_captions into batches of at most batch_size
+    for Fusion-in-Decoder generation. Questions are sorted by number of contexts and by
+    length of their longest context, so that a batch only mixes questions with the same
+    number of contexts and little padding.
+    """
+    order = sorted(
+        range(len(question_captions)),
+        key=lambda i: (len(question_captions[i]), context_lengths[i]),
+    )
+
+    batches = []
+    for i in order:
+        if (
+            batches
+            and len(batches[-1]) < batch_size
+            and len(question_captions[batches[-1][0]]) == len(question_captions[i])
+        ):
+            batches[-1].append(i)
+        else:
+            batches.append([i])
+    return batches
+
+
+def sample_patch_ids(gradcams, num_patches):
+    """
+    Draws num_patches distinct patches per row of gradcams (N, H*W), weighted by the gradcam,
+    in a single multinomial call. Returns sorted patch indices (N, num_patches), shifted by one
+    to skip the [CLS] token of the encoder output.
+    """
+    patch_id = torch.multinomial(gradcams, num_patches) + 1
+    return patch_id.sort(dim=1).values
+
+
+def sample_captions(
+    captioning_model,
+    encoder_out,
+    gradcams,
+    num_captions,
+    num_patches,
+    max_rounds=10,
+    caption_filter=None,
+    **generate_kwargs
+):
+    """
+    Generates up to num_captions unique captions per image, each from a random subset of
+    num_patches image patches weighted by the gradcams (B, H*W).
+
+    Every round only decodes as many captions as each image is still missing, so images that
+    are done do not cost anything. Captions are deduplicated per image by exact match. After
+    max_rounds rounds, images that keep producing duplicates are returned with fewer captions.
+
+    caption_filter(image_embeds, image_atts, decoder_out) may return a boolean tensor telling
+    which of the generated captions to keep.
+    """
+    device = encoder_out.device
+    tokenizer = captioning_model.tokenizer
+    prompt_length = len(captioning_model.prompt)
+    gradcams = gradcams.to(device)
+
+    captions = [[] for _ in range(encoder_out.size(0))]
+    seen = [set() for _ in range(encoder_out.size(0))]
+
+    for _ in range(max_rounds):
+        missing = torch.tensor([num_captions - len(caps) for caps in captions], device=device)
+        if missing.max() <= 0:
+            break
+        image_idx = torch.arange(len(captions), device=device).repeat_interleave(missing.clamp(min=0))
+
+        patch_id = sample_patch_ids(gradcams[image_idx], num_patches)
+        patch_id = patch_id.unsqueeze(-1).expand(-1, -1, encoder_out.size(2))
+        image_embeds = torch.gather(encoder_out[image_idx], 1, patch_id)  # (num_missing, num_patch, dim)
+        image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long, device=device)
+
+        prompt = tokenizer([captioning_model.prompt] * image_embeds.size(0), return_tensors="pt").to(device)
+        prompt.input_ids[:, 0] = tokenizer.bos_token_id
+        prompt.input_ids = prompt.input_ids[:, :-1]
+
+        decoder_out = captioning_model.text_decoder.generate(
+            input_ids=prompt.input_ids,
+            do_sample=True,
+            num_return_sequences=1,
+            eos_token_id=tokenizer.sep_token_id,
+            pad_token_id=tokenizer.pad_token_id,
+            encoder_hidden_states=image_embeds,
+            encoder_attention_mask=image_atts,
+            **generate_kwargs
+        )
+
+        keep = [True] * decoder_out.size(0)
+        if caption_filter is not None:
+            keep = caption_filter(image_embeds, image_atts, decoder_out).tolist()
+
+        outputs = tokenizer.batch_decode(decoder_out, skip_special_tokens=True)
+        for ind, output, kept in zip(image_idx.tolist(), outputs, keep):
+            caption = output[prompt_length:]
+            if kept and caption not in seen[ind] and len(captions[ind]) < num_captions:
+                seen[ind].add(caption)
+                captions[ind].append(caption)
+    else:
+        num_short = sum(len(caps) < num_captions for caps in captions)
+        if num_short:
+            logging.warning(
+                "{} images have fewer than {} unique captions after {} rounds.".format(
+                    num_short, num_captions, max_rounds
+                )
+            )
+
+    return captions
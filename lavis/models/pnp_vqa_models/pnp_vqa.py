@@ -12,7 +12,7 @@ from lavis.common.registry import registry
 from lavis.models.base_model import BaseModel
 from torch.nn import CrossEntropyLoss, MSELoss
 from transformers import T5ForConditionalGeneration
-from lavis.models.pnp_vqa_models import prepare_qa_input
+from lavis.models.pnp_vqa_models import fid_batches, prepare_qa_input, sample_captions
 from lavis.models.blip_models.blip_image_text_matching import compute_gradcam
 from transformers.modeling_outputs import CausalLMOutputWithCrossAttentions
 
@@ -91,6 +91,7 @@ class PNPVQA(BaseModel):
             repetition_penalty=1.0,
             num_captions=100,
             num_patches=20,
+            max_rounds=10,
     ):
         """
         Args:
@@ -105,6 +106,8 @@ class PNPVQA(BaseModel):
             repetition_penalty (float): The parameter for repetition penalty. 1.0 means no penalty.
             num_captions (int): Number of captions generated for each image.
             num_patches (int): Number of patches sampled for each image.
+            max_rounds (int): Maximum number of sampling rounds. Images still short of unique captions
+                              after max_rounds keep fewer than num_captions captions.
 
         Returns:
             samples (dict): A dictionary containing the following keys:
@@ -114,58 +117,19 @@ class PNPVQA(BaseModel):
                 - captions (nested list): A nested list of strings of total length batch_size * num_captions
         """
         encoder_out = self.image_captioning_model.forward_encoder(samples)
-        captions = [[] for _ in range(encoder_out.size(0))]
-
-        min_num_captions = 0
-
-        while min_num_captions < num_captions:
-            encoder_out_samples = []
-            for i in range(num_captions):
-                patch_id = torch.multinomial(samples['gradcams'].to(self.image_captioning_model.device),
-                                             num_patches).reshape(encoder_out.size(0), -1) + 1
-                patch_id = patch_id.sort(dim=1).values.unsqueeze(-1).expand(-1, -1, encoder_out.size(2))
-                encoder_out_sample = torch.gather(encoder_out, 1, patch_id)
-                encoder_out_samples.append(encoder_out_sample)
-
-            stacked = torch.stack(encoder_out_samples, dim=1)
-            image_embeds = torch.flatten(stacked, start_dim=0, end_dim=1) #(bsz*num_seq, num_patch, dim)
-
-            image_atts = torch.ones(image_embeds.size()[:-1], dtype=torch.long).to(self.image_captioning_model.device)
-            model_kwargs = {
-                "encoder_hidden_states": image_embeds,
-                "encoder_attention_mask": image_atts,
-            }
-
-            prompt = [self.image_captioning_model.prompt] * image_embeds.size(0)
-            prompt = self.image_captioning_model.tokenizer(prompt,
-                                                           return_tensors="pt").to(self.image_captioning_model.device)
-            prompt.input_ids[:, 0] = self.image_captioning_model.tokenizer.bos_token_id
-            prompt.input_ids = prompt.input_ids[:, :-1]
-
-            decoder_out = self.image_captioning_model.text_decoder.generate(
-                input_ids=prompt.input_ids,
-                max_length=cap_max_length,
-                min_length=cap_min_length,
-                do_sample=True,
-                top_p=top_p,
-                top_k=top_k,
-                num_return_sequences=1,
-                eos_token_id=self.image_captioning_model.tokenizer.sep_token_id,
-                pad_token_id=self.image_captioning_model.tokenizer.pad_token_id,
-                repetition_penalty=repetition_penalty,
-                **model_kwargs)
-
-            outputs = self.image_captioning_model.tokenizer.batch_decode(decoder_out, skip_special_tokens=True)
-
-            for counter, output in enumerate(outputs):
-                ind = counter//num_captions
-                if len(captions[ind]) < num_captions:
-                    caption = output[len(self.image_captioning_model.prompt):]
-                    overlap_caption = [1 for caps in captions[ind] if caption in caps]
-                    if len(overlap_caption) == 0:
-                        captions[ind].append(caption)
-
-            min_num_captions = min([len(i) for i in captions])
+        captions = sample_captions(
+            self.image_captioning_model,
+            encoder_out,
+            samples['gradcams'],
+            num_captions=num_captions,
+            num_patches=num_patches,
+            max_rounds=max_rounds,
+            max_length=cap_max_length,
+            min_length=cap_min_length,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+        )
 
         samples['captions'] = captions
 
@@ -192,7 +156,7 @@ class PNPVQA(BaseModel):
             num_beams (int): Number of beams for beam search. 1 means no beam search.
             max_len (int): Maximum length of generated answers.
             min_len (int): Minimum length of generated answers.
-            internal_bsz_fid (int): Internal batch size when using FiD decoding.
+            internal_bsz_fid (int): Number of questions decoded together when using FiD decoding.
             num_captions (int): Number of captions generated for each image.
             num_captions_fid (int): Number of captions concatenated with a question during FiD decoding.
 
@@ -201,31 +165,36 @@ class PNPVQA(BaseModel):
         """
         prepare_qa_input(samples, num_captions=num_captions, num_captions_fid=num_captions_fid)
 
-        pred_answers = []
+        tokenizer = self.question_answering_model.tokenizer
         question_captions = samples['question_captions']
-        question_captions_chunk = [question_captions[i:i + internal_bsz_fid]
-                                   for i in range(0, len(question_captions), internal_bsz_fid)]
-        question_captions_chunk = list(chain(*question_captions_chunk))
-
-        for question_caption in question_captions_chunk:
-            question_caption_input = self.question_answering_model.tokenizer(question_caption, padding='longest',
-                                        truncation=True, return_tensors="pt").to(self.question_answering_model.device)
-
-            question_caption_input.input_ids = question_caption_input.input_ids.reshape(
-                                               internal_bsz_fid, -1, question_caption_input.input_ids.size(1))
-            question_caption_input.attention_mask = question_caption_input.attention_mask.reshape(
-                                               internal_bsz_fid, -1, question_caption_input.attention_mask.size(1))
-
-            outputs = self.question_answering_model.generate(input_ids=question_caption_input.input_ids,
-                                            attention_mask=question_caption_input.attention_mask,
-                                            num_beams=num_beams,
-                                            min_length=min_len,
-                                            max_length=max_len,
-                                            )
-
-            for output in outputs:
-                pred_answer = self.question_answering_model.tokenizer.decode(output, skip_special_tokens=True)
-                pred_answers.append(pred_answer)
+
+        # tokenize every context once, then pad per batch of similar length
+        input_ids = tokenizer(list(chain(*question_captions)), truncation=True).input_ids
+        context_ids = []
+        for question_caption in question_captions:
+            context_ids.append(input_ids[:len(question_caption)])
+            input_ids = input_ids[len(question_caption):]
+        context_lengths = [max((len(ids) for ids in contexts), default=0) for contexts in context_ids]
+
+        pred_answers = [None] * len(question_captions)
+        for batch in fid_batches(question_captions, context_lengths, internal_bsz_fid):
+            num_contexts = len(question_captions[batch[0]])
+            question_caption_input = tokenizer.pad(
+                {'input_ids': list(chain(*[context_ids[i] for i in batch]))},
+                padding='longest',
+                return_tensors="pt",
+            ).to(self.question_answering_model.device)
+
+            outputs = self.question_answering_model.generate(
+                input_ids=question_caption_input.input_ids.reshape(len(batch), num_contexts, -1),
+                attention_mask=question_caption_input.attention_mask.reshape(len(batch), num_contexts, -1),
+                num_beams=num_beams,
+                min_length=min_len,
+                max_length=max_len,
+            )
+
+            for i, output in zip(batch, outputs):
+                pred_answers[i] = tokenizer.decode(output, skip_special_tokens=True)
 
         return pred_answers
 
@@ -246,6 +215,7 @@ class PNPVQA(BaseModel):
         repetition_penalty=1,
         num_patches=50,
         block_num=7,
+        max_rounds=10,
     ):
         """
         Args:
@@ -257,7 +227,7 @@ class PNPVQA(BaseModel):
             inference_method (str): Inference method. Must be "generate". The model will generate answers.
             max_len (int): Maximum length of generated answers.
             min_len (int): Minimum length of generated answers.
-            internal_bsz_fid (int): Internal batch size when using FiD decoding.
+            internal_bsz_fid (int): Number of questions decoded together when using FiD decoding.
             num_captions (int): Number of captions generated for each image.
             num_captions_fid (int): Number of captions concatenated with a question during FiD decoding.
             cap_max_length (int): The maximum length of the caption to be generated.
@@ -295,7 +265,8 @@ class PNPVQA(BaseModel):
                                    top_p=top_p,
                                    repetition_penalty=repetition_penalty,
                                    num_captions=num_captions,
-                                   num_patches=num_patches)
+                                   num_patches=num_patches,
+                                   max_rounds=max_rounds)
 
         if self.offload_model:
             samples['image'] = samples['image'].to('cpu')
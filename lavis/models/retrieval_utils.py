@@ -0,0 +1,87 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import lavis.common.dist_utils as dist_utils
+import torch
+
+# number of fp32 elements materialised at once when computing similarities
+DEFAULT_SIM_CHUNK_NUMEL = 2**27
+
+
+def max_sim_matrix(image_embeds, text_embeds, chunk_numel=DEFAULT_SIM_CHUNK_NUMEL):
+    """
+    Computes the image-to-text similarity matrix.
+
+    image_embeds is either (num_images, dim) or (num_images, num_query, dim), in which
+    case the similarity of an image is the max over its query embeddings. Images are
+    processed in chunks of at most chunk_numel intermediate elements.
+    """
+    if image_embeds.dim() == 2:
+        return image_embeds @ text_embeds.t()
+
+    num_images, num_query, _ = image_embeds.shape
+    chunk_size = max(1, chunk_numel // (num_query * text_embeds.size(0)))
+
+    sims_matrix = []
+    for i in range(0, num_images, chunk_size):
+        sim_q2t = image_embeds[i : i + chunk_size] @ text_embeds.t()
+        sims_matrix.append(sim_q2t.max(1)[0])
+    return torch.cat(sims_matrix, dim=0)
+
+
+def rank_rows(num_rows):
+    """Returns the [start, end) rows of the score matrix handled by this rank."""
+    num_tasks = dist_utils.get_world_size()
+    rank = dist_utils.get_rank()
+    step = num_rows // num_tasks + 1
+    start = rank * step
+    end = min(num_rows, start + step)
+    return start, end
+
+
+def rerank_topk(
+    sims_matrix,
+    score_fn,
+    k_test,
+    itm_batch_size=None,
+    metric_logger=None,
+    header=None,
+):
+    """
+    Re-ranks the top-k candidates of every query (row of sims_matrix) with an ITM score.
+
+    Queries are split across ranks, and the candidates of several queries are packed
+    into one call of score_fn(query_idx, topk_idx), with up to itm_batch_size pairs per
+    call. query_idx (B,) are row indices of sims_matrix, topk_idx (B, k_test) the
+    column indices of their candidates; score_fn returns B * k_test scores, query-major.
+    By default itm_batch_size is k_test, i.e. one query per call; larger batches are
+    faster but their ITM activations take proportionally more memory.
+
+    Returns the score matrix, with -100 outside of the re-ranked candidates and of the
+    rows of this rank, so that the matrices of all ranks can be summed.
+    """
+    score_matrix = torch.full(sims_matrix.size(), -100.0).to(sims_matrix.device)
+
+    start, end = rank_rows(sims_matrix.size(0))
+    query_batch_size = max(1, (itm_batch_size or k_test) // k_test)
+
+    batch_starts = range(start, end, query_batch_size)
+    if metric_logger is not None:
+        batch_starts = metric_logger.log_every(
+            batch_starts, max(1, 50 // query_batch_size), header
+        )
+
+    for batch_start in batch_starts:
+        batch_end = min(end, batch_start + query_batch_size)
+
+        topk_sim, topk_idx = sims_matrix[batch_start:batch_end].topk(k=k_test, dim=1)
+        query_idx = torch.arange(batch_start, batch_end, device=sims_matrix.device)
+
+        score = score_fn(query_idx, topk_idx).float().view_as(topk_sim)
+        score_matrix[query_idx.unsqueeze(1), topk_idx] = score + topk_sim
+
+    return score_matrix
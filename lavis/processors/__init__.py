@@ -5,32 +5,30 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+from lavis.common.registry import registry
+from lavis.common.registry_manifest import lazy_attributes
 from lavis.processors.base_processor import BaseProcessor
 
-from lavis.processors.alpro_processors import (
-    AlproVideoTrainProcessor,
-    AlproVideoEvalProcessor,
-)
-from lavis.processors.blip_processors import (
-    BlipImageTrainProcessor,
-    Blip2ImageTrainProcessor,
-    BlipImageEvalProcessor,
-    BlipCaptionProcessor,
-)
-from lavis.processors.blip_diffusion_processors import (
-    BlipDiffusionInputImageProcessor,
-    BlipDiffusionTargetImageProcessor,
-)
-from lavis.processors.gpt_processors import (
-    GPTVideoFeatureProcessor,
-    GPTDialogueProcessor,
-)
-from lavis.processors.clip_processors import ClipImageTrainProcessor
-from lavis.processors.audio_processors import BeatsAudioProcessor
-from lavis.processors.ulip_processors import ULIPPCProcessor
-from lavis.processors.instruction_text_processors import BlipInstructionProcessor
-
-from lavis.common.registry import registry
+# classes imported on first access, like the registry imports them on first lookup
+_LAZY_ATTRIBUTES = {
+    "AlproVideoTrainProcessor": "lavis.processors.alpro_processors",
+    "AlproVideoEvalProcessor": "lavis.processors.alpro_processors",
+    "BlipImageTrainProcessor": "lavis.processors.blip_processors",
+    "Blip2ImageTrainProcessor": "lavis.processors.blip_processors",
+    "BlipImageEvalProcessor": "lavis.processors.blip_processors",
+    "BlipCaptionProcessor": "lavis.processors.blip_processors",
+    "BlipDiffusionInputImageProcessor": "lavis.processors.blip_diffusion_processors",
+    "BlipDiffusionTargetImageProcessor": "lavis.processors.blip_diffusion_processors",
+    "GPTVideoFeatureProcessor": "lavis.processors.gpt_processors",
+    "GPTDialogueProcessor": "lavis.processors.gpt_processors",
+    "ClipImageTrainProcessor": "lavis.processors.clip_processors",
+    "CryoETImageTrainProcessor": "lavis.processors.cryoet_processors",
+    "CryoETImageEvalProcessor": "lavis.processors.cryoet_processors",
+    "BeatsAudioProcessor": "lavis.processors.audio_processors",
+    "ULIPPCProcessor": "lavis.processors.ulip_processors",
+    "BlipInstructionProcessor": "lavis.processors.instruction_text_processors",
+}
+__getattr__ = lazy_attributes(_LAZY_ATTRIBUTES)
 
 __all__ = [
     "BaseProcessor",
@@ -48,6 +46,9 @@ __all__ = [
     "BlipDiffusionTargetImageProcessor",
     # CLIP
     "ClipImageTrainProcessor",
+    # CryoET
+    "CryoETImageTrainProcessor",
+    "CryoETImageEvalProcessor",
     # GPT
     "GPTVideoFeatureProcessor",
     "GPTDialogueProcessor",
@@ -7,7 +7,7 @@
 
 import torch
 from lavis.common.registry import registry
-from lavis.datasets.data_utils import load_video, load_clip
+from lavis.datasets.video_reader import VideoClipReader
 from lavis.processors import transforms_video
 from lavis.processors.base_processor import BaseProcessor
 from lavis.processors.randaugment import VideoRandomAugment
@@ -95,9 +95,14 @@ class AlproVideoTrainProcessor(AlproVideoBaseProcessor):
         self.image_size = image_size
         self.full_video=full_video
 
+        # full videos are decoded with decord, clips with OpenCV
+        self.reader = VideoClipReader(
+            height=image_size, width=image_size, backend="decord" if full_video else "opencv"
+        )
+
         self.transform = transforms.Compose(
             [
-                # Video size is (C, T, H, W)
+                # Video size is (C, T, H, W), uint8 until resized
                 transforms_video.RandomResizedCropVideo(
                     image_size,
                     scale=(min_scale, max_scale),
@@ -135,32 +140,11 @@ class AlproVideoTrainProcessor(AlproVideoBaseProcessor):
             torch.tensor: video clip after transforms. Size is (C, T, size, size).
         """
         if self.full_video:
-            clip = load_video( ## initial LAVIS code has errors when loading video.
-                video_path=vpath,
-                n_frms=self.n_frms,
-                height=self.image_size,
-                width=self.image_size,
-                sampling="headtail",
-            )
-            # clip = load_clip(
-            #     video_path=vpath, 
-            #     num_frames=self.n_frms, 
-            #     target_height=self.image_size, 
-            #     target_width=self.image_size,
-            #     start_time=start_sec,
-            #     end_time=end_sec, 
-            #     sampling="headtail"
-            #     )
+            clip = self.reader.read(vpath, self.n_frms, sampling="headtail")
         else:
-            clip = load_clip(
-                video_path=vpath, 
-                num_frames=self.n_frms, 
-                target_height=self.image_size, 
-                target_width=self.image_size,
-                start_time=start_sec,
-                end_time=end_sec, 
-                sampling="headtail"
-                )
+            clip = self.reader.read(
+                vpath, self.n_frms, sampling="linspace", start_time=start_sec, end_time=end_sec
+            )
         transformed = self.transform(clip)
 
         ## repeat last frame for padding
@@ -207,6 +191,8 @@ class AlproVideoEvalProcessor(AlproVideoBaseProcessor):
         self.image_size = image_size
         self.full_video=full_video
 
+        self.reader = VideoClipReader(height=image_size, width=image_size, backend="opencv")
+
         # Input video size is (C, T, H, W)
         self.transform = transforms.Compose(
             [
@@ -225,26 +211,9 @@ class AlproVideoEvalProcessor(AlproVideoBaseProcessor):
         Returns:
             torch.tensor: video clip after transforms. Size is (C, T, size, size).
         """
-        if self.full_video:
-            clip = load_clip(
-                video_path=vpath, 
-                num_frames=self.n_frms, 
-                target_height=self.image_size, 
-                target_width=self.image_size,
-                start_time=start_sec,
-                end_time=end_sec, 
-                sampling="headtail"
-                )
-        else:
-            clip = load_clip(
-                video_path=vpath, 
-                num_frames=self.n_frms, 
-                target_height=self.image_size, 
-                target_width=self.image_size,
-                start_time=start_sec,
-                end_time=end_sec, 
-                sampling="headtail"
-                )
+        clip = self.reader.read(
+            vpath, self.n_frms, sampling="linspace", start_time=start_sec, end_time=end_sec
+        )
         transformed = self.transform(clip)
 
         ## repeat last frame for padding
@@ -5,6 +5,9 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import logging
+import os
+
 import torch
 import torchaudio
 import torchaudio.transforms as transforms
@@ -13,17 +16,32 @@ from omegaconf import OmegaConf
 import torchaudio.compliance.kaldi as ta_kaldi
 
 from lavis.common.registry import registry
+from lavis.common.utils import get_cache_path
+from lavis.datasets.datasets.fbank_store import FbankStore
 from lavis.processors.base_processor import BaseProcessor
 from lavis.models.beats.Tokenizers import TokenizersConfig, Tokenizers
 
 MAX_INT = registry.get("MAX_INT")
 
 
+# torchaudio.transforms.Resample builds its kernel on creation, so share one per pair of rates
+_resamplers = {}
+
+
+def get_resampler(orig_freq, new_freq):
+    if (orig_freq, new_freq) not in _resamplers:
+        _resamplers[(orig_freq, new_freq)] = torchaudio.transforms.Resample(orig_freq, new_freq)
+    return _resamplers[(orig_freq, new_freq)]
+
+
 @registry.register_processor("beats_audio")
 class BeatsAudioProcessor(BaseProcessor):
-    def __init__(self, model_name, sampling_rate, n_frames, frame_length, is_eval):
+    def __init__(self, model_name, sampling_rate, n_frames, frame_length, is_eval, fbank_store=None):
         """
         Adapted from https://github.com/NINAnor/rare_species_detections/blob/main/BEATs/BEATs.py
+
+        fbank_store: optional FbankStore (see extract_fbank.py), read instead of decoding the
+            audio files it contains.
         """
         super().__init__()
 
@@ -34,6 +52,9 @@ class BeatsAudioProcessor(BaseProcessor):
         self.fbank_mean = 15.41663
         self.fbank_std = 6.55582
         self.is_eval = is_eval
+        self.fbank_store = fbank_store
+        # files decoded because they are not in fbank_store, per process
+        self.fbank_store_misses = 0
 
     def _load_audio(self, aupath):
         if aupath.endswith('.mp4'):
@@ -48,21 +69,11 @@ class BeatsAudioProcessor(BaseProcessor):
             if waveform.shape[0] == 2: 
                 waveform = torch.mean(waveform, dim=0)
             if sr != self.sampling_rate:
-                resampler = torchaudio.transforms.Resample(sr, self.sampling_rate)
-                waveform = resampler(waveform)
+                waveform = get_resampler(sr, self.sampling_rate)(waveform)
         return waveform
 
-    def __call__(self, aupath, start_sec=None, end_sec=None):
-        """
-        Args:
-            aupath: path to audio file
-        Returns:
-            torch.tensor: audio clip after transforms.
-        """
-        # Helper function to return empty tensor for invalid audio
-        def empty_audio_tensor():
-            return torch.zeros((self.n_frames, self.frame_length, 128))
-        
+    def load_waveform(self, aupath, start_sec=None, end_sec=None):
+        """Mono waveform of aupath at self.sampling_rate, or None if it cannot be decoded."""
         try:
             # Handle MP4 files
             if aupath.endswith('.mp4'):
@@ -79,7 +90,7 @@ class BeatsAudioProcessor(BaseProcessor):
 
             # Validate waveform
             if len(waveform.shape) == 0:
-                return empty_audio_tensor()
+                return None
 
             # Convert stereo to mono
             if waveform.shape[0] == 2:
@@ -87,18 +98,19 @@ class BeatsAudioProcessor(BaseProcessor):
 
             # Resample waveform if necessary
             if sr != self.sampling_rate:
-                resampler = torchaudio.transforms.Resample(sr, self.sampling_rate)
-                waveform = resampler(waveform)
+                waveform = get_resampler(sr, self.sampling_rate)(waveform)
 
         except:
-            return empty_audio_tensor()
+            return None
 
         if waveform.ndim == 1:
             waveform = waveform.unsqueeze(0)
+        return waveform
 
+    def compute_fbank(self, waveform):
+        """Normalized fbank features (num_frames, 128) of a waveform, or None on failure."""
         waveform = waveform * 2**15
 
-        # Compute fbank features
         try:
             fbank = ta_kaldi.fbank(
                 waveform,
@@ -109,7 +121,42 @@ class BeatsAudioProcessor(BaseProcessor):
             )
             fbank = (fbank - self.fbank_mean) / (2 * self.fbank_std)
         except:
-            return empty_audio_tensor()
+            return None
+        return fbank
+
+    def load_fbank(self, aupath, start_sec=None, end_sec=None):
+        if self.fbank_store is not None:
+            if aupath in self.fbank_store:
+                fbank = self.fbank_store[aupath]
+                if start_sec is not None and end_sec is not None:
+                    # fbank frames are shifted by 10 ms
+                    fbank = fbank[int(start_sec * 100) : int(end_sec * 100)]
+                return fbank
+
+            self.fbank_store_misses += 1
+            if self.fbank_store_misses == 1:
+                logging.warning(
+                    "{} is not in the fbank store {} (audio root {}), decoding it instead. Further "
+                    "misses are counted in fbank_store_misses.".format(
+                        aupath, self.fbank_store.root, self.fbank_store.audio_root
+                    )
+                )
+
+        waveform = self.load_waveform(aupath, start_sec, end_sec)
+        if waveform is None:
+            return None
+        return self.compute_fbank(waveform)
+
+    def __call__(self, aupath, start_sec=None, end_sec=None):
+        """
+        Args:
+            aupath: path to audio file
+        Returns:
+            torch.tensor: audio clip after transforms.
+        """
+        fbank = self.load_fbank(aupath, start_sec, end_sec)
+        if fbank is None or len(fbank) == 0:
+            return torch.zeros((self.n_frames, self.frame_length, 128))
 
         # Handle padding and frames extraction differently for eval and training modes
         if not self.is_eval:
@@ -132,10 +179,17 @@ class BeatsAudioProcessor(BaseProcessor):
         if cfg is None:
             cfg = OmegaConf.create()
 
+        fbank_store = cfg.get("fbank_store", None)
+        if fbank_store:
+            if not os.path.isabs(fbank_store):
+                fbank_store = get_cache_path(fbank_store)
+            fbank_store = FbankStore(fbank_store)
+
         return cls(
             model_name=cfg.get("model_name", 'iter3'),
             sampling_rate=cfg.get("sampling_rate", 16000),
             n_frames=cfg.get("n_frames", 2),
             frame_length=cfg.get("frame_length", 512),
-            is_eval=cfg.get("is_eval", False)
-        )
\ No newline at end of file
+            is_eval=cfg.get("is_eval", False),
+            fbank_store=fbank_store,
+        )
@@ -0,0 +1,177 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import random
+
+from lavis.common.registry import registry
+from lavis.processors.blip_processors import BlipImageBaseProcessor
+from omegaconf import OmegaConf
+from PIL import Image, ImageDraw
+from torchvision import transforms
+from torchvision.transforms.functional import InterpolationMode
+
+
+# clockwise rotations, matching cv2.ROTATE_* used by download_cryoet.py
+ROTATIONS = {
+    0: None,
+    90: Image.ROTATE_270,
+    180: Image.ROTATE_180,
+    270: Image.ROTATE_90,
+}
+
+
+class CryoETImageBaseProcessor(BlipImageBaseProcessor):
+    """
+    Draws the bounding box of a mask on the full cryo-ET frame and applies the
+    rotation / flip / padding augmentation at load time.
+
+    Items are either a PIL image (passed through unchanged) or a dict with keys
+    "image" and "bbox" ([x_min, y_min, x_max, y_max]), and optionally
+    "padding", "rotation" (degrees clockwise) and "flip" (horizontal).
+    """
+
+    def __init__(self, mean=None, std=None, paddings=(20, 40), box_width=6, box_color=(255, 0, 0)):
+        super().__init__(mean=mean, std=std)
+
+        self.paddings = tuple(paddings)
+        self.box_width = box_width
+        self.box_color = tuple(box_color)
+
+    def draw_box(self, image, bbox, padding):
+        w, h = image.size
+        x_min = max(0, bbox[0] - padding)
+        y_min = max(0, bbox[1] - padding)
+        x_max = min(w, bbox[2] + padding)
+        y_max = min(h, bbox[3] + padding)
+
+        image = image.convert("RGB") if image.mode != "RGB" else image.copy()
+        # center the outline on the box edges, as cv2.rectangle does
+        half = self.box_width // 2
+        ImageDraw.Draw(image).rectangle(
+            [x_min - half, y_min - half, x_max + half, y_max + half],
+            outline=self.box_color,
+            width=self.box_width,
+        )
+        return image
+
+    def augment(self, item, padding, rotation, flip):
+        if not isinstance(item, dict):
+            return item
+
+        image = self.draw_box(item["image"], item["bbox"], padding)
+        if ROTATIONS[rotation] is not None:
+            image = image.transpose(ROTATIONS[rotation])
+        if flip:
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+        return image
+
+    @classmethod
+    def _base_kwargs(cls, cfg):
+        return dict(
+            mean=cfg.get("mean", None),
+            std=cfg.get("std", None),
+            paddings=cfg.get("paddings", (20, 40)),
+            box_width=cfg.get("box_width", 6),
+            box_color=cfg.get("box_color", (255, 0, 0)),
+        )
+
+
+@registry.register_processor("cryoet_image_train")
+class CryoETImageTrainProcessor(CryoETImageBaseProcessor):
+    def __init__(
+        self,
+        image_size=364,
+        mean=None,
+        std=None,
+        min_scale=0.5,
+        max_scale=1.0,
+        paddings=(20, 40),
+        box_width=6,
+        box_color=(255, 0, 0),
+    ):
+        super().__init__(
+            mean=mean, std=std, paddings=paddings, box_width=box_width, box_color=box_color
+        )
+
+        # flips are part of the random geometric augmentation
+        self.transform = transforms.Compose(
+            [
+                transforms.RandomResizedCrop(
+                    image_size,
+                    scale=(min_scale, max_scale),
+                    interpolation=InterpolationMode.BICUBIC,
+                ),
+                transforms.ToTensor(),
+                self.normalize,
+            ]
+        )
+
+    def __call__(self, item):
+        image = self.augment(
+            item,
+            padding=random.choice(self.paddings),
+            rotation=random.choice(list(ROTATIONS)),
+            flip=random.random() < 0.5,
+        )
+        return self.transform(image)
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            cfg = OmegaConf.create()
+
+        return cls(
+            image_size=cfg.get("image_size", 364),
+            min_scale=cfg.get("min_scale", 0.5),
+            max_scale=cfg.get("max_scale", 1.0),
+            **cls._base_kwargs(cfg),
+        )
+
+
+@registry.register_processor("cryoet_image_eval")
+class CryoETImageEvalProcessor(CryoETImageBaseProcessor):
+    def __init__(
+        self,
+        image_size=364,
+        mean=None,
+        std=None,
+        paddings=(20, 40),
+        box_width=6,
+        box_color=(255, 0, 0),
+    ):
+        super().__init__(
+            mean=mean, std=std, paddings=paddings, box_width=box_width, box_color=box_color
+        )
+
+        self.transform = transforms.Compose(
+            [
+                transforms.Resize(
+                    (image_size, image_size), interpolation=InterpolationMode.BICUBIC
+                ),
+                transforms.ToTensor(),
+                self.normalize,
+            ]
+        )
+
+    def __call__(self, item):
+        if isinstance(item, dict):
+            image = self.augment(
+                item,
+                padding=item.get("padding", self.paddings[0]),
+                rotation=item.get("rotation", 0),
+                flip=item.get("flip", False),
+            )
+        else:
+            image = item
+        return self.transform(image)
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            cfg = OmegaConf.create()
+
+        return cls(image_size=cfg.get("image_size", 364), **cls._base_kwargs(cfg))
@@ -35,6 +35,9 @@ def resize(clip, target_size, interpolation_mode):
         raise ValueError(
             f"target size should be tuple (height, width), instead got {target_size}"
         )
+    if not clip.is_floating_point():
+        # uint8 clips are converted once cropped, interpolate needs floats
+        clip = clip.float()
     return torch.nn.functional.interpolate(
         clip, size=target_size, mode=interpolation_mode, align_corners=False
     )
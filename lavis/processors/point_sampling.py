@@ -0,0 +1,155 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import torch
+
+# "exact" runs farthest point sampling on one cloud with NumPy, "torch" runs it on a batch
+# of clouds at once (on any device) and "voxel" keeps one random point per cell of a voxel
+# grid, an approximation of FPS in O(N). "exact" and "torch" select the same points as
+# lavis.processors.ulip_processors.farthest_point_sample for the same NumPy seed.
+FPS_MODES = ("exact", "torch", "voxel")
+
+
+def squared_distances(xyz, centroid):
+    # same summation order as np.sum(..., -1), so that all modes break ties alike
+    diff = xyz - centroid
+    return (diff[..., 0] * diff[..., 0] + diff[..., 1] * diff[..., 1]) + diff[..., 2] * diff[..., 2]
+
+
+def farthest_point_indices(xyz, npoint, start=None):
+    """
+    Indices (npoint,) of the farthest point sampling of xyz (N, 3), starting from start,
+    drawn with np.random.randint(0, N) if None.
+    """
+    N = xyz.shape[0]
+    if start is None:
+        start = np.random.randint(0, N)
+
+    xyz = np.ascontiguousarray(xyz[:, :3], dtype=np.float32)
+    indices = np.zeros((npoint,), dtype=np.int64)
+    distance = np.full((N,), 1e10, dtype=np.float32)
+    farthest = start
+    for i in range(npoint):
+        indices[i] = farthest
+        np.minimum(distance, squared_distances(xyz, xyz[farthest]), out=distance)
+        farthest = np.argmax(distance)
+    return indices
+
+
+def batched_farthest_point_indices(xyz, npoint, start=None, lengths=None):
+    """
+    Farthest point sampling of a batch of clouds.
+
+    xyz (B, N, 3) is a tensor of points, padded at the end to N when lengths (B,) gives the
+    number of points of each cloud. start (B,) defaults to np.random.randint(0, length) for
+    every cloud in turn. Returns indices (B, npoint) on the device of xyz.
+    """
+    B, N = xyz.shape[:2]
+    device = xyz.device
+    if lengths is None:
+        lengths = [N] * B
+    lengths = torch.as_tensor(lengths, device=device)
+    if start is None:
+        start = [np.random.randint(0, length) for length in lengths.tolist()]
+
+    xyz = xyz[..., :3].float()
+    batch = torch.arange(B, device=device)
+    indices = torch.zeros((B, npoint), dtype=torch.long, device=device)
+    # padding is at -1, so it is only picked when npoint exceeds the length of a cloud
+    distance = torch.full((B, N), 1e10, device=device)
+    distance[torch.arange(N, device=device)[None, :] >= lengths[:, None]] = -1
+    farthest = torch.as_tensor(start, dtype=torch.long, device=device)
+    for i in range(npoint):
+        indices[:, i] = farthest
+        centroid = xyz[batch, farthest].unsqueeze(1)
+        torch.minimum(distance, squared_distances(xyz, centroid), out=distance)
+        farthest = distance.argmax(dim=1)
+    return indices
+
+
+def voxel_grid_indices(xyz, npoint, num_iters=8):
+    """
+    Approximate farthest point sampling of xyz (N, 3): keeps one random point per cell of a
+    voxel grid sized for about npoint occupied cells, then fills up or trims to npoint at random.
+    """
+    N = xyz.shape[0]
+    xyz = np.asarray(xyz[:, :3], dtype=np.float32)
+    origin = xyz.min(axis=0)
+    extent = max(float((xyz.max(axis=0) - origin).max()), 1e-6)
+    perm = np.random.permutation(N)
+
+    voxel_size = extent / np.cbrt(npoint)
+    for _ in range(num_iters):
+        cells = np.floor((xyz[perm] - origin) / voxel_size).astype(np.int64)
+        num_cells = cells.max(axis=0) + 1
+        cell_ids = (cells[:, 0] * num_cells[1] + cells[:, 1]) * num_cells[2] + cells[:, 2]
+        _, first = np.unique(cell_ids, return_index=True)
+        if npoint <= len(first) < 2 * npoint:
+            break
+        # the occupied cells of a surface grow with the inverse square of the voxel size
+        voxel_size *= np.sqrt(len(first) / (1.5 * npoint))
+    indices = perm[np.sort(first)]
+
+    if len(indices) > npoint:
+        indices = np.random.choice(indices, npoint, replace=False)
+    elif len(indices) < npoint:
+        rest = np.setdiff1d(perm, indices)
+        indices = np.concatenate([indices, np.random.choice(rest, npoint - len(indices), replace=False)])
+    return indices
+
+
+def sample_point_indices(xyz, npoint, mode="exact"):
+    """Indices (npoint,) of points of xyz (N, 3) sampled with one of FPS_MODES."""
+    assert mode in FPS_MODES, "Unknown sampling mode {}, expected one of {}".format(mode, FPS_MODES)
+    if mode == "exact":
+        return farthest_point_indices(xyz, npoint)
+    if mode == "torch":
+        return batched_farthest_point_indices(torch.from_numpy(np.asarray(xyz[None, :, :3])), npoint)[0].numpy()
+    return voxel_grid_indices(xyz, npoint)
+
+
+class FPSIndexCache:
+    """
+    Stores the indices sampled from every point cloud file, as <cache_dir>/<hash>.npy, so that
+    sampling runs once per file instead of once per epoch. Every epoch then sees the same subset
+    of points of a cloud.
+    """
+
+    def __init__(self, cache_dir, npoint, mode="exact"):
+        self.cache_dir = cache_dir
+        self.npoint = npoint
+        self.mode = mode
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        name = "{}-{}-{}".format(os.path.abspath(key), self.npoint, self.mode)
+        return os.path.join(self.cache_dir, hashlib.sha1(name.encode()).hexdigest() + ".npy")
+
+    def get(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            return np.load(path)
+        return None
+
+    def put(self, key, indices):
+        path = self.path(key)
+        # write then rename, as several DataLoader workers may fill the cache at once
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(indices, dtype=np.int32))
+        os.replace(tmp_path, path)
+
+    def sample(self, key, xyz):
+        indices = self.get(key)
+        if indices is None:
+            indices = sample_point_indices(xyz, self.npoint, self.mode)
+            self.put(key, indices)
+        return indices
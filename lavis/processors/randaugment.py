@@ -219,6 +219,136 @@ def cutout_func(img, pad_size, replace=(0, 0, 0)):
     return out
 
 
+## video aug functions, applied to all frames of a clip (T, H, W, C) of uint8 at once, with the
+## same output as the image functions applied frame by frame
+def _lut_video(frames, table):
+    """
+    maps the values of a clip with a table of 256 values (one cv2.LUT over the whole clip), or
+    with one table per frame (T, 256) or per frame and channel (T, C, 256)
+    """
+    T, H, W, C = frames.shape
+    if table.ndim == 1:
+        return cv2.LUT(frames.reshape(T * H, W, C), table).reshape(T, H, W, C)
+    out = np.empty_like(frames)
+    for frame, frame_table, frame_out in zip(frames, table, out):
+        if frame_table.ndim == 2:
+            frame_table = np.ascontiguousarray(frame_table.T).reshape(256, 1, C)
+        cv2.LUT(frame, frame_table, dst=frame_out)
+    return out
+
+
+def _warp_affine_video(frames, M, fill):
+    T, H, W, C = frames.shape
+    out = np.empty_like(frames)
+    for frame, frame_out in zip(frames, out):
+        cv2.warpAffine(
+            frame, M, (W, H), dst=frame_out, borderValue=fill, flags=cv2.INTER_LINEAR
+        )
+    return out
+
+
+def identity_video_func(frames):
+    return frames
+
+
+def autocontrast_video_func(frames):
+    """
+    same output as PIL.ImageOps.autocontrast of every frame, with cutoff=0
+    """
+    low = frames.min(axis=(1, 2)).astype(np.float64)[..., None]  # T, C, 1
+    high = frames.max(axis=(1, 2)).astype(np.float64)[..., None]
+    scale = 255 / np.maximum(high - low, 1)
+    table = np.arange(256) * scale - low * scale
+    table = np.where(high <= low, np.arange(256), table)
+    return _lut_video(frames, table.clip(0, 255).astype(np.uint8))
+
+
+def equalize_video_func(frames):
+    T, C = frames.shape[0], frames.shape[3]
+    hist = np.stack(
+        [
+            cv2.calcHist([frame], [c], None, [256], [0, 256]).reshape(256)
+            for frame in frames
+            for c in range(C)
+        ]
+    ).astype(np.int64)
+
+    # number of pixels, but those of the last non zero bin
+    last = 255 - np.argmax(hist[:, ::-1] != 0, axis=1)[:, None]
+    step = (hist.sum(axis=1, keepdims=True) - np.take_along_axis(hist, last, axis=1)) // 255
+    n = np.concatenate([step // 2, hist[:, :-1]], axis=1)
+    table = (np.cumsum(n, axis=1) // np.maximum(step, 1)).clip(0, 255)
+    table = np.where(step == 0, np.arange(256), table).astype(np.uint8)
+    return _lut_video(frames, table.reshape(T, C, 256))
+
+
+def rotate_video_func(frames, degree, fill=(0, 0, 0)):
+    H, W = frames.shape[1], frames.shape[2]
+    M = cv2.getRotationMatrix2D((W / 2, H / 2), degree, 1)
+    return _warp_affine_video(frames, M, fill)
+
+
+def solarize_video_func(frames, thresh=128):
+    table = np.array([el if el < thresh else 255 - el for el in range(256)])
+    return _lut_video(frames, table.clip(0, 255).astype(np.uint8))
+
+
+def color_video_func(frames, factor):
+    M = np.float32(
+        [[0.886, -0.114, -0.114], [-0.587, 0.413, -0.587], [-0.299, -0.299, 0.701]]
+    ) * factor + np.float32([[0.114], [0.587], [0.299]])
+    return np.matmul(frames, M).clip(0, 255).astype(np.uint8)
+
+
+def contrast_video_func(frames, factor):
+    mean = np.sum(np.mean(frames, axis=(1, 2)) * np.array([0.114, 0.587, 0.299]), axis=1)
+    table = (np.arange(256) - mean[:, None]) * factor + mean[:, None]
+    return _lut_video(frames, table.clip(0, 255).astype(np.uint8))
+
+
+def brightness_video_func(frames, factor):
+    table = (np.arange(256, dtype=np.float32) * factor).clip(0, 255).astype(np.uint8)
+    return _lut_video(frames, table)
+
+
+def sharpness_video_func(frames, factor):
+    if factor == 1.0:
+        return frames
+    kernel = np.ones((3, 3), dtype=np.float32)
+    kernel[1][1] = 5
+    kernel /= 13
+    degenerate = np.empty_like(frames)
+    for frame, frame_out in zip(frames, degenerate):
+        cv2.filter2D(frame, -1, kernel, dst=frame_out)
+    if factor == 0.0:
+        return degenerate
+
+    out = frames.astype(np.float32)
+    degenerate = degenerate[:, 1:-1, 1:-1, :].astype(np.float32)
+    out[:, 1:-1, 1:-1, :] = degenerate + factor * (out[:, 1:-1, 1:-1, :] - degenerate)
+    return out.astype(np.uint8)
+
+
+def shear_x_video_func(frames, factor, fill=(0, 0, 0)):
+    return _warp_affine_video(frames, np.float32([[1, factor, 0], [0, 1, 0]]), fill)
+
+
+def translate_x_video_func(frames, offset, fill=(0, 0, 0)):
+    return _warp_affine_video(frames, np.float32([[1, 0, -offset], [0, 1, 0]]), fill)
+
+
+def translate_y_video_func(frames, offset, fill=(0, 0, 0)):
+    return _warp_affine_video(frames, np.float32([[1, 0, 0], [0, 1, -offset]]), fill)
+
+
+def posterize_video_func(frames, bits):
+    return np.bitwise_and(frames, np.uint8((255 << (8 - bits)) & 255))
+
+
+def shear_y_video_func(frames, factor, fill=(0, 0, 0)):
+    return _warp_affine_video(frames, np.float32([[1, 0, 0], [factor, 1, 0]]), fill)
+
+
 ### level to args
 def enhance_level_to_args(MAX_LEVEL):
     def level_to_args(level):
@@ -302,6 +432,23 @@ func_dict = {
     "ShearY": shear_y_func,
 }
 
+video_func_dict = {
+    "Identity": identity_video_func,
+    "AutoContrast": autocontrast_video_func,
+    "Equalize": equalize_video_func,
+    "Rotate": rotate_video_func,
+    "Solarize": solarize_video_func,
+    "Color": color_video_func,
+    "Contrast": contrast_video_func,
+    "Brightness": brightness_video_func,
+    "Sharpness": sharpness_video_func,
+    "ShearX": shear_x_video_func,
+    "TranslateX": translate_x_video_func,
+    "TranslateY": translate_y_video_func,
+    "Posterize": posterize_video_func,
+    "ShearY": shear_y_video_func,
+}
+
 translate_const = 10
 MAX_LEVEL = 10
 replace_value = (128, 128, 128)
@@ -365,31 +512,28 @@ class VideoRandomAugment(object):
         return [(op, self.M) for op in sampled_ops]
 
     def __call__(self, frames):
+        """
+        Applies the same ops, with the same arguments, to all frames (T, H, W, C) of a clip,
+        each op at once on the whole clip. Returns a float tensor.
+        """
         assert (
             frames.shape[-1] == 3
         ), "Expecting last dimension for 3-channels RGB (b, h, w, c)."
 
         if self.tensor_in_tensor_out:
-            frames = frames.numpy().astype(np.uint8)
-
-        num_frames = frames.shape[0]
+            frames = frames.numpy()
+        frames = np.ascontiguousarray(frames.astype(np.uint8, copy=False))
 
-        ops = num_frames * [self.get_random_ops()]
-        apply_or_not = num_frames * [np.random.random(size=self.N) > self.p]
-
-        frames = torch.stack(
-            list(map(self._aug, frames, ops, apply_or_not)), dim=0
-        ).float()
-
-        return frames
+        ops = self.get_random_ops()
+        apply_or_not = np.random.random(size=self.N) > self.p
 
-    def _aug(self, img, ops, apply_or_not):
         for i, (name, level) in enumerate(ops):
             if not apply_or_not[i]:
                 continue
             args = arg_dict[name](level)
-            img = func_dict[name](img, *args)
-        return torch.from_numpy(img)
+            frames = video_func_dict[name](frames, *args)
+
+        return torch.from_numpy(frames).float()
 
 
 if __name__ == "__main__":
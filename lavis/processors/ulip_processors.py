@@ -14,6 +14,7 @@ from lavis.processors.blip_processors import BlipImageBaseProcessor
 from omegaconf import OmegaConf
 import torchvision.transforms as transforms
 from lavis.models.ulip_models.utils.io import IO
+from lavis.processors.point_sampling import FPSIndexCache, sample_point_indices
 
 import numpy as np
 from PIL import Image
@@ -172,6 +173,8 @@ class ULIPPCProcessor(BlipImageBaseProcessor):
         ssl=False,
         oversample=False,
         use_height=False, 
+        fps_mode="exact",
+        fps_cache_dir=None,
     ):
 
         super().__init__()
@@ -183,6 +186,8 @@ class ULIPPCProcessor(BlipImageBaseProcessor):
         self.oversample=oversample
         self.use_height=use_height
         self.permutation = np.arange(self.npoints)
+        self.fps_mode=fps_mode
+        self.fps_cache = FPSIndexCache(fps_cache_dir, npoints, fps_mode) if fps_cache_dir else None
 
 
     def __call__(self, pc_data_path):
@@ -196,7 +201,10 @@ class ULIPPCProcessor(BlipImageBaseProcessor):
         data = pc_norm(pc_data)
 
         if self.uniform and self.npoints < data.shape[0]:
-            data = farthest_point_sample(data, self.npoints)
+            if self.fps_cache is not None and isinstance(pc_data_path, str):
+                data = data[self.fps_cache.sample(pc_data_path, data)]
+            else:
+                data = data[sample_point_indices(data, self.npoints, self.fps_mode)]
         else:
             data = random_sample(self.permutation, data, self.npoints)
 
@@ -249,6 +257,8 @@ class ULIPPCProcessor(BlipImageBaseProcessor):
         ssl= cfg.get('ssl',False)
         oversample= cfg.get('oversample',False)
         use_height= cfg.get('use_height',False)
+        fps_mode= cfg.get('fps_mode','exact')
+        fps_cache_dir= cfg.get('fps_cache_dir',None)
 
         return cls(
             npoints=npoints,
@@ -257,4 +267,6 @@ class ULIPPCProcessor(BlipImageBaseProcessor):
             ssl=ssl,
             oversample=oversample,
             use_height=use_height, 
+            fps_mode=fps_mode,
+            fps_cache_dir=fps_cache_dir,
         )
\ No newline at end of file
@@ -15,10 +15,12 @@ from pathlib import Path
 import torch
 import torch.distributed as dist
 import webdataset as wds
+from lavis.common.checkpoint import CheckpointWriter, load_checkpoint_file
 from lavis.common.dist_utils import (
     download_cached_file,
     get_rank,
     get_world_size,
+    is_dist_avail_and_initialized,
     is_main_process,
     main_process,
 )
@@ -27,11 +29,13 @@ from lavis.common.utils import is_url
 from lavis.datasets.data_utils import concat_datasets, reorg_datasets_by_split
 from lavis.datasets.datasets.dataloader_utils import (
     IterLoader,
+    LengthGroupedBatchSampler,
     MultiIterLoader,
     PrefetchLoader,
+    estimate_input_lengths,
 )
 from torch.nn.parallel import DistributedDataParallel as DDP
-from torch.utils.data import DataLoader, DistributedSampler
+from torch.utils.data import DataLoader, DistributedSampler, SequentialSampler
 from torch.utils.data.dataset import ChainDataset
 
 
@@ -59,6 +63,7 @@ class RunnerBase:
         self._scaler = None
         self._dataloaders = None
         self._lr_sched = None
+        self._checkpoint_writer = None
 
         self.start_epoch = 0
 
@@ -288,6 +293,30 @@ class RunnerBase:
         save_last = self.config.run_cfg.get("save_last", True)
         return int(save_last)
 
+    @property
+    def checkpoint_writer(self):
+        """
+        Writes the checkpoints in shards of run_cfg.checkpoint_shard_mb, in the background unless
+        run_cfg.async_checkpoint is False, keeping the last run_cfg.keep_last_checkpoints.
+        """
+        if self._checkpoint_writer is None:
+            self._checkpoint_writer = CheckpointWriter(
+                shard_size=int(self.config.run_cfg.get("checkpoint_shard_mb", 2048)) * 1024**2,
+                keep_last=self.config.run_cfg.get("keep_last_checkpoints", None),
+                asynchronous=self.config.run_cfg.get("async_checkpoint", True),
+            )
+
+        return self._checkpoint_writer
+
+    def wait_for_checkpoints(self):
+        """
+        Waits until the checkpoints of the main process are written, on all processes.
+        """
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.wait()
+        if is_dist_avail_and_initialized():
+            dist.barrier()
+
     @property
     def init_lr(self):
         return float(self.config.run_cfg.init_lr)
@@ -424,6 +453,7 @@ class RunnerBase:
         # save last checkpoint
         if self.save_last and not self.evaluate_only:
             self._save_checkpoint(cur_epoch, is_best=False)
+        self.wait_for_checkpoints()
 
         # testing phase
         test_epoch = "best" if len(self.valid_splits) > 0 else cur_epoch
@@ -512,10 +542,37 @@ class RunnerBase:
     ):
         """
         Create dataloaders for training and validation.
+
+        Map-style loaders are wrapped in a PrefetchLoader copying run_cfg.prefetch_depth batches
+        ahead to the device. The workers of training loaders persist across epochs unless
+        run_cfg.persistent_workers is False; those of evaluation loaders are restarted on each
+        evaluation unless it is True, since persistent workers keep their copy of the dataset
+        in memory for the whole run. Each worker loads run_cfg.prefetch_factor batches in
+        advance.
+
+        With run_cfg.group_eval_by_length, evaluation batches group samples of similar input
+        lengths, estimated from the annotations or from their run_cfg.eval_length_key field.
         """
+        pin_memory = self.device.type == "cuda"
+        prefetch_depth = self.config.run_cfg.get("prefetch_depth", 1)
+        group_eval_by_length = self.config.run_cfg.get("group_eval_by_length", False)
+        eval_length_key = self.config.run_cfg.get("eval_length_key", None)
+
+        loader_kwargs = {}
+        persistent_workers = self.config.run_cfg.get("persistent_workers", None)
+        if num_workers > 0:
+            prefetch_factor = self.config.run_cfg.get("prefetch_factor", None)
+            if prefetch_factor is not None:
+                loader_kwargs["prefetch_factor"] = prefetch_factor
 
         def _create_loader(dataset, num_workers, bsz, is_train, collate_fn):
             # create a single dataloader for each split
+            split_kwargs = dict(loader_kwargs)
+            if num_workers > 0:
+                split_kwargs["persistent_workers"] = (
+                    is_train if persistent_workers is None else persistent_workers
+                )
+
             if isinstance(dataset, ChainDataset) or isinstance(
                 dataset, wds.DataPipeline
             ):
@@ -526,7 +583,7 @@ class RunnerBase:
                         dataset,
                         batch_size=bsz,
                         num_workers=num_workers,
-                        pin_memory=True,
+                        pin_memory=pin_memory,
                     )
                 )
             else:
@@ -545,17 +602,44 @@ class RunnerBase:
                 else:
                     sampler = None
 
-                loader = DataLoader(
-                    dataset,
-                    batch_size=bsz,
-                    num_workers=num_workers,
-                    pin_memory=True,
-                    sampler=sampler,
-                    shuffle=sampler is None and is_train,
-                    collate_fn=collate_fn,
-                    drop_last=True if is_train else False,
+                lengths = None
+                if not is_train and group_eval_by_length:
+                    lengths = estimate_input_lengths(dataset, length_key=eval_length_key)
+                    if lengths is None:
+                        logging.info(
+                            "Evaluation samples are not grouped by length, the dataset does not estimate input lengths."
+                        )
+
+                if lengths is not None:
+                    # evaluation batches of samples of similar input lengths
+                    batch_sampler = LengthGroupedBatchSampler(
+                        sampler if sampler is not None else SequentialSampler(dataset),
+                        lengths,
+                        bsz,
+                    )
+                    loader = DataLoader(
+                        dataset,
+                        batch_sampler=batch_sampler,
+                        num_workers=num_workers,
+                        pin_memory=pin_memory,
+                        collate_fn=collate_fn,
+                        **split_kwargs,
+                    )
+                else:
+                    loader = DataLoader(
+                        dataset,
+                        batch_size=bsz,
+                        num_workers=num_workers,
+                        pin_memory=pin_memory,
+                        sampler=sampler,
+                        shuffle=sampler is None and is_train,
+                        collate_fn=collate_fn,
+                        drop_last=True if is_train else False,
+                        **split_kwargs,
+                    )
+                loader = PrefetchLoader(
+                    loader, device=self.device, prefetch_depth=prefetch_depth
                 )
-                loader = PrefetchLoader(loader)
 
                 if is_train:
                     loader = IterLoader(loader, use_distributed=self.use_distributed)
@@ -609,16 +693,19 @@ class RunnerBase:
             "checkpoint_{}.pth".format("best" if is_best else cur_epoch),
         )
         logging.info("Saving checkpoint at epoch {} to {}.".format(cur_epoch, save_to))
-        torch.save(save_obj, save_to)
+        self.checkpoint_writer.save(save_obj, save_to)
 
     def _reload_best_model(self, model):
         """
         Load the best checkpoint for evaluation.
         """
         checkpoint_path = os.path.join(self.output_dir, "checkpoint_best.pth")
+        self.wait_for_checkpoints()
 
         logging.info("Loading checkpoint from {}.".format(checkpoint_path))
-        checkpoint = torch.load(checkpoint_path, map_location="cpu")
+        start_time = time.time()
+        # the optimizer shards are not read
+        checkpoint = load_checkpoint_file(checkpoint_path, map_location="cpu")
         try:
             model.load_state_dict(checkpoint["model"])
         except RuntimeError as e:
@@ -629,19 +716,21 @@ class RunnerBase:
                 """
             )
             model.load_state_dict(checkpoint["model"], strict=False)
+        logging.info("Loaded checkpoint in {:.2f}s.".format(time.time() - start_time))
         return model
 
     def _load_checkpoint(self, url_or_filename):
         """
         Resume from a checkpoint.
         """
+        start_time = time.time()
         if is_url(url_or_filename):
             cached_file = download_cached_file(
                 url_or_filename, check_hash=False, progress=True
             )
             checkpoint = torch.load(cached_file, map_location=self.device)
         elif os.path.isfile(url_or_filename):
-            checkpoint = torch.load(url_or_filename, map_location=self.device)
+            checkpoint = load_checkpoint_file(url_or_filename, map_location=self.device)
         else:
             raise RuntimeError("checkpoint url or path is invalid")
 
@@ -653,7 +742,11 @@ class RunnerBase:
             self.scaler.load_state_dict(checkpoint["scaler"])
 
         self.start_epoch = checkpoint["epoch"] + 1
-        logging.info("Resume checkpoint from {}".format(url_or_filename))
+        logging.info(
+            "Resume checkpoint from {} in {:.2f}s".format(
+                url_or_filename, time.time() - start_time
+            )
+        )
 
     @main_process
     def log_stats(self, stats, split_name):
@@ -13,6 +13,7 @@ import time
 import torch
 import torch.distributed as dist
 import webdataset as wds
+from lavis.common.checkpoint import load_checkpoint_file
 from lavis.common.dist_utils import download_cached_file, is_main_process, main_process
 from lavis.common.registry import registry
 from lavis.common.utils import is_url
@@ -139,6 +140,7 @@ class RunnerIter(RunnerBase):
         # save last checkpoint
         if self.save_last and not self.evaluate_only:
             self._save_checkpoint(end_iters, is_best=False)
+        self.wait_for_checkpoints()
 
         # testing phase
         self.evaluate(cur_epoch=self.cur_epoch)
@@ -190,19 +192,20 @@ class RunnerIter(RunnerBase):
             "checkpoint_{}.pth".format("best" if is_best else cur_iters),
         )
         logging.info("Saving checkpoint at iters {} to {}.".format(cur_iters, save_to))
-        torch.save(save_obj, save_to)
+        self.checkpoint_writer.save(save_obj, save_to)
 
     def _load_checkpoint(self, url_or_filename):
         """
         Resume from a checkpoint.
         """
+        start_time = time.time()
         if is_url(url_or_filename):
             cached_file = download_cached_file(
                 url_or_filename, check_hash=False, progress=True
             )
             checkpoint = torch.load(cached_file, map_location=self.device)
         elif os.path.isfile(url_or_filename):
-            checkpoint = torch.load(url_or_filename, map_location=self.device)
+            checkpoint = load_checkpoint_file(url_or_filename, map_location=self.device)
         else:
             raise RuntimeError("checkpoint url or path is invalid")
 
@@ -214,7 +217,11 @@ class RunnerIter(RunnerBase):
             self.scaler.load_state_dict(checkpoint["scaler"])
 
         self.start_iters = checkpoint["iters"] + 1
-        logging.info("Resume checkpoint from {}".format(url_or_filename))
+        logging.info(
+            "Resume checkpoint from {} in {:.2f}s".format(
+                url_or_filename, time.time() - start_time
+            )
+        )
 
     @property
     def dataloaders(self) -> dict:
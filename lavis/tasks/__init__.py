@@ -6,17 +6,25 @@
 """
 
 from lavis.common.registry import registry
-from lavis.tasks.base_task import BaseTask
-from lavis.tasks.captioning import CaptionTask
-from lavis.tasks.image_text_pretrain import ImageTextPretrainTask
-from lavis.tasks.multimodal_classification import (
-    MultimodalClassificationTask,
-)
-from lavis.tasks.retrieval import RetrievalTask
-from lavis.tasks.vqa import VQATask, GQATask, AOKVQATask, DisCRNTask
-from lavis.tasks.vqa_reading_comprehension import VQARCTask, GQARCTask
-from lavis.tasks.dialogue import DialogueTask
-from lavis.tasks.text_to_image_generation import TextToImageGenerationTask
+from lavis.common.registry_manifest import lazy_attributes
+
+# classes imported on first access, like the registry imports them on first lookup
+_LAZY_ATTRIBUTES = {
+    "BaseTask": "lavis.tasks.base_task",
+    "CaptionTask": "lavis.tasks.captioning",
+    "ImageTextPretrainTask": "lavis.tasks.image_text_pretrain",
+    "MultimodalClassificationTask": "lavis.tasks.multimodal_classification",
+    "RetrievalTask": "lavis.tasks.retrieval",
+    "VQATask": "lavis.tasks.vqa",
+    "GQATask": "lavis.tasks.vqa",
+    "AOKVQATask": "lavis.tasks.vqa",
+    "DisCRNTask": "lavis.tasks.vqa",
+    "VQARCTask": "lavis.tasks.vqa_reading_comprehension",
+    "GQARCTask": "lavis.tasks.vqa_reading_comprehension",
+    "DialogueTask": "lavis.tasks.dialogue",
+    "TextToImageGenerationTask": "lavis.tasks.text_to_image_generation",
+}
+__getattr__ = lazy_attributes(_LAZY_ATTRIBUTES)
 
 
 def setup_task(cfg):
@@ -26,6 +34,9 @@ def setup_task(cfg):
     task = registry.get_task_class(task_name).setup_task(cfg=cfg)
     assert task is not None, "Task {} not properly registered.".format(task_name)
 
+    task.result_gather = cfg.run_cfg.get("result_gather", task.result_gather)
+    task.result_format = cfg.run_cfg.get("result_format", task.result_format)
+
     return task
 
 
@@ -5,8 +5,12 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import gzip
+import itertools
+import json
 import logging
 import os
+import time
 
 import torch
 import torch.distributed as dist
@@ -14,9 +18,16 @@ from lavis.common.dist_utils import get_rank, get_world_size, is_main_process, i
 from lavis.common.logger import MetricLogger, SmoothedValue
 from lavis.common.registry import registry
 from lavis.datasets.data_utils import prepare_sample
+from lavis.datasets.datasets.dataloader_utils import LengthGroupedBatchSampler
+from lavis.models.attention_backends import set_attn_backend_from_config
 
 
 class BaseTask:
+    # how save_result() merges results and stores the per-rank files, see
+    # run_cfg.result_gather / result_format
+    result_gather = "file"
+    result_format = "json"
+
     def __init__(self, **kwargs):
         super().__init__()
 
@@ -30,7 +41,8 @@ class BaseTask:
         model_config = cfg.model_cfg
 
         model_cls = registry.get_model_class(model_config.arch)
-        return model_cls.from_config(model_config)
+        model = model_cls.from_config(model_config)
+        return set_attn_backend_from_config(model, model_config)
 
     def build_datasets(self, cfg):
         """
@@ -88,13 +100,23 @@ class BaseTask:
         # TODO make it configurable
         print_freq = 10
 
-        results = []
+        batch_results = []
+        # a PrefetchLoader has already copied the samples to the device
+        prepared = getattr(data_loader, "device", None) is not None
 
         for samples in metric_logger.log_every(data_loader, print_freq, header):
-            samples = prepare_sample(samples, cuda_enabled=cuda_enabled)
+            if not prepared:
+                samples = prepare_sample(samples, cuda_enabled=cuda_enabled)
 
             eval_output = self.valid_step(model=model, samples=samples)
-            results.extend(eval_output)
+            batch_results.append(eval_output)
+
+        batch_sampler = getattr(data_loader, "batch_sampler", None)
+        if isinstance(batch_sampler, LengthGroupedBatchSampler):
+            # back to the order of the dataset before the results are saved
+            results = batch_sampler.restore_order(batch_results)
+        else:
+            results = [result for batch in batch_results for result in batch]
 
         if is_dist_avail_and_initialized():
             dist.barrier()
@@ -175,6 +197,8 @@ class BaseTask:
         training stops after #iters_per_epoch iterations.
         """
         use_amp = scaler is not None
+        # a PrefetchLoader has already copied the samples to the device
+        prepared = getattr(data_loader, "device", None) is not None
 
         if not hasattr(data_loader, "__next__"):
             # convert to iterator if not already
@@ -183,6 +207,11 @@ class BaseTask:
         metric_logger = MetricLogger(delimiter="  ")
         metric_logger.add_meter("lr", SmoothedValue(window_size=1, fmt="{value:.6f}"))
         metric_logger.add_meter("loss", SmoothedValue(window_size=1, fmt="{value:.4f}"))
+        # time waiting for the samples and time spent on them, in seconds per iteration. Both are
+        # host wall time, without CUDA synchronization: GPU work still queued at the end of
+        # an iteration is counted in a later iteration
+        metric_logger.add_meter("data_time", SmoothedValue(fmt="{avg:.4f}"))
+        metric_logger.add_meter("compute_time", SmoothedValue(fmt="{avg:.4f}"))
 
         # if iter-based runner, schedule lr based on inner epoch.
         logging.info(
@@ -204,9 +233,14 @@ class BaseTask:
             if i >= iters_per_epoch:
                 break
 
+            start_time = time.time()
+
             samples = next(data_loader)
 
-            samples = prepare_sample(samples, cuda_enabled=cuda_enabled)
+            if not prepared:
+                samples = prepare_sample(samples, cuda_enabled=cuda_enabled)
+
+            data_time = time.time() - start_time
 
             ## notify model that sample is empty (error occured)
             if not isinstance(samples, dict):
@@ -243,6 +277,10 @@ class BaseTask:
 
             metric_logger.update(**loss_dict)
             metric_logger.update(lr=optimizer.param_groups[0]["lr"])
+            metric_logger.update(
+                data_time=data_time,
+                compute_time=time.time() - start_time - data_time,
+            )
 
         # after train_epoch()
         # gather the stats from all processes
@@ -253,42 +291,101 @@ class BaseTask:
             for k, meter in metric_logger.meters.items()
         }
 
-    @staticmethod
-    def save_result(result, result_dir, filename, remove_duplicate=""):
-        import json
+    def save_result(
+        self,
+        result,
+        result_dir,
+        filename,
+        remove_duplicate="",
+        gather=None,
+        result_format=None,
+    ):
+        """
+        Merges the results of all ranks on the main process and saves them as
+        <result_dir>/<filename>.json, the file that metric reporting reads.
+
+        Args:
+            gather (str): "file" (default) writes one file per rank that the main process
+                reads back, "memory" collects results with all_gather_object instead.
+            result_format (str): format of the per-rank files, "json" (default), "jsonl"
+                (one result per line, written as a stream) or "json.gz" (gzip-compressed
+                JSON). The merged file is always JSON.
+        """
+        gather = gather or self.result_gather
+        result_format = result_format or self.result_format
+        assert gather in ["file", "memory"], "Unknown gather mode {}".format(gather)
 
-        result_file = os.path.join(
-            result_dir, "%s_rank%d.json" % (filename, get_rank())
-        )
         final_result_file = os.path.join(result_dir, "%s.json" % filename)
 
-        json.dump(result, open(result_file, "w"))
+        if gather == "memory" and is_dist_avail_and_initialized():
+            gathered = [None for _ in range(get_world_size())]
+            dist.all_gather_object(gathered, result)
+        elif gather == "memory":
+            gathered = [result]
+        else:
+            result_file = os.path.join(
+                result_dir, "%s_rank%d.%s" % (filename, get_rank(), result_format)
+            )
+            _dump_results(result, result_file, result_format)
 
-        if is_dist_avail_and_initialized():
-            dist.barrier()
+            if is_dist_avail_and_initialized():
+                dist.barrier()
 
         if is_main_process():
             logging.warning("rank %d starts merging results." % get_rank())
             # combine results from all processes
-            result = []
-
-            for rank in range(get_world_size()):
-                result_file = os.path.join(
-                    result_dir, "%s_rank%d.json" % (filename, rank)
-                )
-                res = json.load(open(result_file, "r"))
-                result += res
+            if gather == "file":
+                gathered = [
+                    _load_results(
+                        os.path.join(
+                            result_dir,
+                            "%s_rank%d.%s" % (filename, rank, result_format),
+                        ),
+                        result_format,
+                    )
+                    for rank in range(get_world_size())
+                ]
 
+            result = []
             if remove_duplicate:
-                result_new = []
-                id_list = []
-                for res in result:
-                    if res[remove_duplicate] not in id_list:
-                        id_list.append(res[remove_duplicate])
-                        result_new.append(res)
-                result = result_new
-
-            json.dump(result, open(final_result_file, "w"))
+                seen_ids = set()
+                for res in itertools.chain.from_iterable(gathered):
+                    if res[remove_duplicate] not in seen_ids:
+                        seen_ids.add(res[remove_duplicate])
+                        result.append(res)
+            else:
+                for res in gathered:
+                    result.extend(res)
+
+            _dump_results(result, final_result_file, "json")
             print("result file saved to %s" % final_result_file)
 
         return final_result_file
+
+
+def _dump_results(result, path, result_format):
+    if result_format == "json":
+        with open(path, "w") as f:
+            json.dump(result, f)
+    elif result_format == "jsonl":
+        with open(path, "w") as f:
+            for res in result:
+                f.write(json.dumps(res) + "\n")
+    elif result_format == "json.gz":
+        with gzip.open(path, "wt", compresslevel=1) as f:
+            json.dump(result, f)
+    else:
+        raise ValueError("Unknown result format {}".format(result_format))
+
+
+def _load_results(path, result_format):
+    if result_format == "json":
+        with open(path, "r") as f:
+            return json.load(f)
+    elif result_format == "jsonl":
+        with open(path, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    elif result_format == "json.gz":
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+    raise ValueError("Unknown result format {}".format(result_format))
@@ -5,6 +5,7 @@
  For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
 """
 
+import hashlib
 import json
 import os
 import pandas as pd
@@ -35,7 +36,7 @@ class CaptionTask(BaseTask):
         assert len(split) == 1, "Only support one split for evaluation."
         self.split = split[0]
         self.load_gt_from_file = load_gt_from_file
-        self.img_ids = img_ids
+        self.img_ids = set(img_ids)
 
     @classmethod
     def setup_task(cls, cfg):
@@ -183,7 +184,34 @@ def load_gt_file(file_path):
                 data.extend([{"sample_id": k, **v} if isinstance(v, dict) else {"sample_id": k, "caption": v} for k, v in loaded.items()])
     return data
 
+def _gt_cache_key(ann_paths, *args):
+    """Hash of the annotation files' content and of the conversion arguments."""
+    sha = hashlib.sha1(json.dumps([str(a) for a in args]).encode())
+    for ann_path in ann_paths:
+        if is_url(ann_path):
+            sha.update(ann_path.encode())
+            continue
+        with open(ann_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
 def convert_to_coco_gt(data, outpath, caption_key, sample_id_key, split, load_gt_from_file=False, img_ids=[]):
+    img_ids = set(img_ids)
+
+    # reuse the ground truth file if the annotations it was generated from did not change
+    ann_paths = [load_gt_from_file] if load_gt_from_file else getattr(data[split], "ann_paths", None)
+    cache_key, cache_key_file = None, outpath + ".hash"
+    if ann_paths:
+        cache_key = _gt_cache_key(
+            ann_paths, type(data[split]).__name__, caption_key, sample_id_key, split, sorted(img_ids, key=str)
+        )
+        if os.path.exists(outpath) and os.path.exists(cache_key_file):
+            with open(cache_key_file, "r") as f:
+                if f.read().strip() == cache_key:
+                    print(f"Using cached ground truth file {outpath}")
+                    return
+
     gt_data = {"annotations":[], "images":[]}
     if load_gt_from_file:
         print(f"Generating ground truth file for evaluation from {load_gt_from_file}....")
@@ -200,9 +228,14 @@ def convert_to_coco_gt(data, outpath, caption_key, sample_id_key, split, load_gt
                 gt_data["annotations"].extend([{"image_id":img_id, "caption":c, "id":img_id} for c in captions])
     else:
         print(f"Generating ground truth file for evaluation....")
-        for i,ann in tqdm(enumerate(data[split])):
-            captions = data[split].annotation[i][caption_key]
-            img_id = int(ann[sample_id_key]) if is_convertible_to_int(ann[sample_id_key]) else ann[sample_id_key]
+        dataset = data[split]
+        for i in tqdm(range(len(dataset))):
+            captions = dataset.annotation[i][caption_key]
+            # read the id from the annotation, only decode the sample if the dataset can't
+            sample_id = dataset.get_sample_id(i, sample_id_key) if hasattr(dataset, "get_sample_id") else None
+            if sample_id is None:
+                sample_id = dataset[i][sample_id_key]
+            img_id = int(sample_id) if is_convertible_to_int(sample_id) else sample_id
             if img_ids and img_id not in img_ids: # only include specified img_ids if specified
                 continue
             gt_data["images"].append({"id":img_id})
@@ -211,6 +244,9 @@ def convert_to_coco_gt(data, outpath, caption_key, sample_id_key, split, load_gt
             else:   
                 gt_data["annotations"].extend([{"image_id":img_id, "caption":c, "id":img_id} for c in captions])
     json.dump(gt_data, open(outpath, 'w'))
+    if cache_key is not None:
+        with open(cache_key_file, "w") as f:
+            f.write(cache_key)
     print(f"Saved annotations at {outpath}")
 
 # TODO better structure for this.
@@ -0,0 +1,90 @@
+"""
+ Copyright (c) 2023, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Packs per-sample point cloud files, or the pickle of a processed ModelNet split, into a
+PointCloudStore, which 3D datasets read when build_info.kwargs.pc_store points to it.
+
+Objaverse (<pc_root>/<sample_id>/<sample_id>_8192.npz):
+    python pack_point_clouds.py --pc-root objaverse/pc --pattern "*/*_8192.npz" --key parent --output objaverse/pc_store
+ShapeNet (<pc_root>/<sample_id>.npy):
+    python pack_point_clouds.py --pc-root shapenet/pc --pattern "*.npy" --output shapenet/pc_store
+ModelNet40 (processed pickle, rows in the order of the shape ids file):
+    python pack_point_clouds.py --modelnet-pickle modelnet40_test_8192pts_fps.dat \
+        --shape-ids modelnet40_test.txt --output modelnet40/test_store
+"""
+
+import argparse
+import glob
+import os
+import pickle
+from multiprocessing import Pool
+
+from tqdm import tqdm
+
+from lavis.datasets.datasets.point_cloud_store import PointCloudStoreWriter, load_point_cloud
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pack point clouds into a PointCloudStore")
+
+    parser.add_argument("--output", required=True, help="directory of the store.")
+    parser.add_argument("--pc-root", help="root directory of the point cloud files.")
+    parser.add_argument("--pattern", default="*.npy", help="glob of the files, relative to --pc-root.")
+    parser.add_argument(
+        "--key",
+        choices=["stem", "parent"],
+        default="stem",
+        help="sample key of a file: its name without extension, or the name of its directory.",
+    )
+    parser.add_argument("--modelnet-pickle", help="processed ModelNet split, instead of --pc-root.")
+    parser.add_argument("--shape-ids", help="shape ids of the rows of --modelnet-pickle.")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--num-workers", type=int, default=8)
+
+    return parser.parse_args()
+
+
+def sample_key(path, key):
+    if key == "parent":
+        return os.path.basename(os.path.dirname(path))
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def pack_files(writer, args):
+    paths = sorted(glob.glob(os.path.join(args.pc_root, args.pattern)))
+    with Pool(args.num_workers) as pool:
+        # imap keeps the order of paths while files are read in parallel
+        for path, points in tqdm(
+            zip(paths, pool.imap(load_point_cloud, paths, chunksize=16)), total=len(paths)
+        ):
+            writer.add(sample_key(path, args.key), points)
+
+
+def pack_modelnet_pickle(writer, args):
+    assert args.shape_ids, "--shape-ids is required with --modelnet-pickle"
+    shape_ids = [line.rstrip() for line in open(args.shape_ids)]
+    with open(args.modelnet_pickle, "rb") as f:
+        list_of_points, _ = pickle.load(f)
+    assert len(shape_ids) == len(list_of_points), "expected one shape id per point cloud"
+
+    for shape_id, points in tqdm(zip(shape_ids, list_of_points), total=len(shape_ids)):
+        writer.add(shape_id, points)
+
+
+def main():
+    args = parse_args()
+    assert bool(args.pc_root) != bool(args.modelnet_pickle), "pass one of --pc-root or --modelnet-pickle"
+
+    with PointCloudStoreWriter(args.output, dtype=args.dtype) as writer:
+        if args.modelnet_pickle:
+            pack_modelnet_pickle(writer, args)
+        else:
+            pack_files(writer, args)
+    print("Packed {} point clouds into {}".format(len(writer.keys), args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+ Copyright (c) 2022, salesforce.com, inc.
+ All rights reserved.
+ SPDX-License-Identifier: BSD-3-Clause
+ For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+
+Runs the frozen visual encoder of a BLIP-2 model once over the datasets of a config and
+stores its outputs, so that training reads features instead of images.
+
+Features are written to <cached_dir>/<split> of each dataset (build_info.cached_dir),
+keyed by build_info.cached_key (default image_id), and are used once the dataset sets
+build_info.cached: True, for train splits only with build_info.cached_train: True as well.
+The model must be built with freeze_vit=True. ln_vision is applied by the model and stays
+trainable.
+
+Only use this when the vision processor of the split is deterministic (e.g. an eval
+processor), since every epoch then sees the same features. The train processor of
+caption_coco_ft_cryoet.yaml (blip2_image_train) is random, so the example replaces it
+with the eval processor:
+
+    python -m torch.distributed.run --nproc_per_node=8 precompute_features.py \
+        --cfg-path lavis/projects/blip2/train/caption_coco_ft_cryoet.yaml --splits train \
+        --options datasets.cryoet_caption.vis_processor.train.name=blip_image_eval \
+        datasets.cryoet_caption.build_info.cached_dir=cryoet/features/
+"""
+
+import argparse
+import logging
+import os
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+import lavis.tasks as tasks
+from lavis.common.config import Config
+from lavis.common.dist_utils import get_rank, get_world_size, init_distributed_mode
+from lavis.common.logger import setup_logger
+from lavis.common.utils import get_cache_path
+from lavis.datasets.datasets.feature_store import FeatureStore, FeatureStoreWriter
+
+# registers the runners; the builders, models, processors and tasks are imported and
+# registered on their first registry lookup
+from lavis.runners import *
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute visual encoder features")
+
+    parser.add_argument("--cfg-path", required=True, help="path to configuration file.")
+    parser.add_argument(
+        "--options",
+        nargs="+",
+        help="override some settings in the used config, the key-value pair "
+        "in xxx=yyy format will be merged into config file.",
+    )
+    parser.add_argument("--splits", nargs="+", default=["train"])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--shard-size", type=int, default=4096)
+
+    return parser.parse_args()
+
+
+def pending_indices(dataset, key, done):
+    """Indices of this rank, one per key not in done."""
+    seen = set(done)
+    indices = []
+    for index in range(len(dataset)):
+        sample_key = str(dataset.annotation[index][key])
+        if sample_key in seen:
+            continue
+        seen.add(sample_key)
+        indices.append(index)
+    return indices[get_rank() :: get_world_size()]
+
+
+class KeyedSubset(Dataset):
+    """
+    The samples of dataset at indices, each with its store key read from its annotation,
+    which is where get_cached_features() looks it up.
+    """
+
+    def __init__(self, dataset, indices, key):
+        self.dataset = dataset
+        self.indices = indices
+        self.key = key
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        index = self.indices[index]
+        sample = self.dataset[index]
+        if sample is None:
+            return None
+        return str(self.dataset.annotation[index][self.key]), sample
+
+    def collater(self, samples):
+        samples = [s for s in samples if s is not None]
+        keys = [sample_key for sample_key, _ in samples]
+        return keys, self.dataset.collater([sample for _, sample in samples])
+
+
+@torch.no_grad()
+def precompute(model, dataset, key, output_dir, args):
+    done = FeatureStore(output_dir).keys() if os.path.isdir(output_dir) else []
+    indices = pending_indices(dataset, key, done)
+    logging.info("Computing features of {} samples into {}".format(len(indices), output_dir))
+
+    subset = KeyedSubset(dataset, indices, key)
+    data_loader = DataLoader(
+        subset,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        pin_memory=True,
+        collate_fn=subset.collater,
+    )
+
+    with FeatureStoreWriter(
+        output_dir, part="rank{}".format(get_rank()), shard_size=args.shard_size
+    ) as writer:
+        for keys, samples in data_loader:
+            if not keys:
+                continue
+            image = samples["image"].to(model.device, non_blocking=True)
+            with model.maybe_autocast():
+                vit_embeds = model.visual_encoder(image)
+            writer.add(keys, vit_embeds)
+
+
+def main():
+    cfg = Config(parse_args())
+    args = cfg.args
+
+    init_distributed_mode(cfg.run_cfg)
+    setup_logger()
+
+    task = tasks.setup_task(cfg)
+    datasets = task.build_datasets(cfg)
+    model = task.build_model(cfg)
+    model = model.to(torch.device(cfg.run_cfg.device)).eval()
+
+    for name, splits in datasets.items():
+        build_info = cfg.datasets_cfg[name].build_info
+        assert build_info.get("cached_dir", None), "build_info.cached_dir is not set for {}".format(name)
+        cached_dir = build_info.cached_dir
+        if not os.path.isabs(cached_dir):
+            cached_dir = get_cache_path(cached_dir)
+
+        for split in args.splits:
+            if split not in splits:
+                continue
+            dataset = splits[split]
+            # read images, even if some features were already computed
+            dataset.set_feature_store(None)
+            precompute(
+                model,
+                dataset,
+                key=build_info.get("cached_key", "image_id"),
+                output_dir=os.path.join(cached_dir, split),
+                args=args,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Parity tests for the attention backends of EVA-ViT and the Q-Former.
+"""
+
+import pytest
+import torch
+from lavis.models.attention_backends import set_attn_backend
+from lavis.models.eva_vit import VisionTransformer
+
+torch.manual_seed(0)
+
+BACKENDS = ["sdpa", "chunked"]
+
+
+def backend_outputs(model, inputs, backend, **kwargs):
+    set_attn_backend(model, backend, chunk_size=7)
+    with torch.no_grad():
+        return model(*inputs, **kwargs)
+
+
+class TestAttentionBackends:
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("shared_rel_pos_bias", [False, True])
+    def test_eva_vit(self, backend, shared_rel_pos_bias):
+        model = VisionTransformer(
+            img_size=56,
+            patch_size=14,
+            embed_dim=64,
+            depth=2,
+            num_heads=4,
+            qkv_bias=True,
+            use_rel_pos_bias=not shared_rel_pos_bias,
+            use_shared_rel_pos_bias=shared_rel_pos_bias,
+        ).eval()
+        for name, param in model.named_parameters():
+            if "relative_position_bias_table" in name:
+                param.data.normal_()
+
+        image = torch.randn(2, 3, 56, 56)
+        expected = backend_outputs(model, (image,), "math")
+
+        assert torch.allclose(backend_outputs(model, (image,), backend), expected, atol=1e-5)
+
+    def test_relative_position_bias_cache(self):
+        model = VisionTransformer(
+            img_size=56, patch_size=14, embed_dim=64, depth=1, num_heads=4, use_rel_pos_bias=True
+        ).eval()
+        attn = model.blocks[0].attn
+
+        with torch.no_grad():
+            bias = attn.get_relative_position_bias()
+            assert attn.get_relative_position_bias() is bias
+
+            # in-place updates, e.g. by an optimizer or load_state_dict, invalidate the cache
+            attn.relative_position_bias_table.add_(1.0)
+            assert torch.allclose(attn.get_relative_position_bias(), bias + 1.0)
+
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("is_cross_attention", [False, True])
+    def test_qformer(self, backend, is_cross_attention):
+        from lavis.models.blip2_models.Qformer import BertConfig, BertSelfAttention
+
+        config = BertConfig(
+            hidden_size=64,
+            num_attention_heads=4,
+            encoder_width=32,
+            attention_probs_dropout_prob=0.0,
+        )
+        model = BertSelfAttention(config, is_cross_attention).eval()
+
+        hidden_states = torch.randn(2, 9, 64)
+        encoder_hidden_states = torch.randn(2, 11, 32)
+        mask = torch.ones(2, 11 if is_cross_attention else 9)
+        mask[1, -3:] = 0
+        extended_mask = (1.0 - mask[:, None, None, :]) * -10000.0
+
+        if is_cross_attention:
+            kwargs = dict(
+                encoder_hidden_states=encoder_hidden_states,
+                encoder_attention_mask=extended_mask,
+            )
+        else:
+            kwargs = dict(attention_mask=extended_mask)
+
+        expected = backend_outputs(model, (hidden_states,), "math", **kwargs)[0]
+        outputs = backend_outputs(model, (hidden_states,), backend, **kwargs)[0]
+
+        assert torch.allclose(outputs, expected, atol=1e-5)
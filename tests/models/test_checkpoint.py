@@ -0,0 +1,157 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the sharded checkpoints of the runners.
+"""
+
+import logging
+import os
+
+import pytest
+import torch
+import torch.nn as nn
+from lavis.common.checkpoint import (
+    CheckpointWriter,
+    SafetensorsStateDict,
+    ShardedStateDict,
+    convert_to_safetensors,
+    load_checkpoint_file,
+    load_state_dict,
+    load_state_dict_into,
+    save_checkpoint_file,
+)
+
+
+def make_checkpoint():
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Linear(64, 64), nn.LayerNorm(64), nn.Linear(64, 8))
+    optimizer = torch.optim.AdamW(model.parameters())
+    model(torch.randn(4, 64)).sum().backward()
+    optimizer.step()
+
+    checkpoint = {
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "config": {"run": {"task": "captioning"}},
+        "epoch": 3,
+    }
+    return model, optimizer, checkpoint
+
+
+class TestCheckpoint:
+    @pytest.mark.parametrize("shard_size", [2**30, 4096])
+    def test_save_and_load(self, tmp_path, shard_size):
+        model, optimizer, checkpoint = make_checkpoint()
+        path = str(tmp_path / "checkpoint_3.pth")
+
+        save_checkpoint_file(checkpoint, path, shard_size=shard_size)
+        loaded = load_checkpoint_file(path)
+
+        # the model is kept in the checkpoint file when it fits in a shard
+        assert isinstance(loaded["model"], ShardedStateDict) == (shard_size == 4096)
+        assert isinstance(loaded["optimizer"]["state"], ShardedStateDict)
+        assert loaded["epoch"] == 3 and loaded["config"] == checkpoint["config"]
+
+        model.load_state_dict(loaded["model"])
+        optimizer.load_state_dict(loaded["optimizer"])
+        for key, value in checkpoint["model"].items():
+            assert torch.equal(model.state_dict()[key], value)
+        # saved atomically, no temporary files are left
+        assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+    def test_lazy_shards(self, tmp_path):
+        _, _, checkpoint = make_checkpoint()
+        path = str(tmp_path / "checkpoint_3.pth")
+        save_checkpoint_file(checkpoint, path, shard_size=4096)
+
+        state_dict = load_checkpoint_file(path)["model"]
+        assert state_dict.num_loaded_shards == 0
+
+        assert torch.equal(state_dict["2.bias"], checkpoint["model"]["2.bias"])
+        assert state_dict.num_loaded_shards == 1
+
+    def test_writer(self, tmp_path):
+        model, _, checkpoint = make_checkpoint()
+        writer = CheckpointWriter(shard_size=4096, keep_last=2)
+
+        for epoch in range(4):
+            writer.save(checkpoint, str(tmp_path / "checkpoint_{}.pth".format(epoch)))
+            # the checkpoint is a snapshot, later updates are not saved
+            with torch.no_grad():
+                model[0].weight.add_(1)
+        writer.save(checkpoint, str(tmp_path / "checkpoint_best.pth"))
+        writer.wait()
+
+        names = sorted(os.listdir(tmp_path))
+        assert [name for name in names if name.endswith(".pth")] == [
+            "checkpoint_2.pth",
+            "checkpoint_3.pth",
+            "checkpoint_best.pth",
+        ]
+        assert len(names) == 6
+        loaded = load_checkpoint_file(str(tmp_path / "checkpoint_2.pth"))
+        assert torch.allclose(loaded["model"]["0.weight"], model[0].weight.detach() - 2)
+
+    def test_load_state_dict_into(self, tmp_path):
+        model, _, checkpoint = make_checkpoint()
+        path = str(tmp_path / "checkpoint.pth")
+        torch.save({"model": checkpoint["model"]}, path)
+
+        target = nn.Sequential(nn.Linear(64, 64), nn.LayerNorm(64), nn.Linear(32, 8))
+
+        # same errors as load_state_dict
+        with pytest.raises(RuntimeError, match="size mismatch for 2.weight"):
+            load_state_dict_into(target, load_state_dict(path))
+
+        msg = load_state_dict_into(target, load_state_dict(path, prefix="0."))
+        assert msg.missing_keys == ["1.weight", "1.bias", "2.weight", "2.bias"]
+        assert torch.equal(target[0].weight, model[0].weight)
+
+    def test_safetensors(self, tmp_path):
+        model, _, checkpoint = make_checkpoint()
+        path = str(tmp_path / "checkpoint.pth")
+        torch.save(checkpoint, path)
+
+        converted = convert_to_safetensors(path)
+
+        # the conversion next to the .pth file is loaded instead
+        state_dict = load_state_dict(path)
+        assert converted == str(tmp_path / "checkpoint.safetensors")
+        assert isinstance(state_dict, SafetensorsStateDict)
+        assert sorted(state_dict) == sorted(checkpoint["model"])
+
+        target = nn.Sequential(nn.Linear(64, 64), nn.LayerNorm(64), nn.Linear(64, 8))
+        msg = load_state_dict_into(target, state_dict, strict=True)
+        assert not msg.missing_keys and not msg.unexpected_keys
+        for key, value in checkpoint["model"].items():
+            assert torch.equal(target.state_dict()[key], value)
+
+        assert sorted(load_state_dict(converted, prefix="2.")) == ["2.bias", "2.weight"]
+
+    def test_stale_safetensors(self, tmp_path, caplog):
+        _, _, checkpoint = make_checkpoint()
+        path = str(tmp_path / "checkpoint.pth")
+        torch.save(checkpoint, path)
+        convert_to_safetensors(path)
+
+        # the runner overwrites the checkpoint after it was converted
+        checkpoint["model"] = {key: value + 1 for key, value in checkpoint["model"].items()}
+        torch.save(checkpoint, path)
+
+        with caplog.at_level(logging.WARNING):
+            state_dict = load_state_dict(path)
+        assert not isinstance(state_dict, SafetensorsStateDict)
+        assert "earlier version" in caplog.text
+        for key, value in checkpoint["model"].items():
+            assert torch.equal(state_dict[key], value)
+
+        # converting again makes the conversion current
+        convert_to_safetensors(path)
+        state_dict = load_state_dict(path)
+        assert isinstance(state_dict, SafetensorsStateDict)
+        assert torch.equal(state_dict["0.weight"], checkpoint["model"]["0.weight"])
@@ -0,0 +1,130 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the loaders of the runners.
+"""
+
+import time
+
+import pytest
+import torch
+from lavis.datasets.datasets.base_dataset import BaseDataset, ConcatDataset
+from lavis.datasets.datasets.dataloader_utils import (
+    IterLoader,
+    LengthGroupedBatchSampler,
+    MultiIterLoader,
+    PrefetchLoader,
+    estimate_input_lengths,
+)
+from torch.utils.data import DataLoader, Dataset, DistributedSampler
+
+
+class RangeDataset(Dataset):
+    def __len__(self):
+        return 10
+
+    def __getitem__(self, index):
+        return {"image": torch.full((3, 4, 4), float(index)), "text_input": str(index)}
+
+
+def make_loader(**kwargs):
+    return DataLoader(RangeDataset(), batch_size=4, **kwargs)
+
+
+class TestPrefetchLoader:
+    def test_cpu_returns_batches_as_loaded(self):
+        loader = PrefetchLoader(make_loader(), device="cpu", prefetch_depth=2)
+
+        batches = list(loader)
+
+        assert loader.device == torch.device("cpu")
+        assert len(loader) == 3
+        assert [batch["text_input"] for batch in batches] == [
+            batch["text_input"] for batch in make_loader()
+        ]
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="requires cuda")
+    @pytest.mark.parametrize("prefetch_depth", [1, 3])
+    def test_cuda_copies_batches(self, prefetch_depth):
+        loader = PrefetchLoader(
+            make_loader(pin_memory=True), device="cuda", prefetch_depth=prefetch_depth
+        )
+
+        batches = list(loader)
+
+        assert len(batches) == 3
+        for batch, expected in zip(batches, make_loader()):
+            assert batch["image"].is_cuda
+            assert torch.equal(batch["image"].cpu(), expected["image"])
+
+    def test_iter_loader_persistent_workers(self):
+        loader = make_loader(num_workers=1, persistent_workers=True)
+        loader = IterLoader(PrefetchLoader(loader, device="cpu"))
+
+        start = time.time()
+        batches = [next(loader) for _ in range(7)]
+
+        # no pause at the epoch boundaries when the workers persist
+        assert time.time() - start < 2
+        assert loader.epoch == 2
+        assert batches[3]["text_input"] == batches[0]["text_input"]
+        assert MultiIterLoader([loader, loader]).device == torch.device("cpu")
+
+
+class QuestionDataset(BaseDataset):
+    def __init__(self, questions):
+        super().__init__()
+        self.annotation = [
+            {"question_id": i, "question": question, "answer": ["yes"] * 10}
+            for i, question in enumerate(questions)
+        ]
+
+    def __getitem__(self, index):
+        return {"question_id": self.annotation[index]["question_id"]}
+
+
+class TestLengthGroupedBatchSampler:
+    def test_estimate_input_lengths(self):
+        dataset = QuestionDataset(["what is it", "is it red", "how many dogs are there"])
+        dataset.annotation[1]["num_tokens"] = 7
+
+        assert estimate_input_lengths(dataset) == [3, 3, 5]
+        assert estimate_input_lengths(dataset, length_key="num_tokens") == [3, 7, 5]
+        assert estimate_input_lengths(ConcatDataset([dataset, dataset])) == [3, 3, 5] * 2
+        assert estimate_input_lengths(RangeDataset()) is None
+
+    @pytest.mark.parametrize("num_replicas", [1, 3])
+    def test_distributed_split_and_order(self, num_replicas):
+        questions = [" ".join(["word"] * ((i * 7) % 11 + 1)) for i in range(20)]
+        dataset = QuestionDataset(questions)
+        lengths = estimate_input_lengths(dataset)
+
+        for rank in range(num_replicas):
+            sampler = DistributedSampler(
+                dataset, num_replicas=num_replicas, rank=rank, shuffle=False
+            )
+            batch_sampler = LengthGroupedBatchSampler(sampler, lengths, batch_size=4)
+            loader = DataLoader(
+                dataset, batch_sampler=batch_sampler, collate_fn=dataset.collater
+            )
+
+            batch_results = [
+                [{"question_id": i} for i in batch["question_id"]] for batch in loader
+            ]
+            batches = batch_sampler.batches
+
+            # same samples as the distributed sampler, by decreasing length
+            assert len(batches) == len(batch_sampler)
+            assert sorted(i for batch in batches for i in batch) == sorted(sampler)
+            flat = [i for batch in batches for i in batch]
+            assert [lengths[i] for i in flat] == sorted(
+                (lengths[i] for i in flat), reverse=True
+            )
+
+            results = batch_sampler.restore_order(batch_results)
+            assert [result["question_id"] for result in results] == list(sampler)
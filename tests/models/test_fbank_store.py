@@ -0,0 +1,61 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the fbank store of the beats_audio processors.
+"""
+
+import os
+import pickle
+
+import torch
+from lavis.datasets.datasets.fbank_store import FbankStore, FbankStoreWriter
+
+
+def write_store(root, audio_root, num_files=5, shard_size=2):
+    fbanks = {}
+    with FbankStoreWriter(root, audio_root, shard_size=shard_size) as writer:
+        for i in range(num_files):
+            key = os.path.join("clips", "{}.wav".format(i))
+            fbanks[key] = torch.randn(10 + i, 128)
+            writer.add(key, fbanks[key])
+    return fbanks
+
+
+class TestFbankStore:
+    def test_read_back(self, tmp_path):
+        audio_root = tmp_path / "audio"
+        audio_root.mkdir()
+        fbanks = write_store(str(tmp_path / "store"), str(audio_root))
+
+        store = FbankStore(str(tmp_path / "store"))
+        assert len(store) == len(fbanks)
+        assert store.num_mel_bins == 128
+        for key, fbank in fbanks.items():
+            # stored as float16
+            assert torch.allclose(store[key], fbank, atol=1e-2)
+            assert torch.equal(store[key], store[os.path.join(str(audio_root), key)])
+        assert "clips/missing.wav" not in store
+
+        # workers get the store without its memory maps
+        store = pickle.loads(pickle.dumps(store))
+        assert store._shards is None
+        assert torch.equal(store["clips/0.wav"], FbankStore(str(tmp_path / "store"))["clips/0.wav"])
+
+    def test_symlinked_audio_root(self, tmp_path):
+        audio_root = tmp_path / "audio"
+        (audio_root / "clips").mkdir(parents=True)
+        link = tmp_path / "audio_link"
+        os.symlink(str(audio_root), str(link))
+
+        # written through the symlink, read through the resolved path and vice versa
+        fbanks = write_store(str(tmp_path / "store"), str(link))
+        store = FbankStore(str(tmp_path / "store"))
+        for key in fbanks:
+            assert os.path.join(str(audio_root), key) in store
+            assert os.path.join(str(link), key) in store
+            assert os.path.realpath(os.path.join(str(link), key)) in store
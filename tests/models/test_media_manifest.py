@@ -0,0 +1,83 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the media manifests of the datasets.
+"""
+
+import os
+
+import pytest
+from lavis.datasets.datasets import media_manifest
+from lavis.datasets.datasets.media_manifest import MediaManifest
+
+
+@pytest.fixture
+def media_root(tmp_path, monkeypatch):
+    # manifests are cached under tmp_path, and not by previous tests
+    monkeypatch.setattr(media_manifest, "get_cache_path", lambda rel_path: str(tmp_path / "cache" / rel_path))
+    monkeypatch.setattr(media_manifest, "_manifests", {})
+
+    root = tmp_path / "media"
+    for sample in ["b", "a"]:
+        (root / sample).mkdir(parents=True)
+        for view in range(3):
+            (root / sample / "view{}.png".format(view)).touch()
+    (root / "notes.txt").touch()
+    return str(root)
+
+
+class TestMediaManifest:
+    def test_scan(self, media_root):
+        manifest = MediaManifest.scan(media_root, depth=2)
+
+        assert manifest.listdir() == ["a", "b", "notes.txt"]
+        assert manifest.listdir("a") == ["view0.png", "view1.png", "view2.png"]
+        assert manifest.listdir("missing") == []
+        # files are not directories
+        assert "notes.txt" not in manifest.children
+
+        with pytest.raises(AssertionError):
+            MediaManifest.scan(media_root).listdir("a")
+
+    def test_save_and_load(self, media_root, monkeypatch):
+        manifest = MediaManifest.get(media_root, depth=2)
+        assert os.path.exists(MediaManifest._cache_file(media_root, 2))
+
+        # a new process loads the saved manifest instead of scanning root
+        monkeypatch.setattr(media_manifest, "_manifests", {})
+        monkeypatch.setattr(MediaManifest, "scan", classmethod(lambda cls, root, depth=1: pytest.fail()))
+        loaded = MediaManifest.get(media_root, depth=2)
+
+        assert loaded is not manifest
+        assert loaded.names == manifest.names
+        assert loaded.children == manifest.children
+
+    def test_mtime_invalidation(self, media_root):
+        manifest = MediaManifest.get(media_root)
+        assert MediaManifest.get(media_root) is manifest
+
+        open(os.path.join(media_root, "c.png"), "w").close()
+        stat = os.stat(media_root)
+        # the mtime may not change within the resolution of the file system
+        os.utime(media_root, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        updated = MediaManifest.get(media_root)
+        assert updated is not manifest
+        assert "c.png" in updated.listdir()
+        assert media_manifest.listdir(media_root) == updated.listdir()
+
+    def test_no_collectives_in_workers(self, media_root, monkeypatch):
+        def collective(*args, **kwargs):
+            pytest.fail("DataLoader workers must not call collectives")
+
+        monkeypatch.setattr(media_manifest, "is_dist_avail_and_initialized", lambda: True)
+        monkeypatch.setattr(media_manifest.dist, "broadcast_object_list", collective)
+        monkeypatch.setattr(media_manifest.dist, "barrier", collective)
+        monkeypatch.setattr(media_manifest, "get_worker_info", lambda: object())
+
+        assert media_manifest.listdir(media_root) == ["a", "b", "notes.txt"]
@@ -116,4 +116,57 @@ class TestPNPVQA:
 
         assert isinstance(answer, list)
         assert len(answer) == 1
-        assert answer[0]== 'singapore'
\ No newline at end of file
+        assert answer[0]== 'singapore'
+
+class TestPrepareQAInput:
+    def test_fewer_captions(self):
+        from lavis.models.pnp_vqa_models import prepare_qa_input
+
+        samples = {
+            "text_input": ["What is this?", "Where is it?"],
+            "captions": [["a dog", "a cat", "a bird", "a fish", "a cow"], ["a city", "a river", "a bridge"]],
+        }
+        prepare_qa_input(samples, num_captions=4, num_captions_fid=2)
+
+        assert samples["question_captions"] == [
+            ["what is this? \\n a dog. a cat.", "what is this? \\n a bird. a fish."],
+            ["where is it? \\n a city. a river.", "where is it? \\n a bridge."],
+        ]
+
+
+class EchoQuestionAnswering(torch.nn.Module):
+    """Answers with the first word of the first context, in place of UnifiedQA."""
+
+    def __init__(self, words):
+        super().__init__()
+        from tokenizers import Tokenizer, models, pre_tokenizers
+        from transformers import PreTrainedTokenizerFast
+
+        vocab = {word: i for i, word in enumerate(["[PAD]", "[UNK]"] + words)}
+        tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+        self.tokenizer = PreTrainedTokenizerFast(
+            tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]"
+        )
+        self.device = torch.device("cpu")
+
+    def generate(self, input_ids, attention_mask, num_beams=1, min_length=0, max_length=20):
+        assert input_ids.dim() == 3 and input_ids.size(1) >= 1
+        return input_ids[:, 0, :1]
+
+
+class TestForwardQA:
+    def test_without_captions(self):
+        from lavis.models.pnp_vqa_models.pnp_vqa import PNPVQA
+
+        words = "where what is it this a city dog".split()
+        model = PNPVQA(None, None, EchoQuestionAnswering(words))
+        samples = {
+            "text_input": ["Where is it?", "What is this?", "Where is it?"],
+            "captions": [[], ["a dog", "a city"], []],
+        }
+
+        answers = model.forward_qa(samples, internal_bsz_fid=2, num_captions=2, num_captions_fid=1)
+
+        assert samples["question_captions"][0] == ["where is it?"]
+        assert answers == ["where", "what", "where"]
@@ -0,0 +1,64 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the point cloud sampling of ULIP processors.
+"""
+
+import numpy as np
+import pytest
+import torch
+from lavis.processors.point_sampling import (
+    FPSIndexCache,
+    batched_farthest_point_indices,
+    sample_point_indices,
+)
+from lavis.processors.ulip_processors import farthest_point_sample
+
+
+class TestPointSampling:
+    @pytest.mark.parametrize("mode", ["exact", "torch"])
+    def test_fps_matches_reference(self, mode):
+        points = np.random.rand(3000, 6).astype(np.float32)
+
+        np.random.seed(0)
+        expected = farthest_point_sample(points, 256)
+        np.random.seed(0)
+        indices = sample_point_indices(points, 256, mode)
+
+        assert np.array_equal(points[indices], expected)
+
+    def test_batched_fps_matches_reference(self):
+        clouds = [np.random.rand(n, 3).astype(np.float32) for n in (1000, 600, 800)]
+
+        np.random.seed(0)
+        expected = [farthest_point_sample(cloud, 128) for cloud in clouds]
+
+        xyz = torch.zeros(len(clouds), 1000, 3)
+        for i, cloud in enumerate(clouds):
+            xyz[i, : len(cloud)] = torch.from_numpy(cloud)
+        np.random.seed(0)
+        indices = batched_farthest_point_indices(xyz, 128, lengths=[len(cloud) for cloud in clouds])
+
+        for cloud, idx, exp in zip(clouds, indices, expected):
+            assert np.array_equal(cloud[idx.numpy()], exp)
+
+    def test_voxel_sampling(self):
+        points = np.random.rand(5000, 3).astype(np.float32)
+
+        indices = sample_point_indices(points, 512, "voxel")
+
+        assert len(np.unique(indices)) == 512
+
+    def test_fps_cache(self, tmp_path):
+        points = np.random.rand(1000, 3).astype(np.float32)
+        cache = FPSIndexCache(str(tmp_path), npoint=64)
+
+        indices = cache.sample("cloud.npz", points)
+
+        assert np.array_equal(cache.get("cloud.npz"), indices)
+        assert np.array_equal(cache.sample("cloud.npz", points[::-1]), indices)
@@ -0,0 +1,59 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the clip-level ops of VideoRandomAugment.
+"""
+
+import numpy as np
+import pytest
+import torch
+from lavis.processors.randaugment import VideoRandomAugment, func_dict, video_func_dict
+
+FILL = (128, 128, 128)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    frames = np.random.RandomState(0).randint(0, 256, (4, 32, 48, 3)).astype(np.uint8)
+    # a flat channel, for the ops that use a histogram or a range of values
+    frames[1, ..., 2] = 77
+    return frames
+
+
+class TestVideoRandomAugment:
+    @pytest.mark.parametrize(
+        "name, args",
+        [
+            ("Identity", ()),
+            ("Equalize", ()),
+            ("Rotate", (-12.0, FILL)),
+            ("Solarize", (128,)),
+            ("Color", (1.3,)),
+            ("Contrast", (0.7,)),
+            ("Brightness", (1.5,)),
+            ("Sharpness", (1.6,)),
+            ("ShearX", (0.2, FILL)),
+            ("ShearY", (-0.15, FILL)),
+            ("TranslateX", (3.0, FILL)),
+            ("TranslateY", (-2.5, FILL)),
+        ],
+    )
+    def test_ops_match_frame_by_frame(self, frames, name, args):
+        expected = np.stack([func_dict[name](frame, *args) for frame in frames])
+        out = video_func_dict[name](frames, *args)
+
+        assert np.array_equal(out, expected)
+
+    def test_same_ops_for_all_frames(self, frames):
+        clip = torch.from_numpy(np.repeat(frames[:1], 4, axis=0)).float()
+        augment = VideoRandomAugment(2, 5, augs=["ShearX", "TranslateY", "Rotate"])
+
+        out = augment(clip)
+
+        assert out.dtype == torch.float32 and out.shape == clip.shape
+        assert all(torch.equal(out[0], frame) for frame in out)
@@ -0,0 +1,49 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the lazy registry.
+"""
+
+import subprocess
+import sys
+
+from lavis.common.registry import registry
+from lavis.common.registry_manifest import load_manifest, scan_registrations
+
+
+class TestRegistry:
+    def test_manifest_is_up_to_date(self):
+        # run python -m lavis.common.registry_manifest after adding a registered class
+        assert load_manifest() == scan_registrations()
+
+    def test_import_lavis_is_lazy(self):
+        statement = (
+            "import sys, lavis\n"
+            "assert 'torch' not in sys.modules\n"
+            "assert not any(m.startswith('lavis.models.') for m in sys.modules)\n"
+        )
+        subprocess.run([sys.executable, "-c", statement], check=True)
+
+    def test_lookup_imports_module(self):
+        assert "image_text_pretrain" in registry.list_tasks()
+        assert "blip2_opt" in registry.list_models()
+
+        task_cls = registry.get_task_class("image_text_pretrain")
+
+        assert task_cls.__name__ == "ImageTextPretrainTask"
+        assert registry.get_task_class("not_registered") is None
+
+    def test_package_attributes(self):
+        import lavis
+
+        # the names the lavis package used to star-import from its subpackages
+        assert lavis.load_model.__module__ == "lavis.models"
+        assert lavis.BaseModel.__name__ == "BaseModel"
+        assert lavis.BaseProcessor.__name__ == "BaseProcessor"
+        assert lavis.ImageTextPretrainTask is registry.get_task_class("image_text_pretrain")
+        assert not hasattr(lavis, "not_exported")
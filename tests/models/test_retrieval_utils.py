@@ -0,0 +1,81 @@
+"""
+#
+# Copyright (c) 2022 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Parity tests for the batched top-k re-ranking used by retrieval evaluation.
+"""
+
+import torch
+from lavis.models.retrieval_utils import max_sim_matrix, rerank_topk
+
+torch.manual_seed(0)
+
+num_images, num_texts, num_query, dim = 37, 91, 4, 16
+image_embeds = torch.nn.functional.normalize(torch.randn(num_images, num_query, dim), dim=-1)
+text_embeds = torch.nn.functional.normalize(torch.randn(num_texts, dim), dim=-1)
+image_feats = torch.randn(num_images, dim)
+text_feats = torch.randn(num_texts, dim)
+
+
+def itm(image_inputs, text_inputs):
+    # stands in for model.compute_itm, scores each (image, text) pair independently
+    return (image_inputs * text_inputs).sum(-1).tanh()
+
+
+def reference_rerank(sims_matrix, k_test, score_fn):
+    score_matrix = torch.full(sims_matrix.size(), -100.0)
+    for i, sims in enumerate(sims_matrix):
+        topk_sim, topk_idx = sims.topk(k=k_test, dim=0)
+        score_matrix[i, topk_idx] = score_fn(i, topk_idx) + topk_sim
+    return score_matrix
+
+
+class TestRetrievalUtils:
+    def test_max_sim_matrix(self):
+        expected = torch.stack(
+            [(image_embed @ text_embeds.t()).max(0)[0] for image_embed in image_embeds]
+        )
+
+        for chunk_numel in [1, num_query * num_texts * 5, 2**27]:
+            sims_matrix = max_sim_matrix(image_embeds, text_embeds, chunk_numel)
+            assert torch.allclose(sims_matrix, expected, atol=1e-6)
+            assert sims_matrix.argmax(1).equal(expected.argmax(1))
+
+    def test_rerank_topk(self):
+        sims_matrix = max_sim_matrix(image_embeds, text_embeds)
+        k_test = 8
+
+        expected_i2t = reference_rerank(
+            sims_matrix,
+            k_test,
+            lambda i, idx: itm(image_feats[i].repeat(k_test, 1), text_feats[idx]),
+        )
+        expected_t2i = reference_rerank(
+            sims_matrix.t(),
+            k_test,
+            lambda i, idx: itm(image_feats[idx], text_feats[i].repeat(k_test, 1)),
+        )
+
+        def i2t_itm(query_idx, topk_idx):
+            return itm(
+                image_feats[query_idx].repeat_interleave(k_test, dim=0),
+                text_feats[topk_idx.flatten()],
+            )
+
+        def t2i_itm(query_idx, topk_idx):
+            return itm(
+                image_feats[topk_idx.flatten()],
+                text_feats[query_idx].repeat_interleave(k_test, dim=0),
+            )
+
+        # None is the default, one query per call
+        for itm_batch_size in [None, 1, k_test, 3 * k_test + 1, 10000]:
+            score_i2t = rerank_topk(sims_matrix, i2t_itm, k_test, itm_batch_size)
+            score_t2i = rerank_topk(sims_matrix.t(), t2i_itm, k_test, itm_batch_size)
+
+            assert score_i2t.equal(expected_i2t)
+            assert score_t2i.equal(expected_t2i)
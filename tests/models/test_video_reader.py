@@ -0,0 +1,71 @@
+"""
+#
+# Copyright (c) 2023 salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root or https://opensource.org/licenses/BSD-3-Clause
+#
+
+Integration tests for the video reader of video processors.
+"""
+
+import cv2
+import numpy as np
+import pytest
+import torch
+from lavis.datasets.video_reader import VideoClipReader, plan_frame_indices
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("videos") / "video.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+    for i in range(120):
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        frame[..., 0] = i * 2
+        frame[..., 2] = 255 - i * 2
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def read_seeking(video_path, indices, height, width):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    for index in indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        _, frame = cap.read()
+        frame = cv2.cvtColor(cv2.resize(frame, (width, height)), cv2.COLOR_BGR2RGB)
+        frames.append(torch.from_numpy(frame))
+    cap.release()
+    return torch.stack(frames).permute(3, 0, 1, 2)
+
+
+class TestVideoReader:
+    def test_plan_frame_indices(self):
+        assert plan_frame_indices(100, 4, "uniform") == [0, 25, 50, 75]
+        assert plan_frame_indices(100, 4, "linspace") == [0, 33, 66, 99]
+        assert plan_frame_indices(100, 4, "linspace", 10, 40) == [10, 20, 30, 40]
+        assert plan_frame_indices(100, 4, "linspace", 90, 120) == [90]
+
+        indices = plan_frame_indices(100, 8, "headtail")
+        assert indices == sorted(indices)
+        assert all(i < 50 for i in indices[:4]) and all(i >= 50 for i in indices[4:])
+
+    @pytest.mark.parametrize("seek_gap", [0, 48])
+    def test_opencv_matches_seeking(self, video_path, seek_gap):
+        reader = VideoClipReader(height=64, width=64, backend="opencv", seek_gap=seek_gap)
+        clip = reader.read(video_path, 8, "linspace")
+
+        expected = read_seeking(video_path, plan_frame_indices(120, 8, "linspace"), 64, 64)
+
+        assert clip.dtype == torch.uint8
+        assert torch.equal(clip, expected)
+        assert reader.last_decode_time > 0
+
+    def test_opencv_subclip(self, video_path):
+        reader = VideoClipReader(height=64, width=64, backend="opencv")
+        clip = reader.read(video_path, 4, "linspace", start_time=1.0, end_time=2.0)
+
+        assert clip.shape == (3, 4, 64, 64)
+        assert torch.equal(clip, read_seeking(video_path, [30, 40, 50, 60], 64, 64))
@@ -24,12 +24,9 @@ from lavis.common.optims import (
 from lavis.common.registry import registry
 from lavis.common.utils import now
 
-# imports modules for registration
-from lavis.datasets.builders import *
-from lavis.models import *
-from lavis.processors import *
+# registers the runners; the builders, models, processors and tasks are imported and
+# registered on their first registry lookup
 from lavis.runners import *
-from lavis.tasks import *
 
 
 def parse_args():